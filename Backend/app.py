@@ -1,23 +1,83 @@
 # app.py
 import os
 import json
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware  # 👈
+from fastapi.responses import StreamingResponse, JSONResponse, HTMLResponse, PlainTextResponse
 import traceback
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import numpy as np
-import pandas as pd
 
-from models.embedding_model import embed_texts
-from models.llm_model import generate_summary
-from utils.faiss_index import build_faiss_index, save_index, load_index
+from models.embedding_model import embedder, embed_model_name, embed_texts, embed_texts_bulk, embed_query, cache_stats
+from models.embedding_model import batching_stats as embed_batching_stats
+from models.llm_model import LLM_NAME, llm, llm_tokenizer, generate_summary, stream_summary, pack_context
+from models.llm_model import batching_stats as llm_batching_stats
+from models.rerank_model import RERANK_ENABLED, RERANK_TOP_N, RERANK_BUDGET_MS, reranker, rerank
+from models.rerank_model import cache_stats as rerank_cache_stats
+from utils.faiss_index import INDEX_TYPE, FAISS_METRIC, load_index, search, similarity, apply_upserts, apply_deletes
+from utils.faiss_index import make_writable, stored_vectors
+from utils.faiss_index import index_kind, index_metric, index_storage
+from utils.meta_index import resolve_filters
+from utils.metrics import span, request_timings, request_profile, sample_lines
+from utils.metrics import stage_seconds, request_seconds, requests_total
+from utils.index_updates import DeltaLog, content_hash, item_hash, same_record
+from utils.ingest import build_item, stored_item, stream_rebuild, osdr_items, carry_over
+from utils.lexical_index import rrf_fuse
+from utils.passages import POOLINGS, PASSAGE_POOLING, build_passages, load_passages, passage_dir, pool
+from utils.snapshots import SnapshotStore, Snapshot, LiveSnapshot
+from utils.rebuild_jobs import RebuildJobs
+from utils.rwlock import RWLock
+from utils.summary_jobs import SummaryJobs
+from utils.summary_cache import SummaryCache
 
 INDEX_PATH = os.getenv("FAISS_INDEX_PATH", "data/faiss_index.bin")
 META_PATH = os.getenv("FAISS_META_PATH", "data/faiss_meta.json")
 CSV_PAPERS_PATH = os.getenv("CSV_PAPERS_PATH", "data/papers.csv")
+PAPERS_MAX_LIMIT = int(os.getenv("PAPERS_MAX_LIMIT", "1000"))
+# Al arrancar: carga índice y modelos en segundo plano (0 = en la primera petición que los use)
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") not in ("0", "false", "False")
+SUMMARY_MAX_LENGTH = 400
+# Recuperación: vector (FAISS) | lexical (BM25) | hybrid (fusión RRF de ambos).
+# Por defecto vector: score sigue siendo la similitud coseno; hybrid (score RRF) se pide
+# por consulta (mode) o con RETRIEVAL_MODE=hybrid
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))  # candidatos de cada lado antes de fusionar
+# /query/batch: consultas por petición, consultas que se embeben y buscan juntas, resúmenes en paralelo
+BATCH_QUERY_MAX = int(os.getenv("BATCH_QUERY_MAX", "10000"))
+BATCH_QUERY_CHUNK = int(os.getenv("BATCH_QUERY_CHUNK", "256"))
+BATCH_SUMMARY_WORKERS = int(os.getenv("BATCH_SUMMARY_WORKERS", "4"))
 
-app = FastAPI(title="NASA OSDR RAG API")
+# componentes que se cargan bajo demanda, en el orden del warm-up
+MODEL_COMPONENTS = {"embedding": embedder, "llm_tokenizer": llm_tokenizer, "llm": llm}
+if RERANK_ENABLED:
+    MODEL_COMPONENTS["reranker"] = reranker
+
+def warm_up():
+    """Índice primero (lo necesitan /stats y /papers), luego los modelos"""
+    try:
+        ensure_index_loaded()
+    except Exception as e:
+        print(f"Error cargando el índice: {e}")
+    for component in MODEL_COMPONENTS.values():
+        try:
+            component.get()
+        except Exception as e:
+            print(f"Error cargando {component.name}: {e}")
+
+@asynccontextmanager
+async def lifespan(app):
+    # el servidor acepta peticiones sin esperar a que terminen las cargas
+    if MODEL_WARMUP:
+        threading.Thread(target=warm_up, name="warmup", daemon=True).start()
+    yield
+
+app = FastAPI(title="NASA OSDR RAG API", lifespan=lifespan)
 ALLOWED_ORIGINS = [
     "http://localhost:5173",
     "http://127.0.0.1:5173",
@@ -31,18 +91,91 @@ app.add_middleware(
     allow_headers=["*"],              # Content-Type, Authorization, etc.
 )
 
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """
+    Latencia por ruta para /metrics. Con PROFILING_ENABLED, la cabecera X-Profile: html | text
+    perfila la petición (pyinstrument) y devuelve el perfil en lugar de la respuesta.
+    """
+    start = time.perf_counter()
+    profile = request.headers.get("x-profile")
+    slot = request_profile(profile) if profile else None
+    response = await call_next(request)
+    route = request.scope.get("route")
+    labels = (request.method, route.path if route is not None else "unmatched", str(response.status_code))
+    request_seconds.observe(time.perf_counter() - start, *labels)
+    requests_total.inc(*labels)
+    if slot is not None and slot.output is not None:
+        return HTMLResponse(slot.output) if slot.fmt == "html" else PlainTextResponse(slot.output)
+    return response
+
 
 class QueryRequest(BaseModel):
     query: str
     top_k: int = 5
     filters: Optional[Dict[str, Any]] = None  # Ej: {"program":"Apollo", "year":["2020","2021"]}
+    nprobe: Optional[int] = None     # solo índices IVF: listas a visitar
+    ef_search: Optional[int] = None  # solo índices HNSW: tamaño de la lista de candidatos
+    mode: Optional[str] = None       # vector | lexical | hybrid (por defecto RETRIEVAL_MODE)
+    rerank: Optional[bool] = None    # cross-encoder sobre los primeros candidatos (por defecto RERANK_ENABLED)
+    rerank_top_n: Optional[int] = None         # candidatos a re-puntuar (por defecto RERANK_TOP_N)
+    rerank_budget_ms: Optional[float] = None   # presupuesto del reranking (por defecto RERANK_BUDGET_MS)
+    min_score: Optional[float] = None  # similitud coseno mínima (modos vector y hybrid)
+    passages: Optional[bool] = None  # buscar también en los pasajes del texto completo (si hay índice)
+    pooling: Optional[str] = None    # max | sum: cómo se agregan los pasajes de un paper (por defecto PASSAGE_POOLING)
+    debug_timings: bool = False      # devuelve el tiempo de cada tramo (embedding, búsqueda, generación...)
+
+class SearchRequest(QueryRequest):
+    summarize: bool = True  # lanza el resumen como job aparte (ver /summary/{job_id})
+
+class BatchQueryRequest(BaseModel):
+    queries: List[QueryRequest]  # cada una con sus filtros, top_k, mode...
+    summarize: bool = False      # resumen de cada consulta (lento: una generación por consulta)
+
+class PaperIn(BaseModel):
+    id: Optional[str] = None  # si falta se deriva del contenido
+    title: str
+    abstract: str = ""
+    authors: str = ""
+    program: str = "Desconocido"
+    date: str = ""
+    link: str = ""
+    journal: str = ""
+
+class UpsertRequest(BaseModel):
+    items: List[PaperIn]
+
+class OSDRIngestRequest(BaseModel):
+    query: str
+    size: int = 20  # estudios de la búsqueda de OSDR a indexar
+
+class PassagesRequest(BaseModel):
+    index_type: Optional[str] = None  # por defecto FAISS_INDEX_TYPE
+    metric: Optional[str] = None      # por defecto FAISS_METRIC
 
 class RebuildRequest(BaseModel):
     limit: int = 1000
     include_csv: bool = True
+    index_type: Optional[str] = None  # flat | ivf | ivfpq | hnsw | fp16 | sq8 | pq (por defecto FAISS_INDEX_TYPE)
+    metric: Optional[str] = None      # ip (coseno) | l2 (por defecto FAISS_METRIC)
 
-# cargar índice en memoria al inicio (si existe)
-index, meta = load_index()
+class VersionRequest(BaseModel):
+    version: str  # versión de /index/versions a servir (rollback)
+
+# versiones del índice en disco (data/snapshots) y la que se sirve en memoria
+snapshots = SnapshotStore()
+live = LiveSnapshot()
+index_status = {"state": "idle", "load_s": None, "error": None, "version": None}
+summary_jobs = SummaryJobs(stream_summary)
+rebuild_jobs = RebuildJobs()
+summary_cache = SummaryCache(LLM_NAME)
+# búsquedas (read) en paralelo; las escrituras en el índice compartido (write) las excluyen
+index_lock = RWLock()
+# serializa a los escritores: upserts, deletes y la captura/publicación de un rebuild.
+# El embedding se hace con este lock, fuera de index_lock, así que no frena las consultas
+writer_lock = threading.Lock()
+# serializa las cargas de snapshots (las consultas siguen con la versión anterior mientras tanto)
+reload_lock = threading.Lock()
 
 # -------------------------
 # Utilidades internas
@@ -89,139 +222,408 @@ def match_filter(meta_item: dict, filters: dict) -> bool:
     return True
 
 def ensure_index_loaded():
-    global index, meta
+    """(índice, metadata) de la versión servida; la primera llamada la carga"""
+    if live.current is None:
+        with reload_lock:
+            if live.current is None:
+                reload_index()
+    snap = live.current
+    return (snap.index, snap.meta) if snap is not None else (None, {})
+
+@contextmanager
+def use_snapshot():
+    """
+    Snapshot servido (o None) durante todo el bloque: aunque haya un swap a mitad,
+    la petición sigue con la misma versión y esta no se libera hasta que termine.
+    """
+    ensure_index_loaded()
+    with live.acquire() as snap:
+        yield snap
+
+def open_snapshot(version=None):
+    """
+    Carga una versión de data/snapshots (por defecto la de CURRENT). Sin snapshots se usa
+    el índice de FAISS_INDEX_PATH / FAISS_META_PATH (versión "legacy").
+    """
+    version = version or snapshots.current()
+    if version is not None:
+        index_path, meta_path = snapshots.paths(version)
+    else:
+        version, index_path, meta_path = "legacy", INDEX_PATH, META_PATH
+    index, meta = load_index(index_path, meta_path)
     if index is None or not meta:
-        index, meta = load_index()
-    return index, meta
-
-def extract_year_from_date(date_str):
-    """Extrae el año de una fecha en formato string"""
-    if not date_str:
-        return ""
-    date_str = str(date_str)
-    # Buscar patrones de año (4 dígitos)
-    import re
-    year_match = re.search(r'\b(19|20)\d{2}\b', date_str)
-    return year_match.group() if year_match else ""
+        return None
+    # los pasajes se enlazan por id de paper, así que se comparten entre versiones
+    meta["passages"] = load_passages(META_PATH, meta)
+    return Snapshot(version, index, meta, index_path, meta_path)
+
+def reload_index(version=None):
+    """
+    Carga la versión en segundo plano respecto a las consultas (que siguen con la
+    anterior) y la publica con un swap atómico
+    """
+    index_status["state"] = "loading"
+    start = time.perf_counter()
+    try:
+        snap = open_snapshot(version)
+    except Exception as e:
+        index_status.update(state="error", error=str(e))
+        raise
+    if snap is not None:
+        live.swap(snap)
+    index_status.update(state="ready" if snap is not None else "missing", error=None,
+                        load_s=round(time.perf_counter() - start, 3),
+                        version=snap.version if snap is not None else None)
+    # los resúmenes cacheados dependen del contenido del índice
+    summary_cache.clear()
+    return snap
+
+def filter_candidates(meta, filters):
+    """
+    Posiciones que cumplen los filtros, o None si no hay filtros.
+    Los campos indexados se resuelven con el índice invertido; el resto con match_filter
+    solo sobre los candidatos.
+    """
+    candidate_ids, remaining = resolve_filters(meta.get("postings", {}), filters)
+    if remaining:
+        items_all = meta.get("items", [])
+        base = candidate_ids if candidate_ids is not None else range(len(items_all))
+        candidate_ids = np.array(
+            [i for i in base if match_filter(items_all[i].get("meta", {}), remaining)], dtype=np.int64
+        )
+    return live_positions(meta, candidate_ids)
+
+def deleted_positions(meta):
+    overlay = meta.get("overlay")
+    return overlay.deleted_sorted() if overlay is not None and overlay.deleted else None
+
+def live_positions(meta, positions):
+    """Quita de positions las filas borradas con /index/items"""
+    deleted = deleted_positions(meta)
+    if positions is None or deleted is None:
+        return positions
+    return np.setdiff1d(positions, deleted, assume_unique=True)
+
+def rank_to_position(rank, deleted):
+    """
+    Posición de la fila viva número rank (0-based) saltando las borradas.
+    Punto fijo p = rank + #borradas<=p: converge en pocas iteraciones de searchsorted.
+    """
+    pos = rank
+    while True:
+        nxt = rank + int(np.searchsorted(deleted, pos, side="right"))
+        if nxt == pos:
+            return pos
+        pos = nxt
 
 # -------------------------
 # Endpoints
 # -------------------------
-@app.post("/rebuild_index")
+def run_rebuild(job, limit, index_type, metric):
+    """
+    Worker de /rebuild_index: índice FAISS a partir del CSV de papers en una versión nueva
+    de data/snapshots; las consultas siguen con la actual hasta el swap final.
+    Los papers añadidos por API/OSDR y los borrados del snapshot servido se conservan, y los
+    cambios incrementales que lleguen mientras tanto se copian al log de la versión nueva.
+    """
+    if not os.path.exists(CSV_PAPERS_PATH):
+        raise ValueError("No se encontraron items para indexar.")
+    carried, carried_vectors, deleted_ids, source_log, log_offset, dim = [], None, set(), None, 0, 0
+    with use_snapshot() as snap, writer_lock:
+        if snap is not None:
+            manifest = snapshots.manifest(snap.version) or {}
+            carried, carried_vectors, deleted_ids = carry_over(
+                snap.index, snap.meta, deleted_ids=snapshots.deleted_ids(snap.version),
+                # vectores de otro modelo (o de un snapshot que no lo dice) se re-embeben
+                reuse_vectors=manifest.get("embed_model") == embed_model_name
+            )
+            source_log, dim = DeltaLog(snap.meta_path), snap.index.d
+            log_offset = source_log.offset()
+    # Lectura, embeddings, índice y metadata por bloques del CSV, en un directorio temporal
+    print(f"Indexando {CSV_PAPERS_PATH} por bloques (job {job.id}, {len(carried)} papers de API/OSDR)...")
+    with snapshots.create(source=CSV_PAPERS_PATH, index_type=index_type or INDEX_TYPE,
+                          metric=metric or FAISS_METRIC, embed_model=embed_model_name) as pending:
+        indexed = stream_rebuild(
+            CSV_PAPERS_PATH, lambda texts: embed_texts_bulk(texts, processes=rebuild_jobs.threads,
+                                                            threads=rebuild_jobs.threads),
+            index_type=index_type, metric=metric, limit=limit,
+            index_path=pending.index_path, meta_path=pending.meta_path,
+            progress=lambda p: job.update(**p), check=job.check,
+            skip_ids=deleted_ids | {it["id"] for it in carried},
+            extra_items=carried, extra_vectors=carried_vectors
+        )
+        if not indexed:
+            raise ValueError("No se encontraron items para indexar.")
+        pending.write_deleted_ids(deleted_ids)
+        pending.info.update(indexed=indexed, carried=len(carried))
+    
+    # publicar: swap en memoria y, si la versión cargó, CURRENT apunta a ella. Con writer_lock
+    # no entran escrituras entre la copia del log y el swap
+    job.update(stage="loading")
+    with reload_lock, writer_lock:
+        if source_log is not None:
+            DeltaLog(snapshots.paths(pending.version)[1]).append_from(source_log, dim, offset=log_offset)
+        reload_index(pending.version)
+        snapshots.set_current(pending.version)
+    removed = snapshots.prune(protect=live_versions())
+    print(f"Índice reconstruido con {indexed} papers ({pending.version})")
+    return {"indexed": indexed, "carried": len(carried), "version": pending.version, "pruned": removed}
+
+@app.post("/rebuild_index", status_code=202)
 def rebuild_index(req: RebuildRequest):
     """
-    Reconstruye índice FAISS a partir del CSV de papers.
+    Lanza la reconstrucción del índice en segundo plano y devuelve el job al momento.
+    El progreso (filas leídas, embebidas, indexadas, ETA) se consulta en
+    /rebuild_index/{job_id}; DELETE sobre esa ruta la cancela. 409 si ya hay una en marcha.
     """
-    try:
-        items = []
-        
-        # Cargar CSV de papers
-        if req.include_csv and os.path.exists(CSV_PAPERS_PATH):
-            try:
-                df = pd.read_csv(CSV_PAPERS_PATH)
-                print(f"CSV cargado con {len(df)} filas")
-                
-                # Limitar si es necesario
-                if req.limit > 0:
-                    df = df.head(req.limit)
-                
-                for i, row in df.iterrows():
-                    # Extraer campos principales con valores por defecto
-                    title = safe_str(row.get("title", row.get("Title", "")))
-                    abstract = safe_str(row.get("abstract", row.get("Abstract", row.get("summary", ""))))
-                    authors = safe_str(row.get("authors", row.get("Authors", "")))
-                    program = safe_str(row.get("program", row.get("Program", "Desconocido")))
-                    date = safe_str(row.get("date", row.get("Date", "")))
-                    year = extract_year_from_date(date)
-                    link = safe_str(row.get("link", row.get("Link", "")))
-                    journal = safe_str(row.get("journal", row.get("Journal", "")))
-                    
-                    # Texto para embeddings (combinación de título y abstract)
-                    text = f"{title}\n\n{abstract}".strip()
-                    
-                    # Metadata completa
-                    meta_item = {
-                        "origin": "csv",
-                        "id": f"csv-{i}",
-                        "title": title,
-                        "authors": authors,
-                        "program": program,
-                        "date": date,
-                        "year": year,
-                        "link": link,
-                        "journal": journal,
-                        "abstract": abstract[:500] if abstract else "",  # preview del abstract
-                        "raw": row.to_dict()
-                    }
-                    
-                    items.append({
-                        "id": f"csv-{i}", 
-                        "text": text, 
-                        "meta": meta_item
-                    })
-                    
-                print(f"Se procesaron {len(items)} items para indexar")
-                
-            except Exception as e:
-                print(f"Error procesando CSV: {e}")
-                traceback.print_exc()
-                raise HTTPException(status_code=500, detail=f"Error procesando CSV: {e}")
+    if not req.include_csv or not os.path.exists(CSV_PAPERS_PATH):
+        raise HTTPException(status_code=400, detail="No se encontraron items para indexar.")
+    job, created = rebuild_jobs.submit(run_rebuild, limit=req.limit, index_type=req.index_type, metric=req.metric)
+    if not created:
+        raise HTTPException(status_code=409, detail={"message": "Ya hay una reconstrucción en marcha",
+                                                     "job_id": job.id, "status_url": f"/rebuild_index/{job.id}"})
+    return {"job_id": job.id, "status": job.status, "status_url": f"/rebuild_index/{job.id}"}
 
-        if not items:
-            raise HTTPException(status_code=400, detail="No se encontraron items para indexar.")
+@app.get("/rebuild_index")
+def list_rebuild_jobs():
+    """
+    Reconstrucciones recientes, de la más nueva a la más antigua
+    """
+    return {"jobs": rebuild_jobs.list()}
+
+@app.get("/rebuild_index/{job_id}")
+def get_rebuild_job(job_id: str):
+    """
+    Estado de una reconstrucción: pending | running | done | error | cancelled, con el
+    progreso (stage, rows, embedded, indexed, estimated_total, elapsed_s, eta_s)
+    """
+    job = rebuild_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return job
+
+@app.delete("/rebuild_index/{job_id}")
+def cancel_rebuild_job(job_id: str):
+    """
+    Cancela la reconstrucción: se para en el siguiente bloque y la versión a medias se
+    descarta (se sigue sirviendo la actual)
+    """
+    job = rebuild_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return job
 
-        # Generar embeddings y construir índice
-        texts = [it["text"] or it["meta"]["title"] for it in items]
-        print(f"Generando embeddings para {len(texts)} textos...")
-        embeddings = embed_texts(texts)
+def upsert(items):
+    """
+    Añade o actualiza items (de build_item) sin reconstruir el índice.
+    Solo se embeben los nuevos o cuyo title+abstract cambió (content_hash); si solo cambió
+    el resto de la metadata (autores, año, ficheros...) se guarda con el vector que ya tenía.
+    Los idénticos a lo guardado no se tocan.
+    """
+    with use_snapshot() as snap, writer_lock:
+        if snap is None:
+            raise HTTPException(status_code=400, detail="Índice no encontrado. Llama a /rebuild_index primero.")
+        index, meta = snap.index, snap.meta
         
-        print("Construyendo índice FAISS...")
-        faiss_index = build_faiss_index(embeddings)
+        to_embed, meta_only, kept = [], [], []
+        for it in items:
+            pos = meta["id_index"].get(it["id"])
+            if pos is None or item_hash(meta["items"][pos]) != it["meta"]["content_hash"]:
+                to_embed.append(it)
+            elif not same_record(meta["items"][pos], stored_item(it)):
+                meta_only.append(it)
+                kept.append(pos)
         
-        # Guardar metadata
-        meta_dict = {
-            "items": [
-                {
-                    "id": it["id"], 
-                    "meta": it["meta"], 
-                    "text_preview": it["text"][:400] if it["text"] else it["meta"]["title"]
-                } for it in items
-            ]
-        }
+        reused = stored_vectors(index, kept, exact=meta.get("exact_vectors")) if kept else None
+        if kept and reused is None:
+            # el índice no guarda el vector recuperable (cuantizado sin float32): se re-embebe
+            to_embed, meta_only = to_embed + meta_only, []
+        changed = to_embed + meta_only
         
-        save_index(faiss_index, meta_dict)
-        # recargar en memoria
-        ensure_index_loaded()
+        if changed:
+            vectors = embed_texts([it["text"] or it["meta"]["title"] for it in to_embed])
+            if meta_only:
+                vectors = np.vstack([vectors, reused]) if len(to_embed) else reused
+            stored = [stored_item(it) for it in changed]
+            # primero se persiste el cambio, luego se aplica en memoria
+            DeltaLog(snap.meta_path).append([{"op": "upsert", "item": s} for s in stored], vectors)
+            # la copia en memoria de un índice mapeado se hace aparte, sin tocar el servido;
+            # solo el cambio de índice y la escritura van con el lock de escritura
+            index = make_writable(index, meta)
+            with index_lock.write():
+                snap.index = index
+                apply_upserts(index, meta, stored, vectors)
+            summary_cache.invalidate_docs([it["id"] for it in changed])
         
         return {
-            "status": "ok", 
-            "indexed": len(items),
-            "message": f"Índice reconstruido con {len(items)} papers del CSV"
+            "status": "ok",
+            "upserted": len(changed),
+            "embedded": len(to_embed),
+            "unchanged": len(items) - len(changed),
+            "total": int(index.ntotal) - len(meta["overlay"].tombstones)
         }
-        
+
+def run_passages(job, index_type=None, metric=None):
+    """
+    Worker de /index/passages (en rebuild_jobs): los artículos se leen y se embeben en el
+    hilo limitado de las reconstrucciones, con la versión servida fijada mientras dura
+    """
+    with use_snapshot() as snap:
+        if snap is None:
+            raise ValueError("Índice no encontrado. Llama a /rebuild_index primero.")
+        deleted = snap.meta["overlay"].deleted
+        items = (it for pos, it in enumerate(snap.meta["items"]) if pos not in deleted)
+        job.update(stage="passages")
+        result = build_passages(
+            items, lambda texts: embed_texts_bulk(texts, processes=rebuild_jobs.threads,
+                                                  threads=rebuild_jobs.threads),
+            passage_dir(META_PATH), index_type=index_type, metric=metric,
+            progress=lambda p: job.update(**p), check=job.check
+        )
+    # se publica en la versión que se sirva ahora (una recarga posterior ya lo carga sola)
+    job.update(stage="loading")
+    with use_snapshot() as snap:
+        passages = load_passages(META_PATH, snap.meta)
+        with index_lock.write():
+            snap.meta["passages"] = passages
+    return result
+
+@app.post("/index/passages", status_code=202)
+def index_passages(req: PassagesRequest):
+    """
+    Construye en segundo plano el índice de pasajes a partir de los artículos de PMC
+    guardados en local (PMC_TEXT_DIR/PMC<id>.txt) de los papers indexados. Va por el
+    mismo worker que /rebuild_index (de uno en uno, con sus límites de hilos y prioridad):
+    el progreso se consulta en /rebuild_index/{job_id}. 409 si ya hay un job en marcha.
+    """
+    index, meta = ensure_index_loaded()
+    if index is None or not meta:
+        raise HTTPException(status_code=400, detail="Índice no encontrado. Llama a /rebuild_index primero.")
+    job, created = rebuild_jobs.submit(run_passages, index_type=req.index_type, metric=req.metric)
+    if not created:
+        raise HTTPException(status_code=409, detail={"message": "Ya hay una reconstrucción en marcha",
+                                                     "job_id": job.id, "status_url": f"/rebuild_index/{job.id}"})
+    return {"job_id": job.id, "status": job.status, "status_url": f"/rebuild_index/{job.id}"}
+
+@app.post("/index/items")
+def upsert_items(req: UpsertRequest):
+    """
+    Añade o actualiza papers sin reconstruir el índice
+    """
+    items = []
+    for p in req.items:
+        h = content_hash(p.title, p.abstract)
+        items.append(build_item(p.id or f"api-{h[:12]}", dict(p), origin="api"))
+    return upsert(items)
+
+@app.post("/index/osdr")
+def ingest_osdr(req: OSDRIngestRequest):
+    """
+    Indexa los estudios de OSDR que devuelve la búsqueda (origin "osdr").
+    Los estudios se descargan en paralelo y los que no cambiaron salen de la cache HTTP;
+    solo se re-embeben los que cambiaron de contenido.
+    """
+    try:
+        items = osdr_items(req.query, size=req.size)
     except Exception as e:
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Error reconstruyendo índice: {e}")
+        raise HTTPException(status_code=502, detail=f"Error consultando OSDR: {e}")
+    if not items:
+        return {"status": "ok", "upserted": 0, "unchanged": 0, "studies": 0}
+    return {**upsert(items), "studies": len(items)}
+
+@app.delete("/index/items/{paper_id}")
+def delete_item(paper_id: str):
+    """
+    Borra un paper del índice sin reconstruirlo
+    """
+    with use_snapshot() as snap, writer_lock:
+        pos = snap.meta["id_index"].get(paper_id) if snap is not None else None
+        if pos is None:
+            raise HTTPException(status_code=404, detail="Paper no encontrado")
+        DeltaLog(snap.meta_path).append([{"op": "delete", "id": paper_id}])
+        index = make_writable(snap.index, snap.meta)
+        with index_lock.write():
+            snap.index = index
+            apply_deletes(index, snap.meta, [pos])
+        summary_cache.invalidate_docs([paper_id])
+        return {"status": "ok", "deleted": paper_id}
+
+def live_versions():
+    """Versiones cargadas en memoria (la servida y las que aún terminan consultas)"""
+    stats = live.stats()
+    return {stats["version"], *(s["version"] for s in stats["retiring"])} - {None}
+
+@app.get("/index/versions")
+def list_versions():
+    """
+    Versiones del índice en disco (manifest: fecha, papers, tipo de índice, métrica) y
+    la que se está sirviendo, con las consultas en curso sobre cada versión cargada
+    """
+    return {"current": snapshots.current(), "versions": snapshots.versions(), "live": live.stats()}
+
+@app.post("/index/versions")
+def activate_version(req: VersionRequest):
+    """
+    Sirve otra versión ya construida (rollback) sin cortar las consultas en curso
+    """
+    if snapshots.manifest(req.version) is None:
+        raise HTTPException(status_code=404, detail="Versión no encontrada")
+    with reload_lock:
+        snap = reload_index(req.version)
+        if snap is None:
+            raise HTTPException(status_code=500, detail=f"La versión {req.version} no se pudo cargar")
+        # CURRENT solo cambia si la versión carga bien
+        snapshots.set_current(req.version)
+    return {"status": "ok", "version": req.version, "live": live.stats()}
 
 @app.get("/papers")
-def list_papers(limit: int = 200, program: Optional[str] = None, year: Optional[str] = None):
+def list_papers(limit: int = 200, offset: int = 0, cursor: Optional[int] = None,
+                program: Optional[str] = None, year: Optional[str] = None):
     """
-    Lista todos los papers con filtros opcionales
+    Lista los papers con filtros opcionales, paginado.
+    - offset: salta los primeros N papers que cumplen los filtros.
+    - cursor: valor de next_cursor de la página anterior (estable aunque cambie el total).
+    Solo se hidratan los papers de la página pedida.
     """
     index, meta = ensure_index_loaded()
     if not meta:
         return {"papers": []}
     
-    papers = meta.get("items", [])
+    with index_lock.read():
+        items_all = meta.get("items", [])
+        limit = max(0, min(limit, PAPERS_MAX_LIMIT))
     
-    # Aplicar filtros
-    if program:
-        papers = [p for p in papers if program.lower() in safe_lower(p["meta"].get("program", ""))]
+        # Posiciones que cumplen los filtros (postings precalculadas), None = sin filtros
+        positions, _ = resolve_filters(meta.get("postings", {}), {"program": program, "year": year})
+        positions = live_positions(meta, positions)
+        deleted = deleted_positions(meta)
+        if positions is None and deleted is not None:
+            # sin filtros pero con filas borradas: se recorre desde la posición de inicio saltándolas
+            total = len(items_all) - len(deleted)
+            start = max(0, cursor) if cursor is not None else rank_to_position(max(0, offset), deleted)
+            skip = meta["overlay"].deleted
+            page = []
+            pos = start
+            while len(page) < limit and pos < len(items_all):
+                if pos not in skip:
+                    page.append(pos)
+                pos += 1
+            next_cursor = pos if pos < len(items_all) and len(page) == limit else None
+            return {"papers": [items_all[i] for i in page], "total": total, "next_cursor": next_cursor}
+        if positions is None:
+            total = len(items_all)
+            start = max(0, cursor if cursor is not None else offset)
+            page = range(start, min(start + limit, total))
+        else:
+            total = len(positions)
+            start = int(np.searchsorted(positions, cursor)) if cursor is not None else max(0, offset)
+            page = positions[start:start + limit]
     
-    if year:
-        papers = [p for p in papers if year in safe_str(p["meta"].get("year", ""))]
+        papers = [items_all[int(i)] for i in page]
+        next_cursor = int(page[-1]) + 1 if len(page) and start + limit < total else None
     
-    return {"papers": papers[:limit], "total": len(papers)}
+        return {"papers": papers, "total": total, "next_cursor": next_cursor}
 
 @app.get("/paper/{paper_id}")
 def get_paper(paper_id: str):
@@ -229,10 +631,11 @@ def get_paper(paper_id: str):
     Obtiene un paper específico por ID
     """
     index, meta = ensure_index_loaded()
-    for it in meta.get("items", []):
-        if it["id"] == paper_id:
-            return it
-    raise HTTPException(status_code=404, detail="Paper no encontrado")
+    with index_lock.read():
+        pos = meta.get("id_index", {}).get(paper_id)
+        if pos is None:
+            raise HTTPException(status_code=404, detail="Paper no encontrado")
+        return meta["items"][pos]
 
 @app.get("/stats")
 def get_stats():
@@ -243,101 +646,272 @@ def get_stats():
     if not meta:
         return {"total_papers": 0, "programs": [], "years": []}
     
-    papers = meta.get("items", [])
-    programs = list(set(p["meta"].get("program", "Desconocido") for p in papers))
-    years = list(set(p["meta"].get("year", "") for p in papers if p["meta"].get("year")))
+    with index_lock.read():
+        total = len(meta.get("items", [])) - len(meta["overlay"].deleted)
+        programs = field_values(meta, "program")
+        years = field_values(meta, "year")
     
     return {
-        "total_papers": len(papers),
+        "total_papers": total,
         "programs": programs,
         "years": [y for y in years if y]  # filtrar años vacíos
     }
 
-@app.post("/query")
-def query_papers(request: QueryRequest):
+def field_values(meta, field):
     """
-    Búsqueda semántica + RAG con filtros avanzados
+    Valores distintos de un campo entre los papers vivos, sacados de sus postings: solo se
+    hidrata una fila por término, para devolver el valor tal cual (el término va en minúsculas)
     """
-    try:
-        index, meta = ensure_index_loaded()
-        if index is None or not meta:
+    deleted = meta["overlay"].deleted
+    items_all = meta["items"]
+    values = {}
+    for term, positions in meta["postings"][field].items():
+        if term in values:
+            continue
+        pos = next((int(p) for p in positions if int(p) not in deleted), None)
+        if pos is not None:
+            values[term] = items_all[pos]["meta"].get(field, "")
+    return list(values.values())
+
+def retrieve(request: QueryRequest):
+    """
+    Búsqueda con filtros: (papers ordenados por score, embedding de la consulta, info del rerank).
+    papers es None si ningún paper cumple los filtros; la info del rerank es None si no se aplicó.
+    Según mode: vector (score = similitud coseno), lexical (score BM25, sin embedding:
+    el embedding devuelto es None) o hybrid (score RRF de ambos rankings). Los papers
+    que salen de la búsqueda vectorial llevan además "similarity" (coseno).
+    Si hay índice de pasajes, el lado vectorial agrega por paper (max/sum) la similitud del
+    título/abstract y la de sus pasajes, y el paper lleva el mejor pasaje en "passage".
+    min_score descarta los papers con similitud por debajo antes de fusionar e hidratar; en
+    hybrid se queda solo con los que la pasan (los que solo salen en BM25 no tienen
+    similitud) y en lexical no se admite. Si no queda ninguno, papers es [].
+    """
+    mode, pooling = retrieval_options(request)
+    with use_snapshot() as snap:
+        if snap is None:
             raise HTTPException(status_code=400, detail="Índice no encontrado. Llama a /rebuild_index primero.")
+        return retrieve_from(request, snap, mode, pooling)
 
-        filters = request.filters or {}
-        
-        # Embed consulta
-        q_emb = embed_texts([request.query])
-        
-        # Buscar más resultados de los pedidos para tener margen al filtrar
-        search_k = min(max(request.top_k * 10, 10), max(1, index.ntotal))
-        D, I = index.search(q_emb, search_k)
-        D = D[0]  # distances
-        I = I[0]  # indices
+def retrieval_options(request):
+    """(mode, pooling) de la petición con sus valores por defecto; 400 si no son válidos"""
+    mode = (request.mode or RETRIEVAL_MODE).lower()
+    if mode not in RETRIEVAL_MODES:
+        raise HTTPException(status_code=400, detail=f"mode debe ser uno de {', '.join(RETRIEVAL_MODES)}")
+    pooling = (request.pooling or PASSAGE_POOLING).lower()
+    if pooling not in POOLINGS:
+        raise HTTPException(status_code=400, detail=f"pooling debe ser uno de {', '.join(POOLINGS)}")
+    if mode == "lexical" and request.min_score is not None:
+        raise HTTPException(status_code=400, detail="min_score es una similitud coseno: solo vale con mode vector o hybrid")
+    return mode, pooling
 
-        # Recoger resultados aplicando filtros
-        items_all = meta.get("items", [])
-        selected = []
-        
-        for pos, idx in enumerate(I):
-            if idx < 0 or idx >= len(items_all):
-                continue
-                
-            item = items_all[idx]
-            meta_item = item.get("meta", {})
+def search_sizes(request, mode, n_candidates):
+    """(use_rerank, limit, search_k): papers a devolver antes del corte a top_k y k de cada búsqueda"""
+    use_rerank = RERANK_ENABLED if request.rerank is None else request.rerank
+    # con rerank se recuperan los primeros N candidatos y el cross-encoder decide el top_k
+    limit = max(request.top_k, request.rerank_top_n or RERANK_TOP_N) if use_rerank else request.top_k
+    # en hybrid cada lado aporta más candidatos de los pedidos para que la fusión tenga margen
+    pool_k = limit if mode != "hybrid" else max(limit, HYBRID_CANDIDATES)
+    return use_rerank, limit, min(pool_k, max(1, n_candidates))
+
+def retrieve_from(request, snap, mode, pooling, q_emb=None, presearch=None):
+    """
+    retrieve sobre un snapshot ya adquirido; el filtro y las búsquedas van con index_lock
+    de lectura. q_emb: embedding ya calculado (batch); presearch: (D, I) de una búsqueda
+    multi-fila sin filtros con k >= el necesario, que se usa si la consulta no tiene filtros
+    """
+    # Embed consulta
+    if mode != "lexical" and q_emb is None:
+        with span("embed_query"):
+            q_emb = embed_query(request.query)
+    
+    with index_lock.read():
+        hits = search_hits(request, snap, mode, pooling, q_emb, presearch)
+    return finish_hits(request, snap, q_emb, hits)
+
+def search_hits(request, snap, mode, pooling, q_emb, presearch=None):
+    """
+    La parte de retrieve_from que lee el índice: filtro, búsquedas y fusión. Se llama con
+    index_lock de lectura ya tomado (no es reentrante). Devuelve None si ningún paper
+    cumple los filtros y, si no, lo que finish_hits necesita para hidratar y hacer el rerank.
+    """
+    meta = snap.meta
+    index = snap.index
+    # Pre-filtrado: la búsqueda solo recorre los documentos que cumplen los filtros
+    with span("filter"):
+        candidate_ids = filter_candidates(meta, request.filters or {})
+    if candidate_ids is not None and len(candidate_ids) == 0:
+        return None
+
+    n_candidates = len(candidate_ids) if candidate_ids is not None else index.ntotal
+    use_rerank, limit, search_k = search_sizes(request, mode, n_candidates)
+    vector_hits, lexical_hits = [], []
+    similarities, best_passages = {}, {}
+    passages = meta.get("passages") if request.passages is not False else None
+    if mode != "lexical":
+        if presearch is not None and candidate_ids is None:
+            D, I = presearch[0][:, :search_k], presearch[1][:, :search_k]
+        else:
+            with span("vector_search"):
+                D, I = search(index, q_emb, search_k, nprobe=request.nprobe, ef_search=request.ef_search,
+                              ids=candidate_ids, exclude=meta["overlay"].tombstones,
+                              refine=meta.get("exact_vectors"))
+        paper_sims = {int(idx): [float(sim)] for idx, sim in zip(I[0], similarity(index, D[0])) if idx >= 0}
+        if passages is not None:
+            with span("passage_search"):
+                grouped = passages.search(q_emb, search_k, paper_positions=candidate_ids,
+                                          exclude=meta["overlay"].deleted)
+            for pos, hits in grouped.items():
+                paper_sims.setdefault(pos, []).extend(sim for sim, _ in hits)
+                best_passages[pos] = hits[0]
+        similarities = {pos: max(sims) for pos, sims in paper_sims.items()
+                        if request.min_score is None or max(sims) >= request.min_score}
+        vector_hits = sorted(((pos, pool(paper_sims[pos], pooling)) for pos in similarities),
+                             key=lambda hit: -hit[1])[:search_k]
+    if mode != "vector":
+        with span("lexical_search"):
+            positions, scores = meta["lexical"].search(request.query, search_k, ids=candidate_ids,
+                                                       exclude=meta["overlay"].deleted)
+        lexical_hits = [(int(p), float(sc)) for p, sc in zip(positions, scores)]
+
+    if mode == "hybrid":
+        if request.min_score is not None:
+            lexical_hits = [hit for hit in lexical_hits if hit[0] in similarities]
+        ranked = rrf_fuse([[p for p, _ in vector_hits], [p for p, _ in lexical_hits]], limit=limit)
+    else:
+        ranked = vector_hits or lexical_hits
+    return ranked, similarities, best_passages, passages, use_rerank
+
+def finish_hits(request, snap, q_emb, hits):
+    """Hidrata los papers de search_hits y aplica el rerank, fuera de index_lock"""
+    if hits is None:
+        return None, q_emb, None
+    ranked, similarities, best_passages, passages, use_rerank = hits
+    items_all = snap.meta.get("items", [])
+    selected = []
+    
+    for idx, score in ranked:
+        if idx >= len(items_all):
+            continue
             
-            if match_filter(meta_item, filters):
-                selected.append({
-                    "id": item.get("id"), 
-                    "meta": meta_item, 
-                    "text_preview": item.get("text_preview", "")[:1000], 
-                    "score": float(D[pos])
-                })
-                
-            if len(selected) >= request.top_k:
-                break
+        item = items_all[idx]
+        paper = {
+            "id": item.get("id"), 
+            "meta": item.get("meta", {}), 
+            "text_preview": item.get("text_preview", "")[:1000], 
+            "score": score
+        }
+        if idx in similarities:
+            paper["similarity"] = similarities[idx]
+        if idx in best_passages:
+            paper["passage"] = passages.text(best_passages[idx][1])[:1000]
+        selected.append(paper)
 
-        # Fallback: si no hay resultados después de filtrar, devolver los más relevantes globalmente
-        if not selected:
-            for pos, idx in enumerate(I[:request.top_k]):
-                if idx < 0 or idx >= len(items_all):
-                    continue
-                item = items_all[idx]
-                meta_item = item.get("meta", {})
-                selected.append({
-                    "id": item.get("id"), 
-                    "meta": meta_item, 
-                    "text_preview": item.get("text_preview", "")[:1000], 
-                    "score": float(D[pos])
-                })
-
-        # Construir contexto para el resumen LLM
-        context_parts = []
-        for s in selected[:8]:  # Limitar a 8 para no saturar el contexto
-            title = s["meta"].get("title", "")
-            abstract_preview = s["meta"].get("abstract", s["text_preview"])
-            context_parts.append(f"Título: {title}\nResumen: {abstract_preview}")
-        
-        context_text = "\n\n".join(context_parts)
-        
-        # Prompt mejorado para el resumen
-        prompt_for_summary = f"""
+    rerank_info = None
+    if use_rerank and selected:
+        with span("rerank"):
+            selected, rerank_info = rerank_papers(request, selected)
+    return selected[:request.top_k], q_emb, rerank_info
+
+def rerank_papers(request, selected):
+    """
+    Re-ordena los candidatos con el cross-encoder dentro del presupuesto de la petición.
+    Los que no llegan a puntuarse mantienen su orden detrás de los re-puntuados.
+    """
+    texts = [f"{s['meta'].get('title', '')}\n{s.get('passage') or s['meta'].get('abstract') or s['text_preview']}"
+             for s in selected]
+    budget_ms = request.rerank_budget_ms if request.rerank_budget_ms is not None else RERANK_BUDGET_MS
+    scores, info = rerank(request.query, texts, budget_ms=budget_ms)
+    for s, score in zip(selected, scores):
+        if score is not None:
+            s["rerank_score"] = score
+    reranked = sorted((s for s in selected if "rerank_score" in s), key=lambda s: -s["rerank_score"])
+    return reranked + [s for s in selected if "rerank_score" not in s], info
+
+def summary_context(query, selected):
+    """
+    Prompt del resumen y ids de los papers que entraron en él.
+    Los papers (ya ordenados por score) se empaquetan por tokens hasta llenar la
+    ventana del LLM, en vez de un número fijo de papers truncados a ciegas.
+    """
+    context_parts = []
+    for s in selected:
+        title = s["meta"].get("title", "")
+        # el pasaje del texto completo que encajó con la consulta, si lo hay
+        abstract_preview = s.get("passage") or s["meta"].get("abstract", s["text_preview"])
+        context_parts.append(f"Título: {title}\nResumen: {abstract_preview}")
+    
+    # Prompt mejorado para el resumen
+    header = f"""
         Basado en los siguientes documentos de investigación sobre biología espacial, proporciona un resumen conciso que responda a la consulta del usuario.
 
-        Consulta: {request.query}
+        Consulta: {query}
 
         Documentos relevantes:
-        {context_text}
+        """
+    footer = """
 
         Por favor, proporciona un resumen coherente de 3-5 oraciones que sintetice la información más relevante de estos documentos en relación con la consulta.
         """
+    prompt, used = pack_context(header, context_parts, footer)
+    return prompt, [s["id"] for s in selected[:used]]
 
-        summary = generate_summary(prompt_for_summary, max_length=400)
+def cached_summary(query, context_ids, q_emb):
+    """(resumen, "exact" | "approx") si ya se resumió esta consulta con los mismos documentos"""
+    return summary_cache.get(query, context_ids, q_emb, variant=SUMMARY_MAX_LENGTH)
 
-        return {
+def store_summary(query, context_ids, q_emb, summary, generation=None):
+    summary_cache.put(query, context_ids, summary, q_emb, variant=SUMMARY_MAX_LENGTH,
+                      generation=generation)
+
+@app.post("/query")
+def query_papers(request: QueryRequest):
+    """
+    Búsqueda semántica + RAG con filtros avanzados.
+    Espera al resumen; para recibir antes los papers usar /search.
+    Con debug_timings la respuesta lleva el tiempo de cada tramo.
+    """
+    with request_timings(request.debug_timings) as timings:
+        response = answer_query(request)
+    if timings is not None:
+        response["debug_timings"] = timings.as_dict()
+    return response
+
+def no_results_message(request, selected):
+    """Por qué no hay papers: retrieve da None si nadie cumple los filtros y [] si min_score los descartó"""
+    if selected is None:
+        return "No se encontraron papers que cumplan los filtros."
+    if request.min_score is not None:
+        return (f"Ningún paper llega a la similitud mínima (min_score={request.min_score:g}). "
+                "Prueba con un valor más bajo.")
+    return "No se encontraron papers."
+
+def answer_query(request):
+    try:
+        selected, q_emb, rerank_info = retrieve(request)
+        if not selected:
+            # sin contexto no se llama al LLM
+            return {
+                "summary": no_results_message(request, selected),
+                "papers": [],
+                "total_found": 0
+            }
+
+        with span("summary_context"):
+            prompt, context_ids = summary_context(request.query, selected)
+        with span("summary_cache"):
+            summary, _ = cached_summary(request.query, context_ids, q_emb)
+        if summary is None:
+            summary = generate_summary(prompt, max_length=SUMMARY_MAX_LENGTH)
+            store_summary(request.query, context_ids, q_emb, summary)
+
+        response = {
             "summary": summary, 
             "papers": selected,
             "total_found": len(selected)
         }
+        if rerank_info is not None:
+            response["rerank"] = rerank_info
+        return response
         
     except HTTPException:
         raise
@@ -349,6 +923,268 @@ def query_papers(request: QueryRequest):
             "total_found": 0
         }
 
+@app.post("/search")
+def search_papers(request: SearchRequest):
+    """
+    Solo recuperación: devuelve los papers sin esperar al LLM.
+    Si summarize, el resumen se genera en segundo plano: se consulta en
+    /summary/{job_id} o se recibe a trozos en /summary/{job_id}/stream (SSE).
+    """
+    with request_timings(request.debug_timings) as timings:
+        response = search_response(request)
+    if timings is not None:
+        response["debug_timings"] = timings.as_dict()
+    return response
+
+def search_response(request):
+    selected, q_emb, rerank_info = retrieve(request)
+    if not selected:
+        return {"papers": [], "total_found": 0, "summary_job": None,
+                "message": no_results_message(request, selected)}
+
+    job = None
+    if request.summarize and selected:
+        with span("summary_context"):
+            prompt, context_ids = summary_context(request.query, selected)
+        with span("summary_cache"):
+            summary, hit = cached_summary(request.query, context_ids, q_emb)
+        if summary is not None:
+            job_id = summary_jobs.done(summary)
+        else:
+            generation = summary_cache.generation
+            job_id = summary_jobs.submit(
+                prompt, max_length=SUMMARY_MAX_LENGTH,
+                on_done=lambda text: store_summary(request.query, context_ids, q_emb, text, generation)
+            )
+        job = {"job_id": job_id, "status_url": f"/summary/{job_id}", "stream_url": f"/summary/{job_id}/stream",
+               "cache": hit}
+    response = {"papers": selected, "total_found": len(selected), "summary_job": job}
+    if rerank_info is not None:
+        response["rerank"] = rerank_info
+    return response
+
+@app.post("/query/batch")
+def query_batch(req: BatchQueryRequest):
+    """
+    Muchas consultas en una petición (evaluaciones, barridos bibliográficos). Se procesan
+    por bloques de BATCH_QUERY_CHUNK: los textos del bloque se embeben en una sola llamada
+    al encoder y las consultas sin filtros se buscan en un solo index.search multi-fila;
+    las que tienen filtros se buscan cada una con su pre-filtrado.
+    La respuesta es NDJSON: una línea por consulta ({"index", "query", "papers",
+    "total_found"[, "summary"][, "error"]}) según van saliendo, y una última línea con
+    {"done": true, ...}. Solo se tiene en memoria un bloque a la vez.
+    """
+    if len(req.queries) > BATCH_QUERY_MAX:
+        raise HTTPException(status_code=400, detail=f"Máximo {BATCH_QUERY_MAX} consultas por petición")
+    ensure_index_loaded()
+    if live.current is None:
+        raise HTTPException(status_code=400, detail="Índice no encontrado. Llama a /rebuild_index primero.")
+
+    def lines():
+        start, errors = time.perf_counter(), 0
+        with use_snapshot() as snap:
+            for offset in range(0, len(req.queries), BATCH_QUERY_CHUNK):
+                chunk = req.queries[offset:offset + BATCH_QUERY_CHUNK]
+                for row in batch_chunk(snap, chunk, offset, req.summarize):
+                    errors += "error" in row
+                    yield json.dumps(row, ensure_ascii=False) + "\n"
+        yield json.dumps({"done": True, "queries": len(req.queries), "errors": errors,
+                          "elapsed_s": round(time.perf_counter() - start, 3)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+def batch_chunk(snap, chunk, offset, summarize):
+    """Filas de respuesta de un bloque de /query/batch, en el orden de las consultas"""
+    meta = snap.meta
+    rows, options, to_summarize = {}, {}, {}
+    for i, request in enumerate(chunk):
+        try:
+            options[i] = retrieval_options(request)
+        except HTTPException as e:
+            rows[i] = {"index": offset + i, "query": request.query, "error": e.detail}
+
+    def fail(ids, e):
+        # un fallo del bloque se devuelve en las filas de sus consultas, sin cortar el stream
+        traceback.print_exc()
+        for i in ids:
+            rows[i] = {"index": offset + i, "query": chunk[i].query, "error": str(e)}
+            del options[i]
+
+    # una sola llamada al encoder para todo el bloque
+    to_embed = [i for i, (mode, _) in options.items() if mode != "lexical"]
+    embeddings = {}
+    if to_embed:
+        try:
+            with span("batch_embed"):
+                vectors = embed_texts([chunk[i].query for i in to_embed])
+            embeddings = {i: vectors[j:j + 1] for j, i in enumerate(to_embed)}
+        except Exception as e:
+            fail(to_embed, e)
+
+    # consultas sin filtros: un index.search multi-fila por combinación de nprobe / ef_search
+    groups = {}
+    for i in embeddings:
+        if not chunk[i].filters:
+            groups.setdefault((chunk[i].nprobe, chunk[i].ef_search), []).append(i)
+    # presearch y búsquedas del bloque con un solo lock de lectura; el rerank y la
+    # hidratación van después, fuera del lock, para no retener a las escrituras
+    presearch, hits = {}, {}
+    with index_lock.read():
+        for (nprobe, ef_search), ids in groups.items():
+            try:
+                with span("batch_vector_search"):
+                    k = max(search_sizes(chunk[i], options[i][0], snap.index.ntotal)[2] for i in ids)
+                    D, I = search(snap.index, np.vstack([embeddings[i] for i in ids]), k, nprobe=nprobe,
+                                  ef_search=ef_search, exclude=meta["overlay"].tombstones,
+                                  refine=meta.get("exact_vectors"))
+            except Exception as e:
+                fail(ids, e)
+                continue
+            presearch.update({i: (D[j:j + 1], I[j:j + 1]) for j, i in enumerate(ids)})
+
+        for i, (mode, pooling) in list(options.items()):
+            try:
+                hits[i] = search_hits(chunk[i], snap, mode, pooling, embeddings.get(i), presearch.get(i))
+            except Exception as e:
+                fail([i], e)
+
+    for i, found in hits.items():
+        request = chunk[i]
+        try:
+            selected, q_emb, rerank_info = finish_hits(request, snap, embeddings.get(i), found)
+        except HTTPException as e:
+            rows[i] = {"index": offset + i, "query": request.query, "error": e.detail}
+            continue
+        except Exception as e:
+            traceback.print_exc()
+            rows[i] = {"index": offset + i, "query": request.query, "error": str(e)}
+            continue
+        row = {"index": offset + i, "query": request.query, "papers": selected or [],
+               "total_found": len(selected or [])}
+        if rerank_info is not None:
+            row["rerank"] = rerank_info
+        rows[i] = row
+        if summarize and selected:
+            to_summarize[i] = (request.query, selected, q_emb)
+
+    if to_summarize:
+        # en paralelo para que el micro-batcher del LLM agrupe las generaciones
+        with ThreadPoolExecutor(max_workers=max(1, BATCH_SUMMARY_WORKERS)) as pool:
+            summaries = pool.map(lambda args: batch_summary(*args), to_summarize.values())
+            for i, summary in zip(to_summarize, summaries):
+                rows[i]["summary"] = summary
+    return [rows[i] for i in range(len(chunk))]
+
+def batch_summary(query, selected, q_emb):
+    try:
+        prompt, context_ids = summary_context(query, selected)
+        summary, _ = cached_summary(query, context_ids, q_emb)
+        if summary is None:
+            summary = generate_summary(prompt, max_length=SUMMARY_MAX_LENGTH)
+            store_summary(query, context_ids, q_emb, summary)
+        return summary
+    except Exception as e:
+        traceback.print_exc()
+        return f"Error generando el resumen: {e}"
+
+@app.get("/summary/{job_id}")
+def get_summary(job_id: str):
+    """
+    Estado de un job de resumen: pending | running | done | error, con el texto generado hasta ahora
+    """
+    job = summary_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return job
+
+@app.get("/summary/{job_id}/stream")
+def stream_summary_job(job_id: str):
+    """
+    Resumen como Server-Sent Events: un evento por trozo ({"token": ...}) y
+    un evento final "done" (o "error") con el resumen completo
+    """
+    if summary_jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+
+    def events():
+        for piece in summary_jobs.follow(job_id):
+            yield f"data: {json.dumps({'token': piece}, ensure_ascii=False)}\n\n"
+        job = summary_jobs.get(job_id) or {"status": "error", "error": "Job expirado"}
+        event = "error" if job["status"] == "error" else "done"
+        yield f"event: {event}\ndata: {json.dumps(job, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    """
+    Aciertos/fallos de las caches de embeddings, de resúmenes y de scores del reranker
+    """
+    return {"embeddings": cache_stats(), "summaries": summary_cache.stats(), "rerank": rerank_cache_stats()}
+
+@app.get("/batching/stats")
+def get_batching_stats():
+    """
+    Estado del micro-batching: tamaño medio de batch, espera en cola y profundidad de cola
+    """
+    return {"embed_query": embed_batching_stats(), "llm_generate": llm_batching_stats()}
+
+@app.get("/metrics")
+def metrics():
+    """
+    Métricas en formato de texto de Prometheus: latencia por ruta y por tramo de las
+    consultas, aciertos de las caches, tamaño del índice y tiempos de carga
+    """
+    lines = request_seconds.render() + requests_total.render() + stage_seconds.render()
+    caches = {"summary": summary_cache.stats(), "rerank": rerank_cache_stats()}
+    embedding = cache_stats()
+    if embedding.get("enabled") and embedding.get("loaded", True):
+        caches["embedding"] = embedding
+    hits = {name: c.get("hits", c.get("hits_exact", 0) + c.get("hits_approx", 0)) for name, c in caches.items()}
+    lines += sample_lines("rag_cache_hits_total", "Aciertos de cada cache", hits, ["cache"], kind="counter")
+    lines += sample_lines("rag_cache_misses_total", "Fallos de cada cache",
+                          {name: c["misses"] for name, c in caches.items()}, ["cache"], kind="counter")
+    lines += sample_lines("rag_cache_hit_ratio", "Aciertos / consultas de cada cache",
+                          {name: c["hit_rate"] for name, c in caches.items()}, ["cache"])
+    lines += sample_lines("rag_cache_entries", "Entradas en cada cache",
+                          {name: c["entries"] for name, c in caches.items()}, ["cache"])
+
+    snap = live.current
+    if snap is not None:
+        meta = snap.meta
+        lines += sample_lines("rag_index_info", "Versión, tipo, almacenamiento y métrica del índice servido",
+                              {(snap.version, index_kind(snap.index), index_storage(snap.index),
+                                index_metric(snap.index)): 1},
+                              ["version", "type", "storage", "metric"])
+        lines += sample_lines("rag_index_vectors", "Vectores en el índice FAISS (incluye borrados aún no compactados)",
+                              int(snap.index.ntotal))
+        lines += sample_lines("rag_index_papers", "Papers servidos",
+                              len(meta.get("items", [])) - len(meta["overlay"].deleted))
+        lines += sample_lines("rag_index_deleted", "Papers borrados con /index/items", len(meta["overlay"].deleted))
+        passages = meta.get("passages")
+        lines += sample_lines("rag_passages", "Pasajes en el índice de texto completo",
+                              len(passages) if passages is not None else 0)
+
+    components = {"index": index_status}
+    components.update({name: c.status() for name, c in MODEL_COMPONENTS.items()})
+    lines += sample_lines("rag_component_load_seconds", "Tiempo de carga de cada componente",
+                          {name: c["load_s"] for name, c in components.items()}, ["component"])
+    lines += sample_lines("rag_component_ready", "1 si el componente está cargado",
+                          {name: int(c["state"] == "ready") for name, c in components.items()}, ["component"])
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+def readiness():
+    """
+    Estado de carga de cada componente (idle | loading | ready | error; el índice
+    puede estar "missing" si aún no se ha construido). 503 hasta que todo esté listo.
+    """
+    components = {"index": dict(index_status)}
+    components.update({name: c.status() for name, c in MODEL_COMPONENTS.items()})
+    ready = all(c["state"] == "ready" for c in components.values())
+    return JSONResponse({"ready": ready, "components": components}, status_code=200 if ready else 503)
+
 @app.get("/")
 def root():
     return {"message": "NASA Papers RAG API - Motor de búsqueda semántica para papers de biología espacial"}
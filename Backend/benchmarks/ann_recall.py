@@ -0,0 +1,89 @@
+# benchmarks/ann_recall.py
+"""
+Reporte recall@k vs latencia de los índices ANN frente al índice exacto (flat).
+Los cuantizados (fp16, sq8, pq) se barren por refine_factor: 1 = sin re-ranking exacto.
+
+Uso (desde Backend/):
+    python benchmarks/ann_recall.py                      # vectores de data/faiss_index.bin
+    python benchmarks/ann_recall.py --synthetic 100000   # corpus sintético
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import faiss  # noqa: E402
+from utils.faiss_index import INDEX_PATH, build_faiss_index, search  # noqa: E402
+from utils.refine import ExactVectors  # noqa: E402
+
+
+def load_vectors(args):
+    if args.synthetic:
+        rng = np.random.default_rng(args.seed)
+        # vectores agrupados para que se parezcan más a embeddings reales que el ruido uniforme
+        centers = rng.normal(size=(max(1, args.synthetic // 100), args.dim)).astype(np.float32)
+        labels = rng.integers(0, len(centers), size=args.synthetic)
+        return centers[labels] + 0.3 * rng.normal(size=(args.synthetic, args.dim)).astype(np.float32)
+    index = faiss.read_index(args.index_path)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def time_search(index, queries, k, **params):
+    start = time.perf_counter()
+    D, I = search(index, queries, k, **params)
+    elapsed = time.perf_counter() - start
+    return I, elapsed * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index-path", default=INDEX_PATH)
+    parser.add_argument("--synthetic", type=int, default=0, help="número de vectores sintéticos (0 = usar el índice)")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    xb = np.ascontiguousarray(load_vectors(args), dtype=np.float32)
+    rng = np.random.default_rng(args.seed)
+    xq = xb[rng.choice(len(xb), size=min(args.queries, len(xb)), replace=False)]
+    xq = xq + 0.05 * rng.normal(size=xq.shape).astype(np.float32)
+    k = min(args.k, len(xb))
+    print(f"Corpus: {len(xb)} vectores, dim {xb.shape[1]}, {len(xq)} consultas, k={k}\n")
+
+    flat = build_faiss_index(xb, index_type="flat")
+    truth, flat_ms = time_search(flat, xq, k)
+
+    print(f"{'índice':<8} {'parámetro':<17} {'build (s)':>10} {'ms/consulta':>12} {'recall@k':>9}")
+    print(f"{'flat':<8} {'-':<17} {'-':>10} {flat_ms:>12.3f} {1.0:>9.3f}")
+    sweeps = {
+        "ivf": [("nprobe", v) for v in (1, 4, 8, 16, 32)],
+        "ivfpq": [("nprobe", v) for v in (1, 4, 8, 16, 32)],
+        "hnsw": [("ef_search", v) for v in (16, 32, 64, 128)],
+        "fp16": [("refine_factor", v) for v in (1, 4)],
+        "sq8": [("refine_factor", v) for v in (1, 2, 4)],
+        "pq": [("refine_factor", v) for v in (1, 4, 8, 16)],
+    }
+    exact = ExactVectors(xb)
+    for index_type, params in sweeps.items():
+        start = time.perf_counter()
+        index = build_faiss_index(xb, index_type=index_type)
+        build_s = time.perf_counter() - start
+        for name, value in params:
+            refine = exact if name == "refine_factor" else None
+            found, ms = time_search(index, xq, k, refine=refine, **{name: value})
+            print(f"{index_type:<8} {f'{name}={value}':<17} {build_s:>10.2f} {ms:>12.3f} {recall_at_k(found, truth):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
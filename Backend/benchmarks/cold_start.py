@@ -0,0 +1,97 @@
+# benchmarks/cold_start.py
+"""
+Arranque en frío de la API: por cada endpoint se lanza un uvicorn nuevo y se mide el
+tiempo desde el arranque del proceso hasta el primer byte de una respuesta válida
+(para /ready, hasta el primer 200), más la latencia de una segunda petición ya en caliente.
+
+Uso (desde Backend/):
+    python benchmarks/cold_start.py
+    python benchmarks/cold_start.py --warmup 0           # sin warm-up en segundo plano
+    python benchmarks/cold_start.py --endpoints / /stats "POST /search"
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+QUERY = {"query": "efectos de la microgravedad en ratones", "top_k": 5}
+DEFAULT_ENDPOINTS = ["/", "/stats", "/papers?limit=20", "/ready", "POST /search", "POST /query"]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def request(base, endpoint, timeout):
+    """Devuelve (status, segundos hasta el primer byte) o (None, None) si no hay respuesta"""
+    method, _, path = endpoint.rpartition(" ")
+    data = json.dumps(QUERY).encode() if method == "POST" else None
+    req = urllib.request.Request(base + path, data=data, method=method or "GET",
+                                 headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as r:
+            r.read(1)
+            return r.status, time.perf_counter() - start
+    except urllib.error.HTTPError as e:
+        return e.code, time.perf_counter() - start
+    except OSError:
+        return None, None
+
+
+def cold_start(endpoint, args):
+    port = free_port()
+    env = dict(os.environ, MODEL_WARMUP=str(args.warmup))
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        while time.perf_counter() - start < args.timeout:
+            if proc.poll() is not None:
+                return None, None, "el proceso terminó"
+            status, _ = request(base, endpoint, args.timeout)
+            if status is not None and status < 500:
+                first = time.perf_counter() - start
+                _, warm = request(base, endpoint, args.timeout)
+                return first, warm, status
+            time.sleep(0.05)
+        return None, None, "timeout"
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="*", default=DEFAULT_ENDPOINTS)
+    parser.add_argument("--warmup", type=int, default=1, choices=(0, 1), help="valor de MODEL_WARMUP")
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    print(f"MODEL_WARMUP={args.warmup}\n")
+    print(f"{'endpoint':<20} {'primer byte (s)':>16} {'en caliente (ms)':>17} {'status':>7}")
+    for endpoint in args.endpoints:
+        first, warm, status = cold_start(endpoint, args)
+        if first is None:
+            print(f"{endpoint:<20} {'-':>16} {'-':>17} {status:>7}")
+        else:
+            print(f"{endpoint:<20} {first:>16.2f} {warm * 1000:>17.1f} {status:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/compare.py
+"""
+Compara dos resultados de benchmarks/suite.py (p. ej. antes y después de un cambio) y
+marca las regresiones: latencias, tiempos, memoria y disco que suben, o recall, MRR y
+throughput que bajan, más de --threshold. Sale con código 1 si hay alguna.
+
+Uso (desde Backend/):
+    python benchmarks/compare.py results/antes.json results/despues.json
+    python benchmarks/compare.py antes.json despues.json --threshold 0.05 --all
+"""
+import argparse
+import json
+import sys
+
+# campos que identifican una fila dentro de una lista de resultados
+KEY_FIELDS = ("source", "size", "type")
+# diferencias absolutas por debajo de estas se consideran ruido (tiempos muy pequeños)
+NOISE_FLOOR = {"_ms": 0.25, "_s": 0.05, "_mb": 5.0}
+
+
+def direction(metric):
+    """+1 si más es mejor, -1 si menos es mejor, 0 si no se compara"""
+    name = metric.rsplit(".", 1)[-1]
+    if "recall" in name or "mrr" in name or name.endswith("_per_s"):
+        return 1
+    if name.endswith(("_ms", "_s", "_mb")):
+        return -1
+    return 0
+
+
+def flatten(node, prefix=""):
+    """{"index[size=1000,type=ivf].p50_ms": valor, ...} con las hojas numéricas"""
+    flat = {}
+    if isinstance(node, dict):
+        for key, value in node.items():
+            flat.update(flatten(value, f"{prefix}.{key}" if prefix else key))
+    elif isinstance(node, list):
+        for i, row in enumerate(node):
+            if isinstance(row, dict):
+                ident = ",".join(f"{f}={row[f]}" for f in KEY_FIELDS if f in row) or str(i)
+                flat.update(flatten({k: v for k, v in row.items() if k not in KEY_FIELDS}, f"{prefix}[{ident}]"))
+    elif isinstance(node, (int, float)) and not isinstance(node, bool):
+        flat[prefix] = float(node)
+    return flat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="cambio relativo tolerado (0.10 = 10%%)")
+    parser.add_argument("--all", action="store_true", help="mostrar también las métricas sin cambios relevantes")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"base: {base['meta'].get('commit')} ({base['meta'].get('timestamp')})")
+    print(f"new:  {new['meta'].get('commit')} ({new['meta'].get('timestamp')})")
+    if base["meta"].get("args") != new["meta"].get("args"):
+        print("aviso: los parámetros de las dos ejecuciones no coinciden")
+
+    a, b = flatten(base["results"]), flatten(new["results"])
+    regressions = 0
+    print(f"\n{'métrica':<58} {'base':>12} {'new':>12} {'cambio':>9}")
+    for metric in sorted(set(a) & set(b)):
+        sign = direction(metric)
+        if not sign:
+            continue
+        old, cur = a[metric], b[metric]
+        change = (cur - old) / abs(old) if old else (0.0 if cur == old else float("inf"))
+        floor = next((v for suffix, v in NOISE_FLOOR.items() if metric.endswith(suffix)), 0.0)
+        if abs(cur - old) < floor:
+            change = 0.0
+        worse = sign * change < -args.threshold
+        better = sign * change > args.threshold
+        if not (worse or better or args.all):
+            continue
+        regressions += worse
+        flag = "  REGRESIÓN" if worse else ("  mejora" if better else "")
+        print(f"{metric:<58} {old:>12.4g} {cur:>12.4g} {change:>+8.1%}{flag}")
+    missing = sorted(set(a) - set(b))
+    if missing:
+        print(f"\n{len(missing)} métricas de base no están en new (p. ej. {missing[0]})")
+    print(f"\n{regressions} regresiones (umbral {args.threshold:.0%})")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
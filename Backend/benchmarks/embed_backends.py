@@ -0,0 +1,72 @@
+# benchmarks/embed_backends.py
+"""
+Paridad y latencia de los backends del embedder (torch, quantized, onnx).
+
+Para cada backend: coseno entre sus vectores y los de torch (media y mínimo) y
+latencia de embeber una consulta corta (p50/p95), que es el caso de /query.
+
+Uso (desde Backend/):
+    python benchmarks/embed_backends.py
+    EMBED_ONNX_FILE=onnx/model_quint8_avx2.onnx python benchmarks/embed_backends.py --backends torch onnx
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from models.embedding_model import embed_model_name, load_embed_model  # noqa: E402
+from utils.ingest import chunk_items, iter_csv_chunks  # noqa: E402
+
+# por debajo de este coseno medio el backend no es intercambiable con el índice construido con torch
+MIN_MEAN_COSINE = 0.99
+
+
+def cosine_rows(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default=os.getenv("CSV_PAPERS_PATH", "data/papers.csv"))
+    parser.add_argument("--backends", nargs="*", default=["torch", "quantized", "onnx"])
+    parser.add_argument("--texts", type=int, default=300)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    texts = [it["meta"]["title"] for df in iter_csv_chunks(args.csv, limit=args.texts) for it in chunk_items(df)]
+    query = "Efectos de la microgravedad en el hueso"
+    print(f"Modelo: {embed_model_name}, {len(texts)} textos de paridad, {args.runs} consultas\n")
+    print(f"{'backend':<10} {'cos medio':>9} {'cos mín':>8} {'p50 ms':>8} {'p95 ms':>8}  paridad")
+
+    reference = None
+    failed = False
+    for backend in ["torch"] + [b for b in args.backends if b != "torch"]:
+        model, effective = load_embed_model(backend=backend)
+        if effective != backend:
+            print(f"{backend:<10} no disponible")
+            continue
+        vectors = model.encode(texts, convert_to_numpy=True, show_progress_bar=False)
+        if reference is None:
+            reference = vectors
+        cos = cosine_rows(vectors, reference)
+        model.encode([query], show_progress_bar=False)  # calentamiento
+        times = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            model.encode([query], show_progress_bar=False)
+            times.append((time.perf_counter() - start) * 1000)
+        ok = cos.mean() >= MIN_MEAN_COSINE
+        failed |= not ok
+        print(f"{backend:<10} {cos.mean():>9.4f} {cos.min():>8.4f} {np.percentile(times, 50):>8.2f} "
+              f"{np.percentile(times, 95):>8.2f}  {'ok' if ok else 'FALLA'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
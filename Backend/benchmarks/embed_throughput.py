@@ -0,0 +1,55 @@
+# benchmarks/embed_throughput.py
+"""
+Throughput de embeddings (textos/s) según el número de procesos del modo bulk.
+
+Uso (desde Backend/):
+    python benchmarks/embed_throughput.py                    # 1, 2, 4, ... hasta todos los cores
+    python benchmarks/embed_throughput.py --texts 20000 --cores 1 4 8
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from models.embedding_model import embed_texts, embed_texts_bulk, auto_batch_size  # noqa: E402
+from utils.ingest import CHUNK_SIZE, chunk_items, iter_csv_chunks  # noqa: E402
+
+
+def corpus(csv_path, n):
+    texts = [it["text"] or it["meta"]["title"] for df in iter_csv_chunks(csv_path, chunksize=CHUNK_SIZE)
+             for it in chunk_items(df)]
+    # se repite el CSV hasta n textos, con un sufijo para que no sean idénticos
+    return [f"{texts[i % len(texts)]} ({i // len(texts)})" for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default=os.getenv("CSV_PAPERS_PATH", "data/papers.csv"))
+    parser.add_argument("--texts", type=int, default=5000)
+    parser.add_argument("--cores", type=int, nargs="*")
+    args = parser.parse_args()
+
+    texts = corpus(args.csv, args.texts)
+    max_cores = os.cpu_count() or 1
+    cores = args.cores or sorted({c for c in (1, 2, 4, 8, 16, 32, max_cores) if c <= max_cores})
+    print(f"{len(texts)} textos, batch automático = {auto_batch_size(texts)}, {max_cores} cores\n")
+
+    start = time.perf_counter()
+    embed_texts(texts, use_cache=False)
+    base = len(texts) / (time.perf_counter() - start)
+    print(f"{'modo':<22} {'textos/s':>10} {'speedup':>8}")
+    print(f"{'embed_texts (actual)':<22} {base:>10.1f} {1.0:>8.2f}")
+
+    for c in cores:
+        # primera llamada arranca el pool; se mide la segunda
+        embed_texts_bulk(texts[:1000], processes=c, use_cache=False)
+        start = time.perf_counter()
+        embed_texts_bulk(texts, processes=c, use_cache=False)
+        rate = len(texts) / (time.perf_counter() - start)
+        print(f"{f'bulk, {c} procesos':<22} {rate:>10.1f} {rate / base:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
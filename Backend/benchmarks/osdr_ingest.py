@@ -0,0 +1,156 @@
+# benchmarks/osdr_ingest.py
+"""
+Servidor OSDR simulado (búsqueda, meta y files con ETag/Last-Modified, latencia y
+errores 503 configurables) y medición del cliente de utils/osdr_utils contra él:
+- secuencial: una petición detrás de otra, sin cache (como el cliente anterior)
+- paralelo en frío: pool de conexiones + concurrencia, cache vacía
+- paralelo en caliente: misma ingesta otra vez, todo debería volver como 304
+
+Uso (desde Backend/):
+    python benchmarks/osdr_ingest.py
+    python benchmarks/osdr_ingest.py --studies 100 --latency-ms 80 --error-rate 0.1
+    python benchmarks/osdr_ingest.py --serve 8765   # solo el servidor; OSDR_BASE=http://127.0.0.1:8765
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.osdr_utils import OSDRClient  # noqa: E402
+from utils.ingest import osdr_items  # noqa: E402
+
+LAST_MODIFIED = formatdate(time.time() - 86400, usegmt=True)
+
+
+def mock_routes(n):
+    """Respuestas JSON por ruta para n estudios (OSD-1..OSD-n)"""
+    routes = {"/osdr/data/search": {"hits": {"hits": [
+        {"_source": {"OSD Study Id": f"OSD-{i}", "Study Title": f"Study {i} on spaceflight",
+                     "Flight Program": "ISS", "Mission": {"Start Date": "2019-05-04"}}}
+        for i in range(1, n + 1)
+    ]}}}
+    for i in range(1, n + 1):
+        label = f"OSD-{i}"
+        routes[f"/osdr/data/osd/meta/{i}"] = {"study": {label: {"studies": [{
+            "title": f"Study {i}: effects of microgravity on mouse tissue {i}",
+            "description": f"Mice flown for {i} days; transcriptomics of tissue {i}.",
+            "people": [{"firstName": "Ana", "lastName": f"Researcher{i}"}],
+            "publicReleaseDate": 1556928000,
+        }]}}}
+        routes[f"/osdr/data/osd/files/{i}"] = {"studies": {label: {"study_files": [
+            {"file_name": f"{label}_counts.csv", "category": "Processed", "file_size": 1024 * i,
+             "remote_url": f"/geode-py/ws/studies/{label}/download?file={label}_counts.csv"},
+        ]}}}
+    return {path: json.dumps(body).encode("utf-8") for path, body in routes.items()}
+
+
+def make_handler(routes, latency_s, error_rate, counters):
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency_s)
+            with lock:
+                counters["requests"] += 1
+            if random.random() < error_rate:
+                with lock:
+                    counters["503"] += 1
+                self.send_response(503)
+                self.end_headers()
+                return
+            body = routes.get(urlparse(self.path).path)
+            if body is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                with lock:
+                    counters["304"] += 1
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            with lock:
+                counters["200"] += 1
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", LAST_MODIFIED)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_server(port, n, latency_ms, error_rate):
+    counters = {"requests": 0, "200": 0, "304": 0, "503": 0}
+    server = ThreadingHTTPServer(("127.0.0.1", port),
+                                 make_handler(mock_routes(n), latency_ms / 1000, error_rate, counters))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, counters
+
+
+def timed_ingest(client, counters, n):
+    before = dict(counters)
+    start = time.perf_counter()
+    items = osdr_items("spaceflight", size=n, client=client)
+    elapsed = time.perf_counter() - start
+    served = {k: counters[k] - before[k] for k in counters}
+    return len(items), elapsed, served
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--studies", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracción de respuestas 503")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--serve", type=int, default=0, help="solo levantar el servidor en este puerto")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    server, counters = start_server(args.serve, args.studies, args.latency_ms, args.error_rate)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    if args.serve:
+        print(f"Servidor OSDR simulado en {base} ({args.studies} estudios). Ctrl+C para salir.")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            return
+
+    cache_dir = tempfile.mkdtemp(prefix="osdr_cache_")
+    try:
+        print(f"{args.studies} estudios, latencia {args.latency_ms:g} ms, errores {args.error_rate:.0%}\n")
+        print(f"{'modo':<20} {'estudios':>8} {'tiempo (s)':>11} {'200':>5} {'304':>5} {'503':>5}")
+        runs = [
+            ("secuencial", OSDRClient(base, max_workers=1, backoff_s=0.05, cache_dir="")),
+            ("paralelo en frío", OSDRClient(base, max_workers=args.workers, backoff_s=0.05, cache_dir=cache_dir)),
+            ("paralelo en caliente", OSDRClient(base, max_workers=args.workers, backoff_s=0.05, cache_dir=cache_dir)),
+        ]
+        for name, client in runs:
+            n, elapsed, served = timed_ingest(client, counters, args.studies)
+            print(f"{name:<20} {n:>8} {elapsed:>11.2f} {served['200']:>5} {served['304']:>5} {served['503']:>5}")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
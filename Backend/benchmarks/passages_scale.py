@@ -0,0 +1,88 @@
+# benchmarks/passages_scale.py
+"""
+Escala del índice de pasajes: genera artículos sintéticos para N papers, construye el
+índice con un embedder aleatorio (se mide el pipeline, no el modelo) y reporta tiempo
+de construcción, memoria pico, tamaño en disco y latencia de búsqueda + agregación.
+
+Uso (desde Backend/):
+    python benchmarks/passages_scale.py                        # 600 papers x ~100 pasajes
+    python benchmarks/passages_scale.py --papers 2000 --words 30000 --index-type ivf
+"""
+import argparse
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.passages import PassageIndex, build_passages, pool  # noqa: E402
+
+
+def fake_items(n, text_dir, words, rng):
+    vocab = np.array([f"w{i}" for i in range(5000)])
+    items, id_index = [], {}
+    for i in range(n):
+        pmc = f"PMC{1000000 + i}"
+        with open(os.path.join(text_dir, pmc + ".txt"), "w", encoding="utf-8") as f:
+            f.write(" ".join(rng.choice(vocab, size=words)))
+        items.append({"id": f"csv-{i}", "meta": {"title": f"Paper {i}",
+                                                 "link": f"https://www.ncbi.nlm.nih.gov/pmc/articles/{pmc}/"}})
+        id_index[f"csv-{i}"] = i
+    return items, id_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", type=int, default=600)
+    parser.add_argument("--words", type=int, default=15000, help="palabras por artículo")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--index-type", default=None)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    work = tempfile.mkdtemp(prefix="passages_")
+    try:
+        text_dir = os.path.join(work, "pmc_text")
+        os.makedirs(text_dir)
+        items, id_index = fake_items(args.papers, text_dir, args.words, rng)
+
+        def embed(texts):
+            v = rng.normal(size=(len(texts), args.dim)).astype(np.float32)
+            return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+        out_dir = os.path.join(work, "passages")
+        start = time.perf_counter()
+        result = build_passages(items, embed, out_dir, text_dir=text_dir, index_type=args.index_type, metric="ip")
+        build_s = time.perf_counter() - start
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        disk_mb = sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(out_dir) for f in fs) / 2**20
+        vectors_mb = result["passages"] * args.dim * 4 / 2**20
+        print(f"{result['papers']} papers, {result['passages']} pasajes "
+              f"({result['passages'] / max(1, result['papers']):.0f}/paper), vectores {vectors_mb:.0f} MB")
+        print(f"construcción {build_s:.1f} s, memoria pico del proceso {peak_mb:.0f} MB, en disco {disk_mb:.0f} MB")
+
+        start = time.perf_counter()
+        passages = PassageIndex(out_dir, id_index, items)
+        print(f"carga {1000 * (time.perf_counter() - start):.0f} ms")
+
+        times = []
+        for q in embed(["q"] * args.queries):
+            start = time.perf_counter()
+            grouped = passages.search(q.reshape(1, -1), args.k)
+            sorted((pool([s for s, _ in hits]) for hits in grouped.values()), reverse=True)[:args.k]
+            times.append(time.perf_counter() - start)
+        p50, p95 = np.percentile(np.array(times) * 1000, [50, 95])
+        print(f"búsqueda + agregación (k={args.k}): p50 {p50:.2f} ms, p95 {p95:.2f} ms")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
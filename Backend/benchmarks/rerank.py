@@ -0,0 +1,81 @@
+# benchmarks/rerank.py
+"""
+Calidad y latencia del reranking con cross-encoder según N (candidatos re-puntuados):
+precision@5, recall@5 y MRR@5 frente a la primera etapa sin rerank, y p50/p95/p99 de
+la consulta completa. La cache de scores se vacía antes de cada configuración.
+
+Las consultas son las mismas que en retrieval_modes.py (known-item o --qrels).
+
+Uso (desde Backend/):
+    python benchmarks/rerank.py
+    python benchmarks/rerank.py --top-n 10 20 50 100 --budget-ms 100
+    python benchmarks/rerank.py --qrels data/qrels.jsonl --mode vector
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app import QueryRequest, ensure_index_loaded, retrieve  # noqa: E402
+from models.rerank_model import reranker, score_cache  # noqa: E402
+from retrieval_modes import known_item_queries, load_qrels  # noqa: E402
+
+K = 5
+
+
+def run(queries, mode, rerank, top_n=None, budget_ms=None):
+    precision, recall, rr, times, exhausted = [], [], [], [], 0
+    score_cache.entries.clear()
+    for q in queries:
+        request = QueryRequest(query=q["query"], top_k=K, mode=mode, rerank=rerank,
+                               rerank_top_n=top_n, rerank_budget_ms=budget_ms)
+        start = time.perf_counter()
+        selected, _, info = retrieve(request)
+        times.append(time.perf_counter() - start)
+        exhausted += bool(info and info["budget_exhausted"])
+        ids = [s["id"] for s in selected or []]
+        relevant = set(q["relevant"])
+        hits = len(relevant & set(ids))
+        precision.append(hits / K)
+        recall.append(hits / len(relevant))
+        rank = next((i for i, pid in enumerate(ids) if pid in relevant), None)
+        rr.append(1 / (rank + 1) if rank is not None else 0.0)
+    p50, p95, p99 = np.percentile(np.array(times) * 1000, [50, 95, 99])
+    return np.mean(precision), np.mean(recall), np.mean(rr), p50, p95, p99, exhausted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--qrels", default=None, help="JSONL con query + relevant (ids)")
+    parser.add_argument("--queries", type=int, default=200, help="consultas known-item a generar")
+    parser.add_argument("--words", type=int, default=3, help="palabras del título por consulta")
+    parser.add_argument("--mode", default="hybrid", help="modo de la primera etapa")
+    parser.add_argument("--top-n", type=int, nargs="*", default=[10, 20, 50])
+    parser.add_argument("--budget-ms", type=float, default=1e9, help="presupuesto por consulta (por defecto sin límite)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    index, meta = ensure_index_loaded()
+    if index is None:
+        sys.exit("Índice no encontrado. Llama a /rebuild_index primero.")
+    queries = load_qrels(args.qrels) if args.qrels else known_item_queries(meta, args.queries, args.words, args.seed)
+    print(f"Corpus: {index.ntotal} papers, {len(queries)} consultas, primera etapa {args.mode}, "
+          f"presupuesto {args.budget_ms:g} ms\n")
+
+    # carga de los modelos fuera de la medición (rerank no espera a la del cross-encoder)
+    reranker.get()
+    retrieve(QueryRequest(query="warm up", top_k=1, mode=args.mode, rerank=True, rerank_top_n=1))
+
+    print(f"{'N':<8} {'P@5':>6} {'R@5':>6} {'MRR@5':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'sin presup.':>11}")
+    configs = [("-", False, None)] + [(str(n), True, n) for n in args.top_n]
+    for label, rerank, top_n in configs:
+        p, r, mrr, p50, p95, p99, exhausted = run(queries, args.mode, rerank, top_n, args.budget_ms)
+        print(f"{label:<8} {p:>6.3f} {r:>6.3f} {mrr:>6.3f} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {exhausted:>11}")
+
+
+if __name__ == "__main__":
+    main()
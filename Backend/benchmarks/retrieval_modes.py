@@ -0,0 +1,101 @@
+# benchmarks/retrieval_modes.py
+"""
+Relevancia y latencia de los modos de recuperación de /query (vector, lexical, hybrid)
+sobre el índice actual: recall@k, MRR@k y ms por consulta, más p50/p95 del lado BM25 solo.
+
+Sin --qrels se generan consultas "known-item": unas pocas palabras del título de un
+paper al azar, con ese paper como único relevante. Con --qrels se usa un JSONL con
+{"query": ..., "relevant": [ids]} por línea.
+
+Uso (desde Backend/):
+    python benchmarks/retrieval_modes.py
+    python benchmarks/retrieval_modes.py --queries 300 --words 2 --k 10
+    python benchmarks/retrieval_modes.py --qrels data/qrels.jsonl
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app import RETRIEVAL_MODES, QueryRequest, ensure_index_loaded, retrieve  # noqa: E402
+from utils.lexical_index import tokenize  # noqa: E402
+
+
+def known_item_queries(meta, n, words, seed):
+    rng = random.Random(seed)
+    items = meta["items"]
+    deleted = meta["overlay"].deleted
+    positions = [i for i in range(len(items)) if i not in deleted]
+    rng.shuffle(positions)
+    queries = []
+    for pos in positions:
+        if len(queries) >= n:
+            break
+        item = items[pos]
+        terms = list(dict.fromkeys(tokenize(item["meta"].get("title", ""))))
+        if len(terms) < words:
+            continue
+        queries.append({"query": " ".join(rng.sample(terms, words)), "relevant": [item["id"]]})
+    return queries
+
+
+def load_qrels(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(mode, queries, k):
+    recall, rr, times = [], [], []
+    for q in queries:
+        start = time.perf_counter()
+        selected, _, _ = retrieve(QueryRequest(query=q["query"], top_k=k, mode=mode, rerank=False))
+        times.append(time.perf_counter() - start)
+        ids = [s["id"] for s in selected or []]
+        relevant = set(q["relevant"])
+        recall.append(len(relevant & set(ids)) / len(relevant))
+        rank = next((i for i, pid in enumerate(ids) if pid in relevant), None)
+        rr.append(1 / (rank + 1) if rank is not None else 0.0)
+    return float(np.mean(recall)), float(np.mean(rr)), 1000 * float(np.mean(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--qrels", default=None, help="JSONL con query + relevant (ids)")
+    parser.add_argument("--queries", type=int, default=200, help="consultas known-item a generar")
+    parser.add_argument("--words", type=int, default=3, help="palabras del título por consulta")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    index, meta = ensure_index_loaded()
+    if index is None:
+        sys.exit("Índice no encontrado. Llama a /rebuild_index primero.")
+    queries = load_qrels(args.qrels) if args.qrels else known_item_queries(meta, args.queries, args.words, args.seed)
+    print(f"Corpus: {index.ntotal} papers, {len(queries)} consultas, k={args.k}\n")
+
+    # el primer embed carga el modelo: fuera de la medición
+    retrieve(QueryRequest(query="warm up", top_k=1, mode="vector", rerank=False))
+
+    print(f"{'modo':<8} {'recall@k':>9} {'MRR@k':>7} {'ms/consulta':>12}")
+    for mode in RETRIEVAL_MODES:
+        recall, mrr, ms = evaluate(mode, queries, args.k)
+        print(f"{mode:<8} {recall:>9.3f} {mrr:>7.3f} {ms:>12.3f}")
+
+    lexical = meta["lexical"]
+    times = []
+    for q in queries:
+        start = time.perf_counter()
+        lexical.search(q["query"], args.k)
+        times.append(time.perf_counter() - start)
+    p50, p95 = np.percentile(np.array(times) * 1e6, [50, 95])
+    print(f"\nBM25 solo ({len(lexical)} documentos): p50 {p50:.0f} µs, p95 {p95:.0f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+# benchmarks/suite.py
+"""
+Suite de benchmarks reproducible: ingesta, índices, recuperación, embeddings y resumen,
+con salida JSON para comparar entre commits (benchmarks/compare.py).
+
+Funciona sin red y en CPU: por defecto el embedder es un hashing de tokens (determinista,
+sin modelo) y el LLM un T5 diminuto con pesos aleatorios y un tokenizer de palabras
+construido al vuelo (necesita torch + transformers instalados, pero nada descargado).
+Con --real-models se usan los modelos configurados (EMBED_MODEL, LLM_MODEL) si están en
+la cache local. Lo que mide cada sección:
+
+- embed: textos/s del embedder sobre los títulos de data/papers.csv.
+- ingest: stream_rebuild (CSV -> embeddings -> FAISS + metadata + BM25) sobre
+  data/papers.csv y CSVs sintéticos de --ingest-sizes filas: tiempo, filas/s, RSS pico, disco.
+- index: vectores sintéticos agrupados de --sizes (1k -> 1M) para cada --index-types:
+  construcción, p50/p95/p99 de consultas sueltas, recall@k frente a flat, RSS pico y
+  tamaño serializado del índice; los cuantizados (fp16, sq8, pq, ivfpq) se miden además
+  con re-ranking exacto ("<tipo>+refine").
+- retrieval: consultas known-item sobre data/papers.csv: recall@k, MRR@k y latencia
+  de los modos vector, lexical e hybrid (RRF).
+- summary: pack_context + generate_summary sobre los títulos del corpus: p50/p95.
+
+Uso (desde Backend/):
+    python benchmarks/suite.py                                # todo, tamaños 1k 10k 100k
+    python benchmarks/suite.py --quick                        # 1k 10k, menos consultas
+    python benchmarks/suite.py --sections index --sizes 1000000 --index-types flat ivf --dim 128
+    python benchmarks/suite.py --out results/antes.json
+    python benchmarks/compare.py results/antes.json results/despues.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND)
+
+import faiss  # noqa: E402
+from utils.faiss_index import INDEX_TYPES, build_faiss_index, is_quantized, search, similarity  # noqa: E402
+from utils.ingest import stream_rebuild  # noqa: E402
+from utils.lexical_index import LexicalIndex, rrf_fuse, tokenize  # noqa: E402
+from utils.refine import ExactVectors  # noqa: E402
+
+SECTIONS = ("embed", "ingest", "index", "retrieval", "summary")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+# -------------------------
+# Medidas
+# -------------------------
+def reset_peak_rss():
+    """En Linux, VmHWM vuelve al RSS actual: el pico medido es el de la sección"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    # sin /proc: pico de todo el proceso
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def percentiles(times_s):
+    p50, p95, p99 = np.percentile(np.asarray(times_s) * 1000, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3)}
+
+
+def disk_mb(*paths):
+    total = 0
+    for path in paths:
+        if os.path.isfile(path):
+            total += os.path.getsize(path)
+        for d, _, files in os.walk(path):
+            total += sum(os.path.getsize(os.path.join(d, f)) for f in files)
+    return round(total / 2**20, 2)
+
+
+# -------------------------
+# Modelos de sustitución
+# -------------------------
+def hashing_embedder(dim, seed=0):
+    """
+    Embedder sin modelo: cada token suma ±1 en una dimensión elegida por crc32 (estable
+    entre procesos, a diferencia de hash()). Vectores normalizados, como los del modelo.
+    """
+    def embed(texts):
+        out = np.zeros((len(texts), dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in tokenize(text):
+                h = zlib.crc32(f"{seed}:{token}".encode("utf-8"))
+                out[i, h % dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+    return embed
+
+
+def tiny_llm(words, seed=0):
+    """
+    (tokenizer, (modelo, device)) con la interfaz que espera models/llm_model: un
+    tokenizer de palabras con el vocabulario del corpus y un T5 de 2 capas sin entrenar
+    """
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers, processors
+    from transformers import PreTrainedTokenizerFast, T5Config, T5ForConditionalGeneration
+
+    vocab = {"<pad>": 0, "</s>": 1, "<unk>": 2}
+    for w in words:
+        vocab.setdefault(w, len(vocab))
+    tok = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tok.pre_tokenizer = pre_tokenizers.Whitespace()
+    tok.post_processor = processors.TemplateProcessing(single="$A </s>", special_tokens=[("</s>", 1)])
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=tok, pad_token="<pad>", eos_token="</s>", unk_token="<unk>")
+    torch.manual_seed(seed)
+    config = T5Config(vocab_size=len(vocab), d_model=64, d_ff=128, d_kv=16, num_layers=2, num_heads=4,
+                      decoder_start_token_id=0, pad_token_id=0, eos_token_id=1)
+    return tokenizer, (T5ForConditionalGeneration(config).eval(), torch.device("cpu"))
+
+
+def get_embedder(args):
+    if args.real_models:
+        from models.embedding_model import embed_model_name, embed_texts_bulk
+        return embed_model_name, lambda texts: embed_texts_bulk(texts, use_cache=False)
+    return f"hashing-{args.dim}", hashing_embedder(args.dim, args.seed)
+
+
+# -------------------------
+# Corpus
+# -------------------------
+def load_titles(csv_path):
+    df = pd.read_csv(csv_path)
+    return [str(t) for t in df["title"].fillna("")]
+
+
+def synthetic_csv(path, n, titles, rng):
+    """CSV con el formato de data/papers.csv: títulos recombinados a partir de los reales"""
+    words = np.array(sorted({w for t in titles for w in t.split()}))
+    lengths = rng.integers(6, 16, size=n)
+    rows = [" ".join(rng.choice(words, size=k)) for k in lengths]
+    pd.DataFrame({"title": rows, "link": [f"https://example.org/synthetic/{i}" for i in range(n)]}).to_csv(
+        path, index=False)
+
+
+def clustered_vectors(n, dim, rng):
+    # vectores agrupados (más parecidos a embeddings reales que el ruido uniforme), normalizados
+    centers = rng.normal(size=(max(1, n // 100), dim)).astype(np.float32)
+    x = centers[rng.integers(0, len(centers), size=n)]
+    x += 0.3 * rng.normal(size=x.shape).astype(np.float32)
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    return x
+
+
+def known_item_queries(titles, n, words, rng):
+    """(consulta, posición relevante): unas palabras seguidas del título de un paper al azar"""
+    queries = []
+    for pos in rng.choice(len(titles), size=min(n, len(titles)), replace=False):
+        tokens = titles[pos].split()
+        if len(tokens) < words:
+            continue
+        start = int(rng.integers(0, len(tokens) - words + 1))
+        queries.append((" ".join(tokens[start:start + words]), int(pos)))
+    return queries
+
+
+# -------------------------
+# Secciones
+# -------------------------
+def bench_embed(args, titles, embedder):
+    name, embed = embedder
+    texts = (titles * (args.embed_texts // max(1, len(titles)) + 1))[:args.embed_texts]
+    embed(texts[:32])  # calentamiento (carga del modelo, hilos)
+    start = time.perf_counter()
+    embed(texts)
+    elapsed = time.perf_counter() - start
+    return {"model": name, "texts": len(texts), "texts_per_s": round(len(texts) / elapsed, 1)}
+
+
+def bench_ingest(args, titles, embedder, work, rng):
+    name, embed = embedder
+    sources = [("papers.csv", args.csv)]
+    for n in args.ingest_sizes:
+        path = os.path.join(work, f"synthetic_{n}.csv")
+        synthetic_csv(path, n, titles, rng)
+        sources.append((f"synthetic-{n}", path))
+    results = []
+    for source, csv_path in sources:
+        out = os.path.join(work, f"ingest_{source}")
+        os.makedirs(out)
+        index_path, meta_path = os.path.join(out, "faiss_index.bin"), os.path.join(out, "faiss_meta.json")
+        reset_peak_rss()
+        start = time.perf_counter()
+        rows = stream_rebuild(csv_path, embed, index_type="flat", metric="ip",
+                              index_path=index_path, meta_path=meta_path)
+        elapsed = time.perf_counter() - start
+        results.append({"source": source, "model": name, "rows": rows, "build_s": round(elapsed, 3),
+                        "rows_per_s": round(rows / elapsed, 1), "peak_rss_mb": peak_rss_mb(), "disk_mb": disk_mb(out)})
+        shutil.rmtree(out, ignore_errors=True)
+        print(f"  ingest {source}: {rows} filas en {elapsed:.2f}s")
+    return results
+
+
+def bench_index(args, rng):
+    results = []
+    for size in args.sizes:
+        xb = clustered_vectors(size, args.dim, rng)
+        picks = rng.choice(size, size=min(args.queries, size), replace=False)
+        xq = xb[picks] + 0.05 * rng.normal(size=(len(picks), args.dim)).astype(np.float32)
+        xq /= np.linalg.norm(xq, axis=1, keepdims=True)
+        k = min(args.k, size)
+        truth = None
+        for index_type in ["flat"] + [t for t in args.index_types if t != "flat"]:
+            reset_peak_rss()
+            start = time.perf_counter()
+            index = build_faiss_index(xb, index_type=index_type, metric="ip")
+            build_s = time.perf_counter() - start
+            rss = peak_rss_mb()
+            index_bytes = len(faiss.serialize_index(index))
+            variants = [(index_type, None)]
+            if is_quantized(index):
+                variants.append((index_type + "+refine", ExactVectors(xb)))
+            for name, refine in variants:
+                times, found = [], []
+                for q in xq:
+                    start = time.perf_counter()
+                    _, I = search(index, q.reshape(1, -1), k, refine=refine)
+                    times.append(time.perf_counter() - start)
+                    found.append(I[0])
+                found = np.array(found)
+                if truth is None:
+                    truth = found
+                hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+                results.append({"size": size, "type": name, "dim": args.dim, "k": k,
+                                "build_s": round(build_s, 3), "peak_rss_mb": rss,
+                                "index_mb": round(index_bytes / 2**20, 2), "bytes_per_vector": round(index_bytes / size, 1),
+                                **percentiles(times), "recall_at_k": round(hits / truth.size, 4)})
+                print(f"  index {name} n={size}: build {build_s:.2f}s, {index_bytes / size:.0f} B/vector, "
+                      f"p50 {results[-1]['p50_ms']:.3f} ms, recall@{k} {results[-1]['recall_at_k']:.3f}")
+            del index
+        del xb
+    return results
+
+
+def bench_retrieval(args, titles, embedder, rng):
+    name, embed = embedder
+    vectors = np.ascontiguousarray(embed(titles), dtype=np.float32)
+    index = build_faiss_index(vectors, index_type="flat", metric="ip")
+    lexical = LexicalIndex.from_items([{"id": str(i), "meta": {"title": t}} for i, t in enumerate(titles)])
+    queries = known_item_queries(titles, args.queries, args.query_words, rng)
+    k, pool_k = args.k, max(args.k, 50)
+    stats = {mode: {"hits": 0, "rr": 0.0, "times": []} for mode in ("vector", "lexical", "hybrid")}
+    for query, relevant in queries:
+        start = time.perf_counter()
+        q = np.ascontiguousarray(embed([query]), dtype=np.float32)
+        D, I = search(index, q, pool_k)
+        vector_ranked = [int(i) for i, s in zip(I[0], similarity(index, D[0])) if i >= 0]
+        vector_s = time.perf_counter() - start
+        start = time.perf_counter()
+        positions, _ = lexical.search(query, pool_k)
+        lexical_ranked = [int(p) for p in positions]
+        lexical_s = time.perf_counter() - start
+        start = time.perf_counter()
+        hybrid_ranked = [p for p, _ in rrf_fuse([vector_ranked, lexical_ranked], limit=k)]
+        fuse_s = time.perf_counter() - start
+        for mode, ranked, elapsed in (("vector", vector_ranked, vector_s), ("lexical", lexical_ranked, lexical_s),
+                                      ("hybrid", hybrid_ranked, vector_s + lexical_s + fuse_s)):
+            top = ranked[:k]
+            s = stats[mode]
+            s["times"].append(elapsed)
+            if relevant in top:
+                s["hits"] += 1
+                s["rr"] += 1.0 / (top.index(relevant) + 1)
+    n = max(1, len(queries))
+    return {"corpus": "papers.csv", "model": name, "documents": len(titles), "queries": len(queries), "k": k,
+            **{mode: {"recall_at_k": round(s["hits"] / n, 4), "mrr_at_k": round(s["rr"] / n, 4),
+                      **percentiles(s["times"] or [0.0])}
+               for mode, s in stats.items()}}
+
+
+def bench_summary(args, titles, rng):
+    from models import llm_model
+    if args.real_models:
+        name = llm_model.LLM_NAME
+    else:
+        name = "tiny-t5"
+        tokenizer, model = tiny_llm({w for t in titles for w in t.split()} | set(
+            (llm_model.SUMMARY_INSTRUCTION + llm_model.SUMMARY_SUFFIX).split()), args.seed)
+        # se sustituyen los cargadores antes del primer uso: nada se descarga
+        llm_model.llm_tokenizer.loader = lambda: tokenizer
+        llm_model.llm.loader = lambda: model
+    llm_model.llm_tokenizer.get()
+    llm_model.llm.get()
+    times, prompt_tokens = [], []
+    for _ in range(args.summaries):
+        docs = [f"Título: {titles[i]}" for i in rng.choice(len(titles), size=min(8, len(titles)), replace=False)]
+        start = time.perf_counter()
+        prompt, _ = llm_model.pack_context("Documentos relevantes:\n", docs)
+        llm_model.generate_summary(prompt)
+        times.append(time.perf_counter() - start)
+        prompt_tokens.append(llm_model.count_tokens(prompt))
+    return {"model": name, "summaries": len(times), "prompt_tokens": int(np.mean(prompt_tokens)),
+            **percentiles(times)}
+
+
+# -------------------------
+# Main
+# -------------------------
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, capture_output=True, text=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND,
+                               capture_output=True, text=True).stdout.strip()
+        return out.stdout.strip() + ("-dirty" if dirty else "") if out.returncode == 0 else None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", nargs="+", choices=SECTIONS, default=list(SECTIONS))
+    parser.add_argument("--csv", default=os.path.join(BACKEND, "data", "papers.csv"))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="vectores sintéticos")
+    parser.add_argument("--index-types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("--ingest-sizes", type=int, nargs="*", default=[10000], help="filas de los CSV sintéticos")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-words", type=int, default=3)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--embed-texts", type=int, default=5000)
+    parser.add_argument("--summaries", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=0, help="hilos de FAISS (0 = los de por defecto)")
+    parser.add_argument("--real-models", action="store_true", help="modelos configurados en vez de los de sustitución")
+    parser.add_argument("--quick", action="store_true", help="tamaños 1k 10k, 50 consultas, ingesta de 2k filas")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="fichero JSON (por defecto benchmarks/results/<fecha>-<commit>.json)")
+    args = parser.parse_args()
+    if args.quick:
+        args.sizes, args.queries, args.ingest_sizes, args.embed_texts, args.summaries = [1000, 10000], 50, [2000], 1000, 3
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "faiss_threads": faiss.omp_get_max_threads(),
+            "numpy": np.__version__,
+            "faiss": getattr(faiss, "__version__", None),
+            "args": {k: v for k, v in vars(args).items() if k != "out"},
+        },
+        "results": {},
+    }
+    titles = load_titles(args.csv)
+    embedder = get_embedder(args)
+    work = tempfile.mkdtemp(prefix="bench_")
+    try:
+        for section in args.sections:
+            rng = np.random.default_rng(args.seed)  # cada sección igual aunque se ejecute sola
+            print(f"[{section}]")
+            start = time.perf_counter()
+            try:
+                if section == "embed":
+                    result = bench_embed(args, titles, embedder)
+                elif section == "ingest":
+                    result = bench_ingest(args, titles, embedder, work, rng)
+                elif section == "index":
+                    result = bench_index(args, rng)
+                elif section == "retrieval":
+                    result = bench_retrieval(args, titles, embedder, rng)
+                else:
+                    result = bench_summary(args, titles, rng)
+            except ImportError as e:
+                # p. ej. summary sin torch/transformers: se deja constancia y se sigue
+                result = {"skipped": str(e)}
+                print(f"  omitida: {e}")
+            report["results"][section] = result
+            print(f"  ({time.perf_counter() - start:.1f}s)")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Resultados en {out}")
+
+
+if __name__ == "__main__":
+    main()
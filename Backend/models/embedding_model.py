@@ -1,17 +1,210 @@
 # models/embedding_model.py
-from sentence_transformers import SentenceTransformer
 import numpy as np
+import atexit
 import os
+import threading
+from contextlib import contextmanager
+
+from utils.batcher import MicroBatcher
+from utils.embedding_cache import EmbeddingCache, CACHE_ENABLED
+from utils.lazy import Lazy
 
 embed_model_name = os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
-embed_model = SentenceTransformer(embed_model_name)
+# Backend de inferencia: torch | quantized (int8 dinámico sobre torch) | onnx (ONNX Runtime)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+# Con onnx: fichero dentro del repo del modelo, p. ej. onnx/model_quint8_avx2.onnx (ya cuantizado).
+# Vacío -> onnx/model.onnx, que se exporta al vuelo si el repo no lo trae.
+EMBED_ONNX_FILE = os.getenv("EMBED_ONNX_FILE", "")
+# Vectores con norma 1: el producto interno del índice (FAISS_METRIC=ip) es el coseno
+EMBED_NORMALIZE = os.getenv("EMBED_NORMALIZE", "1") not in ("0", "false", "False")
 
-def embed_texts(texts, batch_size=64):
+def load_embed_model(name=embed_model_name, backend=EMBED_BACKEND):
+    """
+    Devuelve (modelo, backend efectivo). onnx necesita optimum + onnxruntime
+    (pip install sentence-transformers[onnx]); si no están se usa torch.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        try:
+            model_kwargs = {"file_name": EMBED_ONNX_FILE} if EMBED_ONNX_FILE else None
+            return SentenceTransformer(name, backend="onnx", model_kwargs=model_kwargs), "onnx"
+        except Exception as e:
+            print(f"Backend onnx no disponible ({e}); se usa torch")
+            backend = "torch"
+    model = SentenceTransformer(name)
+    if backend == "quantized":
+        import torch
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model, backend
+
+def _load():
+    model, backend = load_embed_model()
+    # los vectores de un backend cuantizado no son idénticos a los de torch: cache separada
+    cache_name = embed_model_name if backend == "torch" else f"{embed_model_name}@{backend}"
+    cache = EmbeddingCache(cache_name, model.get_sentence_embedding_dimension()) if CACHE_ENABLED else None
+    return model, backend, cache
+
+# el modelo se carga en el primer uso (o en el warm-up de app.py), no al importar
+embedder = Lazy("embedding", _load)
+
+def _model():
+    return embedder.get()[0]
+
+def _cache():
+    return embedder.get()[2]
+
+# Modo bulk (indexación): pool de procesos, orden por longitud y batch automático
+BULK_PROCESSES = int(os.getenv("EMBED_BULK_PROCESSES", "0"))  # 0 -> todos los cores
+BULK_MIN_TEXTS = int(os.getenv("EMBED_BULK_MIN_TEXTS", "1000"))  # por debajo no compensa el pool
+BULK_TOKENS_PER_BATCH = int(os.getenv("EMBED_BULK_TOKENS_PER_BATCH", "8192"))
+
+_pool = None
+_pool_key = None  # (procesos, hilos por proceso)
+_pool_lock = threading.Lock()
+
+def _encode(texts, batch_size=64):
+    return _model().encode(texts, batch_size=batch_size, show_progress_bar=False, convert_to_numpy=True)
+
+def normalize(vectors):
+    """Normaliza por filas (L2) si EMBED_NORMALIZE; las filas nulas se dejan igual"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if not EMBED_NORMALIZE:
+        return vectors
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def _cached(texts, encode_fn, use_cache=True):
+    """
+    Aplica la cache: solo los textos que faltan pasan por encode_fn.
+    La cache guarda la salida del modelo; la normalización se aplica aquí, a la salida.
+    """
+    embed_cache = _cache()
+    if embed_cache is None or not use_cache:
+        return normalize(encode_fn(texts))
+    vectors, missing = embed_cache.get_many(texts)
+    if missing:
+        missing_texts = [texts[i] for i in missing]
+        new = encode_fn(missing_texts)
+        embed_cache.put_many(missing_texts, new)
+        for j, i in enumerate(missing):
+            vectors[i] = new[j]
+    return normalize(np.vstack(vectors))
+
+def embed_texts(texts, batch_size=64, use_cache=True):
     """
     texts: list[str]
     Devuelve un np.array de shape (n_texts, dim)
+    Con cache activa solo se pasan por el modelo los textos que no estén ya embebidos.
     """
     if not texts:
-        return np.zeros((0, embed_model.get_sentence_embedding_dimension()), dtype=np.float32)
-    embeddings = embed_model.encode(texts, batch_size=batch_size, show_progress_bar=False, convert_to_numpy=True)
-    return embeddings
+        return np.zeros((0, _model().get_sentence_embedding_dimension()), dtype=np.float32)
+    return _cached(texts, lambda t: _encode(t, batch_size=batch_size), use_cache=use_cache)
+
+# Micro-batching de consultas concurrentes (/query): 1 = desactivado
+QUERY_BATCH_MAX_SIZE = int(os.getenv("EMBED_QUERY_BATCH_MAX_SIZE", "32"))
+QUERY_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_QUERY_BATCH_MAX_WAIT_MS", "5"))
+
+query_batcher = MicroBatcher(
+    lambda texts: list(embed_texts(texts)),
+    max_batch=QUERY_BATCH_MAX_SIZE, max_wait_ms=QUERY_BATCH_MAX_WAIT_MS, name="embed_query"
+) if QUERY_BATCH_MAX_SIZE > 1 else None
+
+def embed_query(text):
+    """
+    Embedding de una consulta, shape (1, dim). Las consultas que llegan a la vez
+    se agrupan en una sola llamada al encoder.
+    """
+    if query_batcher is None:
+        return embed_texts([text])
+    return np.asarray(query_batcher.submit(text), dtype=np.float32).reshape(1, -1)
+
+def auto_batch_size(texts):
+    """Batch según la longitud media (~4 caracteres por token), acotado a [16, 256]"""
+    max_tokens = _model().get_max_seq_length() or 512
+    avg_tokens = min(max_tokens, max(1, sum(len(t) for t in texts) // max(1, len(texts)) // 4))
+    return int(min(256, max(16, BULK_TOKENS_PER_BATCH // avg_tokens)))
+
+def _get_pool(processes, threads):
+    """Pool de procesos de sentence-transformers, reutilizado entre llamadas"""
+    global _pool, _pool_key
+    # cada worker usa su parte de los hilos (si no, torch abre todos los cores en cada proceso)
+    per_worker = max(1, (threads or os.cpu_count() or 1) // processes)
+    with _pool_lock:
+        if _pool is not None and _pool_key == (processes, per_worker):
+            return _pool
+        if _pool is not None:
+            _model().stop_multi_process_pool(_pool)
+        prev = os.environ.get("OMP_NUM_THREADS")
+        os.environ["OMP_NUM_THREADS"] = str(per_worker)
+        try:
+            _pool = _model().start_multi_process_pool(target_devices=["cpu"] * processes)
+        finally:
+            if prev is None:
+                os.environ.pop("OMP_NUM_THREADS", None)
+            else:
+                os.environ["OMP_NUM_THREADS"] = prev
+        _pool_key = (processes, per_worker)
+        return _pool
+
+@atexit.register
+def _stop_pool():
+    if _pool is not None:
+        _model().stop_multi_process_pool(_pool)
+
+@contextmanager
+def _torch_threads(threads):
+    """Hilos intra-op de torch durante el bloque; el ajuste es global al proceso y se restaura al salir"""
+    if not threads:
+        yield
+        return
+    import torch
+
+    prev = torch.get_num_threads()
+    torch.set_num_threads(threads)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(prev)
+
+def _encode_bulk(texts, processes, threads, batch_size=None):
+    # ordenar por longitud reduce el padding dentro de cada batch; luego se deshace el orden
+    order = np.argsort([len(t) for t in texts], kind="stable")
+    sorted_texts = [texts[i] for i in order]
+    batch_size = batch_size or auto_batch_size(sorted_texts)
+    if processes > 1 and len(texts) >= BULK_MIN_TEXTS:
+        pool = _get_pool(processes, threads)
+        chunk_size = max(batch_size, len(texts) // (processes * 4))
+        encoded = _model().encode_multi_process(sorted_texts, pool, batch_size=batch_size, chunk_size=chunk_size)
+    else:
+        with _torch_threads(threads):
+            encoded = _encode(sorted_texts, batch_size=batch_size)
+    vectors = np.empty_like(encoded)
+    vectors[order] = encoded
+    return vectors
+
+def embed_texts_bulk(texts, processes=None, batch_size=None, use_cache=True, threads=None):
+    """
+    Embeddings para indexación masiva: usa un pool de procesos (todos los cores por defecto)
+    cuando hay suficientes textos, ordena por longitud y elige el batch automáticamente.
+    threads (None = sin límite) acota los hilos de CPU: se reparten entre los procesos del
+    pool o, por debajo de EMBED_BULK_MIN_TEXTS, son los hilos de torch en el propio proceso.
+    """
+    if not texts:
+        return embed_texts(texts)
+    processes = processes or BULK_PROCESSES or os.cpu_count() or 1
+    if threads:
+        processes = min(processes, threads)
+    return _cached(texts, lambda t: _encode_bulk(t, processes, threads, batch_size=batch_size), use_cache=use_cache)
+
+def batching_stats():
+    return query_batcher.stats() if query_batcher is not None else {"enabled": False}
+
+def cache_stats():
+    if not embedder.ready:
+        # no se fuerza la carga del modelo solo para las estadísticas
+        return {"enabled": CACHE_ENABLED, "loaded": False}
+    embed_cache = _cache()
+    if embed_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **embed_cache.stats()}
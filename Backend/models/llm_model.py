@@ -1,41 +1,176 @@
 # models/llm_model.py
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
-import torch
 import os
+import threading
 from textwrap import shorten
 
+from utils.batcher import MicroBatcher
+from utils.lazy import Lazy
+from utils.metrics import span
+
 LLM_NAME = os.getenv("LLM_MODEL", "google/flan-t5-small")
-tokenizer_llm = AutoTokenizer.from_pretrained(LLM_NAME)
-model_llm = AutoModelForSeq2SeqLM.from_pretrained(LLM_NAME, torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32)
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model_llm.to(device)
+
+def _load_tokenizer():
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(LLM_NAME)
+
+def _load_model():
+    import torch
+    from transformers import AutoModelForSeq2SeqLM
+    model_llm = AutoModelForSeq2SeqLM.from_pretrained(LLM_NAME, torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model_llm.to(device)
+    return model_llm, device
+
+# se cargan en el primer uso (o en el warm-up de app.py), no al importar.
+# El tokenizer va aparte: empaquetar el contexto no necesita el modelo.
+llm_tokenizer = Lazy("llm_tokenizer", _load_tokenizer)
+llm = Lazy("llm", _load_model)
+
+# Ventana de entrada: los prompts se empaquetan para no pasarse (antes se truncaban sin avisar)
+LLM_MAX_INPUT_TOKENS = int(os.getenv("LLM_MAX_INPUT_TOKENS", "1024"))
+
+# Micro-batching de generaciones concurrentes: 1 = desactivado
+LLM_BATCH_MAX_SIZE = int(os.getenv("LLM_BATCH_MAX_SIZE", "8"))
+LLM_BATCH_MAX_WAIT_MS = float(os.getenv("LLM_BATCH_MAX_WAIT_MS", "10"))
+
+def _generate_batch(prompts, max_length=256, min_length=30):
+    """Una sola llamada a generate para varios prompts (con padding)"""
+    tokenizer_llm = llm_tokenizer.get()
+    model_llm, device = llm.get()
+    inputs = tokenizer_llm(prompts, return_tensors="pt", padding=True, truncation=True, max_length=LLM_MAX_INPUT_TOKENS).to(device)
+    outputs = model_llm.generate(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"],
+                                 max_length=max_length, min_length=min_length, do_sample=False)
+    return tokenizer_llm.batch_decode(outputs, skip_special_tokens=True)
+
+# solo se agrupan prompts con los mismos parámetros de generación
+generation_batcher = MicroBatcher(
+    lambda reqs: _generate_batch([p for p, _, _ in reqs], max_length=reqs[0][1], min_length=reqs[0][2]),
+    max_batch=LLM_BATCH_MAX_SIZE, max_wait_ms=LLM_BATCH_MAX_WAIT_MS, name="llm_generate",
+    key=lambda req: (req[1], req[2])
+) if LLM_BATCH_MAX_SIZE > 1 else None
 
 def _generate(prompt, max_length=256, min_length=30):
-    inputs = tokenizer_llm(prompt, return_tensors="pt", truncation=True, max_length=1024).to(device)
-    outputs = model_llm.generate(**inputs, max_length=max_length, min_length=min_length, do_sample=False)
-    return tokenizer_llm.decode(outputs[0], skip_special_tokens=True)
+    if generation_batcher is not None:
+        return generation_batcher.submit((prompt, max_length, min_length))
+    return _generate_batch([prompt], max_length=max_length, min_length=min_length)[0]
 
-def generate_summary(text, max_length=300):
+def stream_generate(prompt, max_length=256, min_length=30):
+    """
+    Genera devolviendo el texto a trozos según salen los tokens (TextIteratorStreamer).
+    generate corre en un hilo aparte; no pasa por el micro-batcher.
+    """
+    from transformers import TextIteratorStreamer
+
+    tokenizer_llm = llm_tokenizer.get()
+    model_llm, device = llm.get()
+    inputs = tokenizer_llm(prompt, return_tensors="pt", truncation=True, max_length=LLM_MAX_INPUT_TOKENS).to(device)
+    streamer = TextIteratorStreamer(tokenizer_llm, skip_prompt=True, skip_special_tokens=True)
+    errors = []
+
+    def run():
+        try:
+            model_llm.generate(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"],
+                               max_length=max_length, min_length=min_length, do_sample=False, streamer=streamer)
+        except Exception as e:
+            errors.append(e)
+            streamer.end()  # desbloquea al consumidor
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    for piece in streamer:
+        if piece:
+            yield piece
+    thread.join()
+    if errors:
+        raise errors[0]
+
+SUMMARY_INSTRUCTION = "Resumir de manera clara y concisa. Incluir títulos, programa espacial, fechas y archivos si están presentes.\n\n"
+SUMMARY_SUFFIX = "\n\nResumen:"
+COMBINE_INSTRUCTION = "Combinar y sintetizar los siguientes resúmenes en un solo resumen corto y claro (3-6 oraciones):\n\n"
+COMBINE_SUFFIX = "\nResumen final:"
+
+def _token_ids(text):
+    return llm_tokenizer.get()(text, add_special_tokens=False)["input_ids"]
+
+def count_tokens(text):
+    return len(_token_ids(text))
+
+def _decode(ids):
+    return llm_tokenizer.get().decode(ids, skip_special_tokens=True, clean_up_tokenization_spaces=False)
+
+def _budget(*wrappers):
+    """Tokens libres para el contenido tras descontar instrucciones y el token de fin"""
+    return LLM_MAX_INPUT_TOKENS - sum(count_tokens(w) for w in wrappers) - 1
+
+def context_budget():
+    """Tokens disponibles para el texto que recibe generate_summary sin partirlo"""
+    return _budget(SUMMARY_INSTRUCTION, SUMMARY_SUFFIX)
+
+def pack_context(header, docs, footer="", budget=None, sep="\n\n", min_doc_tokens=32):
+    """
+    header + tantos docs (en el orden dado, el más relevante primero) como quepan en
+    budget tokens + footer, en una sola pasada. El último doc que no cabe entero se
+    recorta si quedan al menos min_doc_tokens. Devuelve (texto, número de docs usados).
+    """
+    budget = context_budget() if budget is None else budget
+    free = budget - count_tokens(header) - count_tokens(footer)
+    sep_tokens = count_tokens(sep)
+    parts = []
+    for ids in (_token_ids(d) for d in docs):
+        cost = len(ids) + (sep_tokens if parts else 0)
+        if cost <= free:
+            parts.append(ids)
+            free -= cost
+            continue
+        room = free - (sep_tokens if parts else 0)
+        if room >= min_doc_tokens:
+            parts.append(ids[:room])
+        break
+    text = header + sep.join(_decode(ids) for ids in parts) + footer
+    # los tokens por separado no siempre suman lo mismo que el texto unido: se ajusta el último doc
+    over = count_tokens(text) - budget
+    while over > 0 and parts:
+        parts[-1] = parts[-1][:max(0, len(parts[-1]) - over)]
+        if not parts[-1]:
+            parts.pop()
+        text = header + sep.join(_decode(ids) for ids in parts) + footer
+        over = count_tokens(text) - budget
+    return text, len(parts)
+
+def _token_chunks(text, budget):
+    ids = _token_ids(text)
+    return [_decode(ids[i:i + budget]) for i in range(0, len(ids), budget)] or [""]
+
+def _final_prompt(text, max_length=300):
     """
-    Si text es muy largo, lo divide en chunks y resume cada chunk y luego concatena.
+    (prompt, max_length) de la última generación del resumen.
+    Si text no cabe en la ventana del modelo se parte por tokens, los parciales salen
+    de una sola llamada batched a generate y se pide combinarlos.
     """
+    chunks = _token_chunks(text, context_budget())
+    prompts = [f"{SUMMARY_INSTRUCTION}{c}{SUMMARY_SUFFIX}" for c in chunks]
+    if len(prompts) == 1:
+        return prompts[0], 256
+    with span("llm_partials"):
+        partials = [p.strip() for p in _generate_batch(prompts, max_length=256)]
+    # combinar y pedir un resumen final
+    combined, _ = pack_context("", partials, budget=_budget(COMBINE_INSTRUCTION, COMBINE_SUFFIX))
+    return COMBINE_INSTRUCTION + combined + COMBINE_SUFFIX, max_length
+
+def generate_summary(text, max_length=300):
     if not text:
         return ""
-    # simple chunking por caracteres (mejor usar por oraciones si quieres)
-    CHUNK_SIZE = 3000
-    chunks = [text[i:i+CHUNK_SIZE] for i in range(0, len(text), CHUNK_SIZE)]
-    partials = []
-    for c in chunks:
-        prompt = (
-            "Resumir de manera clara y concisa. Incluir títulos, programa espacial, fechas y archivos si están presentes.\n\n"
-            f"{c}\n\nResumen:"
-        )
-        s = _generate(prompt, max_length=256)
-        partials.append(s.strip())
-    if len(partials) == 1:
-        return partials[0]
-    # combinar y pedir un resumen final
-    combined = "\n\n".join(partials)
-    final_prompt = "Combinar y sintetizar los siguientes resúmenes en un solo resumen corto y claro (3-6 oraciones):\n\n" + combined + "\nResumen final:"
-    final = _generate(final_prompt, max_length=max_length)
-    return final.strip()
+    with span("summary_prompt"):
+        prompt, max_len = _final_prompt(text, max_length)
+    with span("llm_generate"):
+        return _generate(prompt, max_length=max_len).strip()
+
+def stream_summary(text, max_length=300):
+    """Como generate_summary, pero el resumen final se va devolviendo a trozos"""
+    if not text:
+        return
+    prompt, max_len = _final_prompt(text, max_length)
+    yield from stream_generate(prompt, max_length=max_len)
+
+def batching_stats():
+    return generation_batcher.stats() if generation_batcher is not None else {"enabled": False}
@@ -0,0 +1,146 @@
+# models/rerank_model.py
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.lazy import Lazy
+
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Reranking opcional de /query y /search: activado por defecto o solo si la petición lo pide
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "0") not in ("0", "false", "False")
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "20"))            # candidatos que se re-puntúan
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))  # presupuesto por petición
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))   # pares por forward pass
+# sin medida de coste todavía (primer uso) se puntúa un batch pequeño para medirlo
+RERANK_PROBE_PAIRS = int(os.getenv("RERANK_PROBE_PAIRS", "4"))
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "256"))
+RERANK_CACHE_MAX_ENTRIES = int(os.getenv("RERANK_CACHE_MAX_ENTRIES", "20000"))
+
+
+def _load():
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(RERANK_MODEL, max_length=RERANK_MAX_LENGTH)
+
+# se carga en el warm-up de app.py si RERANK_ENABLED o, si no, en segundo plano en el primer
+# uso: una petición nunca espera a la carga (se responde sin reranking mientras tanto)
+reranker = Lazy("reranker", _load)
+
+
+class _ScoreCache:
+    """LRU de scores por (consulta normalizada, texto del documento)"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(query, text):
+        query = " ".join(query.lower().split())
+        return hashlib.sha1(f"{RERANK_MODEL}\x00{query}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            score = self.entries.get(key)
+            if score is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return score
+
+    def put(self, key, score):
+        with self.lock:
+            self.entries[key] = score
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / total, 4) if total else 0.0}
+
+
+score_cache = _ScoreCache(RERANK_CACHE_MAX_ENTRIES)
+# ms por par medidos en los últimos batches, para decidir si el siguiente cabe en el presupuesto
+_ms_per_pair = None
+
+
+def rerank(query, texts, budget_ms=RERANK_BUDGET_MS):
+    """
+    Re-puntúa texts (ya ordenados por la primera etapa) frente a query con el cross-encoder.
+    Los pares se puntúan por orden en batches de hasta RERANK_BATCH_SIZE, recortados a los
+    que caben en lo que queda de budget_ms según el coste por par medido; si no cabe ninguno
+    (tampoco en el primer batch) se para. Sin medida todavía se empieza con un batch de
+    RERANK_PROBE_PAIRS. Si el modelo no está cargado se lanza la carga en segundo plano y
+    no se puntúa nada. Devuelve (scores, info): scores[i] es None para los textos que no
+    llegaron a puntuarse (siempre un sufijo de la lista).
+    """
+    global _ms_per_pair
+    start = time.perf_counter()
+    scores = [None] * len(texts)
+    keys = [score_cache.key(query, t) for t in texts]
+    pending = []
+    for i, key in enumerate(keys):
+        cached = score_cache.get(key)
+        if cached is None:
+            pending.append(i)
+        else:
+            scores[i] = cached
+    cached_count = len(texts) - len(pending)
+
+    exhausted = False
+    loading = False
+    if pending and not reranker.ready:
+        if reranker.state != "loading":
+            reranker.warm_up()
+        exhausted = loading = True
+    elif pending:
+        model = reranker.get()
+        b = 0
+        while b < len(pending):
+            remaining_ms = budget_ms - (time.perf_counter() - start) * 1000
+            if _ms_per_pair is None:
+                size = min(RERANK_BATCH_SIZE, max(1, RERANK_PROBE_PAIRS))
+            else:
+                size = min(RERANK_BATCH_SIZE, int(remaining_ms // max(_ms_per_pair, 1e-6)))
+            if remaining_ms <= 0 or size <= 0:
+                exhausted = True
+                break
+            batch = pending[b:b + size]
+            b += len(batch)
+            t0 = time.perf_counter()
+            batch_scores = model.predict([(query, texts[i]) for i in batch], batch_size=len(batch),
+                                         show_progress_bar=False, convert_to_numpy=True)
+            per_pair = (time.perf_counter() - t0) * 1000 / len(batch)
+            _ms_per_pair = per_pair if _ms_per_pair is None else 0.8 * _ms_per_pair + 0.2 * per_pair
+            for i, score in zip(batch, np.asarray(batch_scores, dtype=np.float32).reshape(-1)):
+                scores[i] = float(score)
+                score_cache.put(keys[i], scores[i])
+    # solo cuenta el prefijo puntuado: un score cacheado más abajo no debe adelantar
+    # a candidatos de la primera etapa que se quedaron sin puntuar
+    if exhausted and None in scores:
+        first_missing = scores.index(None)
+        scores[first_missing:] = [None] * (len(scores) - first_missing)
+
+    info = {
+        "candidates": len(texts),
+        "reranked": sum(s is not None for s in scores),
+        "cached": cached_count,
+        "budget_exhausted": exhausted,
+        "model_loading": loading,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+    return scores, info
+
+
+def cache_stats():
+    return score_cache.stats()
@@ -74,6 +74,44 @@ st.set_page_config(
 st.markdown("<div class='title'>🚀 Motor de Conocimiento de Biología Espacial NASA</div>", unsafe_allow_html=True)
 st.markdown("<div class='subtitle'>Búsqueda semántica avanzada en papers de investigación - Powered by RAG & AI</div>", unsafe_allow_html=True)
 
+# -------------------------------
+# Progreso de la reconstrucción del índice
+# -------------------------------
+@st.fragment(run_every=1.0)
+def rebuild_progress():
+    """Se refresca cada segundo sin volver a ejecutar la página entera"""
+    job_id = st.session_state.get("rebuild_job")
+    if not job_id:
+        return
+    try:
+        job = requests.get(f"{API_URL}/rebuild_index/{job_id}", timeout=5).json()
+    except Exception as e:
+        st.warning(f"No se pudo consultar la reconstrucción: {e}")
+        return
+    status = job.get("status")
+    p = job.get("progress") or {}
+    if status in ("pending", "running"):
+        total = p.get("estimated_total") or 0
+        fraction = min(1.0, p.get("embedded", 0) / total) if total else 0.0
+        eta = f", quedan ~{p['eta_s']:.0f}s" if p.get("eta_s") is not None else ""
+        st.progress(fraction, text=f"{p.get('stage', status)}: {p.get('rows', 0)} leídas, "
+                                   f"{p.get('embedded', 0)} embebidas, {p.get('indexed', 0)} indexadas "
+                                   f"de ~{total}{eta}")
+        if job.get("cancel_requested"):
+            st.caption("Cancelando...")
+        elif st.button("Cancelar reconstrucción", use_container_width=True):
+            requests.delete(f"{API_URL}/rebuild_index/{job_id}", timeout=5)
+        return
+    del st.session_state["rebuild_job"]
+    if status == "done":
+        # se muestra tras recargar la página (estadísticas y filtros del índice nuevo)
+        st.session_state["rebuild_message"] = f"Índice reconstruido correctamente ✅ ({job['result']['indexed']} papers)"
+        st.rerun()
+    elif status == "cancelled":
+        st.info("Reconstrucción cancelada; se sigue usando el índice anterior")
+    else:
+        st.error(f"Error reconstruyendo índice: {job.get('error') or status}")
+
 # -------------------------------
 # Sidebar - Filtros y controles
 # -------------------------------
@@ -119,20 +157,45 @@ with st.sidebar:
     st.subheader("🔄 Gestión del Índice")
     
     if st.button("Reconstruir Índice", use_container_width=True):
-        with st.spinner("Reconstruyendo índice con todos los papers..."):
-            try:
-                response = requests.post(
-                    f"{API_URL}/rebuild_index", 
-                    json={"limit": 0, "include_csv": True},
-                    timeout=120
-                )
-                if response.status_code == 200:
-                    st.success("Índice reconstruido correctamente ✅")
-                    st.rerun()
-                else:
-                    st.error(f"Error: {response.status_code}")
-            except Exception as e:
-                st.error(f"Error conectando con el servidor: {e}")
+        try:
+            # la reconstrucción corre en segundo plano en el backend: solo se lanza el job
+            response = requests.post(
+                f"{API_URL}/rebuild_index", 
+                json={"limit": 0, "include_csv": True},
+                timeout=10
+            )
+            if response.status_code in (202, 409):
+                # 409: ya había una en marcha, se sigue esa
+                body = response.json()
+                st.session_state["rebuild_job"] = body.get("job_id") or body["detail"]["job_id"]
+            else:
+                st.error(f"Error: {response.status_code}")
+        except Exception as e:
+            st.error(f"Error conectando con el servidor: {e}")
+    
+    if st.session_state.get("rebuild_job"):
+        rebuild_progress()
+    if st.session_state.get("rebuild_message"):
+        st.success(st.session_state.pop("rebuild_message"))
+
+def stream_summary(summary_job, box):
+    """Va pintando el resumen según llegan los eventos SSE de /summary/{job_id}/stream"""
+    text = ""
+    try:
+        with requests.get(f"{API_URL}{summary_job['stream_url']}", stream=True, timeout=300) as r:
+            event = "message"
+            for line in r.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[len("data:"):])
+                    if event == "error":
+                        box.error(f"Error generando el resumen: {data.get('error')}")
+                        return
+                    text = data["summary"] if event == "done" else text + data["token"]
+                    box.info(text)
+    except Exception as e:
+        box.error(f"Error recibiendo el resumen: {e}")
 
 # -------------------------------
 # Búsqueda principal
@@ -166,19 +229,23 @@ if search_button and query_text.strip():
         }
 
         try:
-            response = requests.post(f"{API_URL}/query", json=payload, timeout=60)
+            # Primero los papers (/search); el resumen se genera aparte y llega por SSE
+            response = requests.post(f"{API_URL}/search", json=payload, timeout=60)
             if response.status_code == 200:
                 result = response.json()
                 
-                # Mostrar resumen generado por IA
-                if result.get("summary"):
+                # Hueco para el resumen generado por IA, se rellena tras pintar los papers
+                summary_job = result.get("summary_job")
+                if summary_job:
                     st.markdown("---")
                     st.subheader("🧠 Resumen Inteligente")
-                    with st.container():
-                        st.info(result["summary"])
+                    summary_box = st.empty()
+                    summary_box.info("Generando resumen...")
                     
                     st.metric("Papers encontrados", result.get("total_found", 0))
                     st.markdown("---")
+                elif result.get("message"):
+                    st.info(result["message"])
                 
                 # Mostrar resultados detallados
                 papers = result.get("papers", [])
@@ -187,7 +254,9 @@ if search_button and query_text.strip():
                     
                     for i, paper in enumerate(papers, 1):
                         meta = paper.get("meta", {})
-                        score = paper.get("score", 0)
+                        # similitud coseno si el paper salió de la búsqueda vectorial; si no, score del modo
+                        similarity = paper.get("similarity")
+                        score_label = f"Sim: {similarity:.3f}" if similarity is not None else f"Score: {paper.get('score', 0):.3f}"
                         
                         with st.container():
                             st.markdown(f"<div class='result-card'>", unsafe_allow_html=True)
@@ -197,7 +266,7 @@ if search_button and query_text.strip():
                             with col_a:
                                 st.markdown(f"**{i}. {meta.get('title', 'Sin título')}**")
                             with col_b:
-                                st.markdown(f"`Sim: {score:.3f}`")
+                                st.markdown(f"`{score_label}`")
                             
                             # Metadatos
                             col1, col2, col3 = st.columns(3)
@@ -225,6 +294,9 @@ if search_button and query_text.strip():
                             st.markdown("</div>", unsafe_allow_html=True)
                 else:
                     st.warning("No se encontraron papers relevantes para tu búsqueda. Intenta con otros términos o ajusta los filtros.")
+                
+                if summary_job:
+                    stream_summary(summary_job, summary_box)
                     
             else:
                 st.error(f"Error en el servidor: {response.status_code}")
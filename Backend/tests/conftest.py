@@ -0,0 +1,5 @@
+import os
+import sys
+
+# los módulos del backend se importan como en app.py (utils.*, models.*)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("sentence_transformers")
+
+from benchmarks.embed_backends import MIN_MEAN_COSINE, cosine_rows  # noqa: E402
+from models.embedding_model import load_embed_model  # noqa: E402
+
+SENTENCES = [
+    "Effects of spaceflight on mouse bone density",
+    "Microgravity alters gene expression in Arabidopsis roots",
+    "Radiation exposure and cardiovascular risk in astronauts",
+    "Transcriptomic analysis of the murine liver after 30 days on the ISS",
+    "Efectos de la microgravedad en el hueso",
+    "Muscle atrophy during hindlimb unloading",
+    "Zebrafish cartilage development under simulated microgravity",
+    "Immune response of human T cells cultured in orbit",
+]
+
+
+@pytest.fixture(scope="module")
+def reference():
+    model, _ = load_embed_model(backend="torch")
+    return model.encode(SENTENCES, convert_to_numpy=True, show_progress_bar=False)
+
+
+@pytest.mark.parametrize("backend", ["quantized", "onnx"])
+def test_backend_matches_torch(reference, backend):
+    if backend == "onnx":
+        pytest.importorskip("onnxruntime")
+    model, effective = load_embed_model(backend=backend)
+    if effective != backend:
+        pytest.skip(f"backend {backend} no disponible")
+    vectors = model.encode(SENTENCES, convert_to_numpy=True, show_progress_bar=False)
+    assert vectors.shape == reference.shape
+    assert np.mean(cosine_rows(vectors, reference)) >= MIN_MEAN_COSINE
@@ -0,0 +1,53 @@
+import os
+
+import numpy as np
+import pytest
+from numpy.lib.format import open_memmap
+
+from utils.embedding_cache import EmbeddingCache
+
+
+def filled(path, n=3):
+    cache = EmbeddingCache("m", 4, cache_dir=path, max_entries=8)
+    vectors = np.arange(n * 4, dtype=np.float32).reshape(n, 4)
+    cache.put_many([f"t{i}" for i in range(n)], vectors)
+    return cache, vectors
+
+
+def test_reopen_keeps_entries(tmp_path):
+    cache, vectors = filled(str(tmp_path))
+    del cache
+    found, missing = EmbeddingCache("m", 4, cache_dir=str(tmp_path), max_entries=8).get_many(["t0", "t1", "t2"])
+    assert not missing
+    np.testing.assert_array_equal(np.stack(found), vectors)
+
+
+@pytest.mark.parametrize("name", ["vectors.npy", "keys.npy", "ticks.npy"])
+def test_missing_file_resets_all(tmp_path, name):
+    cache, _ = filled(str(tmp_path))
+    cache_path = cache.path
+    del cache
+    os.remove(os.path.join(cache_path, name))
+    reopened = EmbeddingCache("m", 4, cache_dir=str(tmp_path), max_entries=8)
+    assert reopened.stats()["entries"] == 0
+    assert reopened.get_many(["t0"])[1] == [0]
+
+
+def test_wrong_shape_resets_all(tmp_path):
+    cache, _ = filled(str(tmp_path))
+    cache_path = cache.path
+    del cache
+    # keys con otra capacidad y ticks intactos: no se puede fiar de ningún slot
+    open_memmap(os.path.join(cache_path, "keys.npy"), mode="w+", dtype=np.uint8, shape=(4, 20))
+    reopened = EmbeddingCache("m", 4, cache_dir=str(tmp_path), max_entries=8)
+    assert reopened.stats()["entries"] == 0
+    for name, _, shape in reopened._files():
+        assert open_memmap(os.path.join(cache_path, name), mode="r").shape == shape
+
+
+def test_evicted_slot_is_reused(tmp_path):
+    cache = EmbeddingCache("m", 2, cache_dir=str(tmp_path), max_entries=10)
+    cache.put_many([f"t{i}" for i in range(12)], np.ones((12, 2), dtype=np.float32))
+    assert cache.stats()["entries"] == 10
+    found, missing = cache.get_many(["t11"])
+    assert not missing
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from utils.faiss_index import (
+    apply_upserts, build_faiss_index, id_selector, load_index, make_writable, save_index, search,
+)
+
+
+def _vectors(n, dim=32, seed=0):
+    x = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf", "hnsw", "sq8"])
+def test_filtered_search_stays_inside_filter(index_type):
+    x = _vectors(2000)
+    index = build_faiss_index(x, index_type=index_type)
+    # subconjunto bajo y denso (camino Bitmap); las consultas apuntan a etiquetas por encima
+    # del límite del filtro, que un bitmap mal dimensionado dejaría pasar
+    ids = np.arange(0, 300, dtype=np.int64)
+    queries = x[1500:1520]
+    D, I = search(index, queries, 10, ids=ids)
+    found = I[I >= 0]
+    assert len(found)
+    assert np.isin(found, ids).all()
+
+
+def test_bitmap_selector_bounds():
+    ids = np.array([0, 3, 9], dtype=np.int64)
+    sel = id_selector(ids, ntotal=10)
+    assert [sel.is_member(i) for i in range(80)] == [i in (0, 3, 9) for i in range(80)]
+
+
+@pytest.mark.parametrize("ifc", [True, False])
+@pytest.mark.parametrize("index_type", ["flat", "ivf", "hnsw"])
+def test_make_writable_never_mutates_the_mapped_index(tmp_path, monkeypatch, index_type, ifc):
+    import faiss
+    if not ifc:
+        monkeypatch.delattr(faiss, "IO_FLAG_MMAP_IFC", raising=False)
+    x = _vectors(500)
+    items = [{"id": f"p{i}", "meta": {"title": f"t{i}"}, "text_preview": ""} for i in range(len(x))]
+    index_path, meta_path = str(tmp_path / "index.bin"), str(tmp_path / "meta.json")
+    save_index(build_faiss_index(x, index_type=index_type), {"items": items}, index_path, meta_path)
+
+    mapped, meta = load_index(index_path, meta_path)
+    new = {"id": "new", "meta": {"title": "new"}, "text_preview": ""}
+    if meta["mmap_view"] is not None:
+        with pytest.raises(ValueError):
+            apply_upserts(mapped, meta, [new], x[:1])
+    writable = make_writable(mapped, meta)
+    apply_upserts(writable, meta, [new], x[:1])
+    assert writable.ntotal == 501
+    assert mapped.ntotal == 500
@@ -0,0 +1,92 @@
+import httpx
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+import utils.osdr_utils as osdr
+from utils.osdr_utils import OSDRClient
+
+URL = "https://osdr.test/osdr/data/osd/meta/1"
+
+
+class MockTransportAdapter(BaseAdapter):
+    """Adapter de requests que responde con un httpx.MockTransport"""
+
+    def __init__(self, handler):
+        super().__init__()
+        self.transport = httpx.MockTransport(handler)
+
+    def send(self, request, **kwargs):
+        reply = self.transport.handle_request(
+            httpx.Request(request.method, request.url, headers=dict(request.headers), content=request.body))
+        reply.read()
+        resp = requests.Response()
+        resp.status_code = reply.status_code
+        resp.headers = requests.structures.CaseInsensitiveDict(reply.headers)
+        resp._content = reply.content
+        resp.encoding = "utf-8"
+        resp.url = request.url
+        resp.request = request
+        return resp
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    waits = []
+    monkeypatch.setattr(osdr.time, "sleep", waits.append)
+    return waits
+
+
+def client(handler, tmp_path, **kw):
+    return OSDRClient(base="https://osdr.test", cache_dir=str(tmp_path), adapter=MockTransportAdapter(handler), **kw)
+
+
+def test_large_retry_after_is_clamped(tmp_path, sleeps):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"Retry-After": "86400"})
+        return httpx.Response(200, json={"ok": True})
+
+    c = client(handler, tmp_path, backoff_max_s=2.0)
+    assert c.get_json(URL) == {"ok": True}
+    assert sleeps == [2.0]
+    assert c.stats()["retries"] == 1
+
+
+def test_not_modified_reuses_cached_body(tmp_path, sleeps):
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, json={"title": "Rodent Research"}, headers={"ETag": '"v1"'})
+
+    c = client(handler, tmp_path)
+    assert c.get_json(URL) == {"title": "Rodent Research"}
+    assert c.get_json(URL) == {"title": "Rodent Research"}
+    assert seen == [None, '"v1"']
+    stats = c.stats()
+    assert stats["downloaded"] == 1 and stats["not_modified"] == 1
+    assert not sleeps
+
+
+def test_gives_up_after_the_retry_limit(tmp_path, sleeps):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    c = client(handler, tmp_path, retries=2, backoff_s=0.5, backoff_max_s=30)
+    assert c.get_json(URL) is None
+    assert len(calls) == 3
+    assert len(sleeps) == 2 and all(0.5 <= s <= 30 for s in sleeps)
+    stats = c.stats()
+    assert stats["retries"] == 2 and stats["errors"] == 1
@@ -0,0 +1,61 @@
+import time
+
+import numpy as np
+import pytest
+
+import models.rerank_model as rm
+
+
+class SlowCrossEncoder:
+    """ms_per_pair ms por par, score = -posición en la lista (invierte el orden)"""
+
+    def __init__(self, ms_per_pair):
+        self.ms_per_pair = ms_per_pair
+        self.pairs = 0
+
+    def predict(self, pairs, **kw):
+        time.sleep(self.ms_per_pair * len(pairs) / 1000)
+        self.pairs += len(pairs)
+        return np.array([-float(text.split()[-1]) for _, text in pairs], dtype=np.float32)
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = SlowCrossEncoder(ms_per_pair=5)
+    monkeypatch.setattr(rm.reranker, "loader", lambda: fake)
+    monkeypatch.setattr(rm.reranker, "state", "idle")
+    monkeypatch.setattr(rm.reranker, "value", None)
+    monkeypatch.setattr(rm, "_ms_per_pair", None)
+    monkeypatch.setattr(rm, "score_cache", rm._ScoreCache(1000))
+    return fake
+
+
+def texts(n, tag):
+    return [f"{tag} doc {i}" for i in range(n)]
+
+
+def test_model_not_loaded_does_not_block_the_request(model):
+    start = time.perf_counter()
+    scores, info = rm.rerank("q", texts(20, "a"), budget_ms=50)
+    assert (time.perf_counter() - start) < 0.05
+    assert scores == [None] * 20
+    assert info["model_loading"] and info["budget_exhausted"]
+    rm.reranker.get()
+
+
+def test_budget_limits_the_first_batch(model):
+    rm.reranker.get()
+    rm.rerank("warm", texts(4, "w"), budget_ms=1e9)  # mide el coste por par
+    scores, info = rm.rerank("q", texts(20, "b"), budget_ms=30)
+    assert info["budget_exhausted"]
+    assert 0 < info["reranked"] < 20
+    # lo puntuado es siempre un prefijo
+    assert all(s is not None for s in scores[:info["reranked"]])
+    assert all(s is None for s in scores[info["reranked"]:])
+    assert info["elapsed_ms"] < 30 + 5 * 2
+
+
+def test_generous_budget_scores_everything(model):
+    rm.reranker.get()
+    scores, info = rm.rerank("q", texts(20, "c"), budget_ms=1e9)
+    assert info["reranked"] == 20 and not info["budget_exhausted"]
@@ -0,0 +1,94 @@
+# utils/batcher.py
+"""
+Micro-batching para peticiones concurrentes: cada llamada deja su entrada en una cola y
+un hilo worker agrupa lo que llegue durante max_wait_ms (o hasta max_batch) y lo procesa
+en una sola llamada al modelo. Los handlers sync de FastAPI corren en un threadpool, así
+que bloquear hasta tener el resultado es lo esperado.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    def __init__(self, fn, max_batch=32, max_wait_ms=5, name="batcher", key=None):
+        """
+        fn(lista de entradas) -> lista de resultados (mismo orden).
+        key(entrada) -> clave de agrupación: solo se juntan entradas con la misma clave
+        (p. ej. mismos parámetros de generación).
+        """
+        self.fn = fn
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.name = name
+        self.key = key or (lambda item: None)
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_seen_batch = 0
+        self.max_queue_depth = 0
+        self.wait_ms_total = 0.0
+        self.worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self.worker.start()
+
+    def submit(self, item):
+        """Encola item y bloquea hasta su resultado (re-lanza la excepción del batch si falla)"""
+        fut = Future()
+        self.queue.put((item, fut, time.perf_counter()))
+        with self.lock:
+            self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return fut.result()
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            groups = {}
+            for entry in batch:
+                groups.setdefault(self.key(entry[0]), []).append(entry)
+            for entries in groups.values():
+                self._process(entries)
+
+    def _process(self, entries):
+        now = time.perf_counter()
+        with self.lock:
+            self.batches += 1
+            self.items += len(entries)
+            self.max_seen_batch = max(self.max_seen_batch, len(entries))
+            self.wait_ms_total += sum(now - t for _, _, t in entries) * 1000
+        try:
+            results = self.fn([item for item, _, _ in entries])
+            for (_, fut, _), res in zip(entries, results):
+                fut.set_result(res)
+        except Exception as e:
+            for _, fut, _ in entries:
+                fut.set_exception(e)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "name": self.name,
+                "max_batch": self.max_batch,
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+                "queue_depth": self.queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "max_batch_size": self.max_seen_batch,
+                "avg_queue_wait_ms": round(self.wait_ms_total / self.items, 2) if self.items else 0.0,
+            }
@@ -0,0 +1,159 @@
+# utils/embedding_cache.py
+"""
+Cache persistente de embeddings, con clave (modelo, hash del texto normalizado).
+Los vectores viven en un .npy float32 abierto con mmap de capacidad fija; cuando se
+llena se desalojan las entradas usadas hace más tiempo (LRU aproximado por contador).
+
+Son tres ficheros (vectors.npy, keys.npy, ticks.npy) y ticks.npy hace de marca de
+commit: un slot solo cuenta si su tick es distinto de 0, y el tick se escribe después
+del vector y la clave. Si falta alguno o no tiene la forma esperada se rehacen los tres.
+"""
+import hashlib
+import os
+import re
+import threading
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "data/embed_cache")
+CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "200000"))
+CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "1") not in ("0", "false", "False")
+# al llenarse se libera esta fracción de golpe para no recorrer los contadores en cada inserción
+EVICT_FRACTION = 0.1
+
+
+def normalize_text(text):
+    return re.sub(r"\s+", " ", str(text or "")).strip()
+
+
+def text_key(model_name, text):
+    return hashlib.sha1(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    def __init__(self, model_name, dim, cache_dir=CACHE_DIR, max_entries=CACHE_MAX_ENTRIES):
+        self.model_name = model_name
+        self.dim = dim
+        self.max_entries = max_entries
+        self.path = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.path, exist_ok=True)
+        self._open()
+
+    def _files(self):
+        """(nombre, dtype, forma) en el orden en que se escriben: ticks.npy el último"""
+        return (("vectors.npy", np.float32, (self.max_entries, self.dim)),
+                # sha1 crudo como uint8 (el dtype S20 de numpy recorta los \x00 finales)
+                ("keys.npy", np.uint8, (self.max_entries, 20)),
+                # contador de último uso por slot; 0 = slot libre
+                ("ticks.npy", np.int64, (self.max_entries,)))
+
+    def _valid(self):
+        for name, dtype, shape in self._files():
+            path = os.path.join(self.path, name)
+            if not os.path.exists(path):
+                return False
+            try:
+                arr = open_memmap(path, mode="r")
+            except (ValueError, OSError):
+                return False
+            ok = arr.shape == shape and arr.dtype == dtype
+            del arr
+            if not ok:
+                return False
+        return True
+
+    def _open(self):
+        if self._valid():
+            arrays = [open_memmap(os.path.join(self.path, name), mode="r+") for name, _, _ in self._files()]
+        else:
+            # falta un fichero, o cambió la capacidad o la dimensión: se empieza de cero con los
+            # tres. Primero se quita la marca de commit para que un corte a medias no deje slots
+            # apuntando a vectores o claves a medio escribir
+            ticks_path = os.path.join(self.path, "ticks.npy")
+            if os.path.exists(ticks_path):
+                os.remove(ticks_path)
+            arrays = [open_memmap(os.path.join(self.path, name), mode="w+", dtype=dtype, shape=shape)
+                      for name, dtype, shape in self._files()]
+        self.vectors, self.keys, self.ticks = arrays
+        used = np.flatnonzero(self.ticks)
+        self.slots = {self.keys[i].tobytes(): int(i) for i in used}
+        self.free = sorted(set(range(self.max_entries)) - set(used.tolist()), reverse=True)
+        self.tick = int(self.ticks.max()) if len(used) else 0
+
+    def _evict(self):
+        n = max(1, int(self.max_entries * EVICT_FRACTION))
+        oldest = np.argsort(self.ticks)[:n]
+        for slot in oldest:
+            key = self.keys[slot].tobytes()
+            if self.slots.get(key) == slot:
+                del self.slots[key]
+            self.ticks[slot] = 0
+            self.free.append(int(slot))
+        self.evictions += n
+
+    def get_many(self, texts):
+        """Devuelve (vectores, faltantes): vectores[i] es None si texts[i] no está en cache"""
+        keys = [text_key(self.model_name, t) for t in texts]
+        found, missing = [], []
+        with self.lock:
+            for i, key in enumerate(keys):
+                slot = self.slots.get(key)
+                if slot is None:
+                    found.append(None)
+                    missing.append(i)
+                    continue
+                self.tick += 1
+                self.ticks[slot] = self.tick
+                found.append(np.array(self.vectors[slot]))
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return found, missing
+
+    def _commit(self, written):
+        """Escribe [(slot, clave, vector)]: vectores y claves primero, los ticks al final"""
+        self.ticks.flush()  # los slots reutilizados ya no cuentan en disco
+        for slot, key, vec in written:
+            self.vectors[slot] = vec
+            self.keys[slot] = np.frombuffer(key, dtype=np.uint8)
+        self.vectors.flush()
+        self.keys.flush()
+        for slot, _, _ in written:
+            self.tick += 1
+            self.ticks[slot] = self.tick
+        self.ticks.flush()
+
+    def put_many(self, texts, vectors):
+        with self.lock:
+            written = []
+            for text, vec in zip(texts, vectors):
+                key = text_key(self.model_name, text)
+                slot = self.slots.get(key)
+                if slot is None:
+                    if not self.free:
+                        # lo pendiente se confirma antes: con tick 0 se desalojaría lo recién puesto
+                        self._commit(written)
+                        written = []
+                        self._evict()
+                    slot = self.free.pop()
+                    self.slots[key] = slot
+                    # un slot reutilizado deja de contar antes de cambiarle la clave
+                    self.ticks[slot] = 0
+                written.append((slot, key, vec))
+            self._commit(written)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "entries": len(self.slots),
+            "capacity": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+        }
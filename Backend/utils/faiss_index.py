@@ -2,29 +2,525 @@
 import faiss
 import numpy as np
 import json
+import math
 import os
 
+from utils.index_updates import DeltaLog, overlay_meta
+from utils.lexical_index import LexicalIndex, lexical_path, load_lexical
+from utils.meta_index import build_id_index, build_postings
+from utils.meta_store import MetaStore, MetaStoreWriter, is_store, write_store
+from utils.refine import REFINE_FACTOR, ExactVectors, vectors_path
+
 INDEX_PATH = os.getenv("FAISS_INDEX_PATH", "data/faiss_index.bin")
 META_PATH = os.getenv("FAISS_META_PATH", "data/faiss_meta.json")
+# Formato de metadata al guardar: columnar (mmap, lectura por fila) | json
+META_FORMAT = os.getenv("FAISS_META_FORMAT", "columnar")
+
+# Tipo de índice: flat (exacto) | ivf (IVF-Flat) | ivfpq (IVF-PQ) | hnsw
+# | fp16, sq8, pq: búsqueda exhaustiva sobre vectores comprimidos (ver utils/refine.py)
+INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "0"))  # 0 -> automático (~4*sqrt(n))
+PQ_M = int(os.getenv("FAISS_PQ_M", "16"))
+PQ_NBITS = int(os.getenv("FAISS_PQ_NBITS", "8"))
+HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "200"))
+DEFAULT_NPROBE = int(os.getenv("FAISS_NPROBE", "8"))
+DEFAULT_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+SQ_TRAIN_SIZE = int(os.getenv("FAISS_SQ_TRAIN_SIZE", "10000"))  # muestra para el rango por dimensión de sq8
+
+INDEX_TYPES = ("flat", "ivf", "ivfpq", "hnsw", "fp16", "sq8", "pq")
+SQ_TYPES = {"fp16": faiss.ScalarQuantizer.QT_fp16, "sq8": faiss.ScalarQuantizer.QT_8bit}
+
+# Métrica: ip (producto interno sobre vectores normalizados = coseno) | l2
+FAISS_METRIC = os.getenv("FAISS_METRIC", "ip")
+METRICS = {"ip": faiss.METRIC_INNER_PRODUCT, "l2": faiss.METRIC_L2}
+
+
+def _auto_nlist(n):
+    """nlist ~ 4*sqrt(n), acotado para que cada centroide tenga >= 39 puntos de entrenamiento"""
+    nlist = IVF_NLIST or int(4 * math.sqrt(n))
+    return max(1, min(nlist, n // 39 or 1))
+
+
+def _pq_params(dim, n):
+    """Ajusta M (subvectores) y nbits para que sean válidos con la dimensión y el tamaño del corpus"""
+    m = min(PQ_M, dim)
+    while dim % m != 0:
+        m -= 1
+    # cada sub-cuantizador necesita ~39 puntos por centroide (2**nbits centroides)
+    nbits = max(1, min(PQ_NBITS, int(math.log2(max(n // 39, 2)))))
+    return m, nbits
+
+
+def new_faiss_index(dim, index_type=None, n=0, nlist=None, metric=None):
+    """
+    Índice vacío según index_type (flat, ivf, ivfpq, hnsw, fp16, sq8, pq) y metric (ip, l2),
+    dimensionado para ~n vectores. IVF, sq8 y PQ salen sin entrenar (index.is_trained == False).
+    """
+    index_type = (index_type or INDEX_TYPE).lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Tipo de índice desconocido: {index_type}")
+    metric = (metric or FAISS_METRIC).lower()
+    if metric not in METRICS:
+        raise ValueError(f"Métrica desconocida: {metric}")
+    metric_type = METRICS[metric]
 
-def build_faiss_index(embeddings):
+    if index_type == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlat(dim, metric_type))
+    if index_type == "hnsw":
+        hnsw = faiss.IndexHNSWFlat(dim, HNSW_M, metric_type)
+        hnsw.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        hnsw.hnsw.efSearch = DEFAULT_EF_SEARCH
+        return faiss.IndexIDMap2(hnsw)
+    if index_type in SQ_TYPES:
+        return faiss.IndexIDMap2(faiss.IndexScalarQuantizer(dim, SQ_TYPES[index_type], metric_type))
+
+    # pq: recorrido exhaustivo de códigos PQ como un IVF de una sola lista (IndexPQ no
+    # admite IDSelector, que usan los filtros y los borrados)
+    nlist = 1 if index_type == "pq" else nlist or _auto_nlist(max(n, 1))
+    quantizer = faiss.IndexFlat(dim, metric_type)
+    if index_type == "ivf":
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric_type)
+    else:
+        m, nbits = _pq_params(dim, n)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, m, nbits, metric_type)
+    index.nprobe = min(DEFAULT_NPROBE, nlist)
+    return index
+
+
+def min_train_size(index):
+    """Vectores necesarios para entrenar el índice (~39 por centroide)"""
+    if index.is_trained:
+        return 0
+    if index_kind(index) != "ivf":
+        return SQ_TRAIN_SIZE  # sq8: solo aprende el rango de cada dimensión
+    ivf = faiss.extract_index_ivf(index)
+    size = 39 * ivf.nlist
+    pq = getattr(faiss.downcast_index(index), "pq", None)
+    if pq is not None:
+        size = max(size, 39 * (1 << pq.nbits))
+    return size
+
+
+def build_faiss_index(embeddings, index_type=None, nlist=None, metric=None):
+    """
+    Construye el índice según index_type (flat, ivf, ivfpq, hnsw, fp16, sq8, pq) y metric (ip, l2).
+    Los índices IVF, sq8 y PQ se entrenan con los mismos embeddings antes de añadirlos.
+    Cada vector lleva como etiqueta su posición en la metadata (0..n-1); flat y HNSW
+    van envueltos en IndexIDMap2 para admitir etiquetas y actualizaciones incrementales.
+    """
     if embeddings is None or len(embeddings) == 0:
         raise ValueError("Embeddings vacíos")
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(embeddings.astype(np.float32))
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    n, dim = embeddings.shape
+
+    index = new_faiss_index(dim, index_type=index_type, n=n, nlist=nlist, metric=metric)
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add_with_ids(embeddings, np.arange(n, dtype=np.int64))
     return index
 
-def save_index(index, meta, index_path=INDEX_PATH, meta_path=META_PATH):
+
+def _unwrap(index):
+    """Índice interno de un IndexIDMap/IndexIDMap2"""
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return faiss.downcast_index(index)
+
+
+def as_id_map(index):
+    """
+    Índices guardados antes de usar etiquetas (IndexFlatL2/IndexHNSWFlat sin IDMap):
+    se reconstruyen dentro de un IndexIDMap2 con etiqueta = posición.
+    Los IVF ya guardan ids propios y se devuelven tal cual.
+    """
+    if index is None or index_kind(index) == "ivf" or isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return index
+    vectors = index.reconstruct_n(0, index.ntotal)
+    inner = faiss.clone_index(index)
+    inner.reset()
+    idmap = faiss.IndexIDMap2(inner)
+    idmap.add_with_ids(vectors, np.arange(index.ntotal, dtype=np.int64))
+    return idmap
+
+
+def supports_remove(index):
+    return index_kind(index) != "hnsw"
+
+
+def make_writable(index, meta):
+    """
+    Índice sobre el que se puede escribir, a llamar antes del primer add/remove_ids.
+    Uno mapeado (meta["mmap_view"] = su fichero) no se toca nunca: con IO_FLAG_MMAP_IFC es
+    una vista de solo lectura (escribir en ella aborta el proceso) y con IO_FLAG_MMAP un IVF
+    tiene las listas en disco que las consultas en curso pueden estar recorriendo. Se lee
+    entero a memoria y se devuelve esa copia, que el llamador publica en lugar del mapeado
+    con el lock de escritura.
+    """
+    path = meta.get("mmap_view")
+    if path is None:
+        return index
+    owned = as_id_map(faiss.read_index(path))
+    if owned.ntotal != index.ntotal or owned.d != index.d:
+        # el fichero cambió después de mapearlo: copia desde el propio índice
+        owned = faiss.deserialize_index(faiss.serialize_index(index))
+    meta["mmap_view"] = None
+    return owned
+
+
+def _check_writable(meta):
+    if meta.get("mmap_view") is not None:
+        raise ValueError("El índice está mapeado en solo lectura: usa make_writable antes de escribir")
+
+
+def apply_upserts(index, meta, items, vectors):
+    """
+    Añade items (ya con meta/text_preview) y sus vectores con etiquetas nuevas.
+    Si un id ya existía, su fila anterior se da de baja. meta debe venir de overlay_meta
+    e index de make_writable.
+    """
+    _check_writable(meta)
+    overlay = meta["overlay"]
+    replaced = []
+    for it in items:
+        old = meta["id_index"].get(it.get("id"))
+        if old is not None:
+            replaced.append(old)
+            overlay.delete(old)
+    if replaced:
+        _remove_labels(index, overlay, replaced)
+    labels = np.array([overlay.add(it) for it in items], dtype=np.int64)
+    index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), labels)
+    exact = meta.get("exact_vectors")
+    if exact is not None:
+        exact.add(labels, vectors)
+    lexical = meta.get("lexical")
+    if lexical is not None:
+        for label, it in zip(labels, items):
+            lexical.add(int(label), it)
+    return labels
+
+
+def apply_deletes(index, meta, positions):
+    _check_writable(meta)
+    overlay = meta["overlay"]
+    for pos in positions:
+        overlay.delete(pos)
+    _remove_labels(index, overlay, positions)
+
+
+def _remove_labels(index, overlay, labels):
+    if supports_remove(index):
+        index.remove_ids(np.array(labels, dtype=np.int64))
+    else:
+        # HNSW: el vector se queda en el grafo y se excluye en cada búsqueda
+        overlay.tombstones.update(labels)
+
+
+def stored_vectors(index, labels, exact=None):
+    """
+    Vectores de las etiquetas tal como están guardados, para llevarlos a otro índice sin
+    volver a embeber: los float32 de exact (ExactVectors de un índice cuantizado) o, si no,
+    reconstruidos del índice (exactos en flat, hnsw e ivf). None si falta alguno.
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    if not len(labels):
+        return np.zeros((0, index.d), dtype=np.float32)
+    if exact is not None:
+        vectors, known = exact.get(labels)
+        return vectors if known.all() else None
+    if is_quantized(index):
+        return None  # decodificar los códigos perdería precisión
+    if index_kind(index) == "ivf":
+        return _ivf_vectors(index, labels)
+    try:
+        return np.vstack([index.reconstruct(int(label)) for label in labels]).astype(np.float32)
+    except RuntimeError:
+        return None
+
+
+def _ivf_vectors(index, labels):
+    """Un IVF sin direct map no reconstruye por etiqueta: se buscan las etiquetas en las listas"""
+    ivf = faiss.extract_index_ivf(index)
+    invlists = ivf.invlists
+    rows = {int(label): j for j, label in enumerate(labels)}
+    out = np.zeros((len(labels), ivf.d), dtype=np.float32)
+    found = 0
+    for lst in range(ivf.nlist):
+        size = invlists.list_size(lst)
+        if not size:
+            continue
+        ids = faiss.rev_swig_ptr(invlists.get_ids(lst), size)
+        for offset in np.flatnonzero(np.isin(ids, labels)):
+            ivf.reconstruct_from_offset(lst, int(offset), faiss.swig_ptr(out[rows[int(ids[offset])]]))
+            found += 1
+    return out if found == len(rows) else None
+
+
+def index_kind(index):
+    """Devuelve 'ivf', 'hnsw' o 'flat' según la estructura del índice"""
+    if index is None:
+        return None
+    index = _unwrap(index)
+    try:
+        if faiss.extract_index_ivf(index) is not None:
+            return "ivf"
+    except Exception:
+        pass
+    if isinstance(faiss.downcast_index(index), faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def index_storage(index):
+    """Cómo guarda los vectores el índice: 'float32', 'fp16', 'sq8' o 'pq'"""
+    inner = _unwrap(index)
+    if index_kind(index) == "ivf":
+        inner = faiss.downcast_index(faiss.extract_index_ivf(inner))
+    if isinstance(inner, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    if isinstance(inner, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return {faiss.ScalarQuantizer.QT_fp16: "fp16", faiss.ScalarQuantizer.QT_8bit: "sq8"}.get(inner.sq.qtype, "sq")
+    return "float32"
+
+
+def is_quantized(index):
+    """True si las distancias del índice son aproximadas (se benefician del re-ranking exacto)"""
+    return index is not None and index_storage(index) != "float32"
+
+
+def index_metric(index):
+    """'ip' o 'l2' según la métrica con la que se construyó el índice"""
+    return "ip" if index.metric_type == faiss.METRIC_INNER_PRODUCT else "l2"
+
+
+def similarity(index, distances):
+    """
+    Scores de index.search como similitud coseno (más alto = mejor), asumiendo vectores
+    normalizados: con ip ya lo son; con l2 (distancia al cuadrado) cos = 1 - d/2.
+    """
+    distances = np.asarray(distances, dtype=np.float32)
+    return distances if index_metric(index) == "ip" else 1.0 - distances / 2.0
+
+
+def id_selector(ids, ntotal):
+    """
+    IDSelector para restringir la búsqueda a las etiquetas dadas.
+    Bitmap si el subconjunto es grande (O(1) por consulta), Batch si es pequeño.
+    """
+    ids = np.ascontiguousarray(ids, dtype=np.int64)
+    if len(ids) and len(ids) * 8 > ntotal:
+        bound = int(ids.max()) + 1
+        mask = np.zeros(bound, dtype=bool)
+        mask[ids] = True
+        bitmap = np.packbits(mask, bitorder="little")
+        # n es el tamaño del bitmap en bytes: FAISS acepta id si id / 8 < n y su bit está a 1
+        sel = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+        sel.referenced_objects = [bitmap]  # el selector no copia el buffer
+    else:
+        sel = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+    return sel
+
+
+def search_params(index, nprobe=None, ef_search=None, selector=None):
+    """
+    Construye SearchParameters por petición (no modifica el índice compartido).
+    Devuelve None si no hay nada que ajustar.
+    """
+    kind = index_kind(index)
+    kwargs = {"sel": selector} if selector is not None else {}
+    if kind == "ivf" and (nprobe or kwargs):
+        nprobe = nprobe or faiss.extract_index_ivf(index).nprobe
+        return faiss.SearchParametersIVF(nprobe=int(nprobe), **kwargs)
+    if kind == "hnsw" and (ef_search or kwargs):
+        ef_search = ef_search or _unwrap(index).hnsw.efSearch
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search), **kwargs)
+    if kwargs:
+        return faiss.SearchParameters(**kwargs)
+    return None
+
+
+def search(index, queries, k, nprobe=None, ef_search=None, ids=None, exclude=None, refine=None,
+           refine_factor=None):
+    """
+    index.search con nprobe/efSearch opcionales por petición.
+    ids: si se da, solo se buscan esas etiquetas (pre-filtrado con IDSelector).
+    exclude: etiquetas a ignorar (borradas que siguen en el índice).
+    refine: ExactVectors del índice; se piden k * refine_factor (FAISS_REFINE_FACTOR)
+    candidatos y se devuelven los k mejores según la distancia exacta.
+    """
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    selector = None
+    if ids is not None:
+        if exclude:
+            ids = np.setdiff1d(ids, np.fromiter(exclude, dtype=np.int64))
+        selector = id_selector(ids, index.ntotal)
+    elif exclude:
+        excluded = np.fromiter(exclude, dtype=np.int64)
+        inner = faiss.IDSelectorBatch(len(excluded), faiss.swig_ptr(excluded))
+        selector = faiss.IDSelectorNot(inner)
+        selector.referenced_objects = [inner]
+    params = search_params(index, nprobe=nprobe, ef_search=ef_search, selector=selector)
+    factor = REFINE_FACTOR if refine_factor is None else refine_factor
+    fetch = k
+    if refine is not None and factor > 1:
+        fetch = max(k, min(k * factor, len(ids) if ids is not None else index.ntotal))
+    if params is None:
+        D, I = index.search(queries, fetch)
+    else:
+        D, I = index.search(queries, fetch, params=params)
+    if ids is not None:
+        # red de seguridad: un resultado fuera del filtro nunca llega al llamador
+        outside = (I >= 0) & ~np.isin(I, ids)
+        if outside.any():
+            I = np.where(outside, -1, I)
+    if fetch == k:
+        return D, I
+    return refine.rescore(queries, D, I, k, index_metric(index))
+
+
+def columnar_path(meta_path):
+    """Directorio del store columnar asociado a meta_path (data/faiss_meta.json -> data/faiss_meta.cols)"""
+    return os.path.splitext(meta_path)[0] + ".cols"
+
+
+def _write_index(index, index_path):
+    """write_index a un temporal + rename: quien lea index_path nunca ve un fichero a medias"""
     os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
-    faiss.write_index(index, index_path)
-    with open(meta_path, "w", encoding="utf-8") as f:
+    tmp_path = index_path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, index_path)
+
+
+def save_index(index, meta, index_path=INDEX_PATH, meta_path=META_PATH, meta_format=None):
+    """
+    Escribe un snapshot completo; el log de cambios incrementales queda compactado en él.
+    Cada fichero se reemplaza de forma atómica, pero índice y metadata son dos escrituras:
+    para publicar una versión nueva de forma atómica usar utils.snapshots.
+    """
+    _write_index(index, index_path)
+    DeltaLog(meta_path).clear()
+    LexicalIndex.from_items(meta.get("items", [])).save(lexical_path(meta_path))
+    if (meta_format or META_FORMAT) == "columnar":
+        write_store(columnar_path(meta_path), meta.get("items", []))
+        return
+    if "postings" not in meta:
+        meta = {**meta, "postings": build_postings(meta.get("items", []))}
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
         json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, meta_path)
+
+
+class _JsonMetaWriter:
+    """Misma interfaz que MetaStoreWriter para FAISS_META_FORMAT=json (acumula y escribe al cerrar)"""
+
+    def __init__(self, meta_path):
+        self.meta_path = meta_path
+        self.items = []
+
+    def append(self, item):
+        self.items.append(item)
+
+    def close(self):
+        meta = {"items": self.items, "postings": build_postings(self.items)}
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.meta_path)
+
+
+def open_meta_writer(meta_path=META_PATH, meta_format=None):
+    """Writer fila a fila para construir la metadata de un snapshot sin tenerla entera en memoria"""
+    if (meta_format or META_FORMAT) == "columnar":
+        return MetaStoreWriter(columnar_path(meta_path))
+    return _JsonMetaWriter(meta_path)
+
+
+def finish_snapshot(index, meta_writer, index_path=INDEX_PATH, meta_path=META_PATH, lexical=None, vectors=None):
+    """
+    Cierra un snapshot construido por partes (índice + writer de metadata + builder BM25
+    + VectorWriter con los float32 para el re-ranking, si el índice está cuantizado)
+    """
+    _write_index(index, index_path)
+    if vectors is not None:
+        vectors.close()
+    elif os.path.exists(vectors_path(index_path)):
+        os.remove(vectors_path(index_path))  # de un índice anterior en la misma ruta
+    meta_writer.close()
+    if lexical is not None:
+        lexical.save(lexical_path(meta_path))
+    DeltaLog(meta_path).clear()
+
+
+def load_meta(meta_path=META_PATH):
+    """
+    Lee la metadata en cualquiera de los dos formatos. Si existen ambos, gana el más reciente.
+    Devuelve {} si no hay metadata.
+    """
+    store_path = meta_path if is_store(meta_path) else columnar_path(meta_path)
+    has_store = is_store(store_path)
+    has_json = os.path.isfile(meta_path)
+    if has_store and (not has_json or os.path.getmtime(store_path) >= os.path.getmtime(meta_path)):
+        return MetaStore(store_path).as_meta()
+    if has_json:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        # el JSON no guarda id->posición (y los antiguos tampoco postings): se construyen aquí
+        if "postings" not in meta:
+            meta["postings"] = build_postings(meta.get("items", []))
+        meta["id_index"] = build_id_index(meta.get("items", []))
+        return meta
+    return {}
+
+
+def read_index(index_path):
+    """
+    Devuelve (índice, vista). Con IO_FLAG_MMAP_IFC (faiss >= 1.8) cualquier tipo de índice
+    (vectores, códigos, grafo HNSW, listas IVF) se queda en el fichero mapeado, en el page
+    cache compartido: tener dos versiones cargadas durante un swap no duplica la memoria.
+    Esa vista es de solo lectura (vista=True); la primera escritura la sustituye por una
+    copia en memoria (make_writable), que sí cuesta la RSS completa del índice: ~ntotal *
+    bytes por vector (1536 B en float32 con dim 384, ver utils/refine.py) más grafo/listas.
+    Sin IFC se prueba IO_FLAG_MMAP, que solo mapea las listas de los IVF (los demás tipos
+    se copian al heap igualmente; también se trata como vista), y si no, lectura normal.
+    """
+    ifc = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if ifc is not None:
+        try:
+            return faiss.read_index(index_path, ifc), True
+        except RuntimeError:
+            pass
+    try:
+        return faiss.read_index(index_path, faiss.IO_FLAG_MMAP), True
+    except RuntimeError:
+        return faiss.read_index(index_path), False
+
 
 def load_index(index_path=INDEX_PATH, meta_path=META_PATH):
-    if not os.path.exists(index_path) or not os.path.exists(meta_path):
+    """Carga el snapshot y re-aplica encima los cambios incrementales del log"""
+    if not os.path.exists(index_path):
+        return None, {}
+    meta = load_meta(meta_path)
+    if not meta:
         return None, {}
-    index = faiss.read_index(index_path)
-    with open(meta_path, "r", encoding="utf-8") as f:
-        meta = json.load(f)
+    mapped, view = read_index(index_path)
+    index = as_id_map(mapped)
+    meta = overlay_meta(meta)
+    # as_id_map de un índice antiguo ya devuelve una copia en memoria
+    meta["mmap_view"] = index_path if view and index is mapped else None
+    if is_quantized(index):
+        meta["exact_vectors"] = ExactVectors.open(vectors_path(index_path), index.d)
+    # antes del replay: los upserts del log también se indexan en BM25
+    meta["lexical"] = load_lexical(meta_path, meta["items"])
+    log = DeltaLog(meta_path)
+    if log.offset():
+        index = make_writable(index, meta)
+    for op, vector in log.replay(index.d):
+        if op["op"] == "upsert":
+            apply_upserts(index, meta, [op["item"]], vector.reshape(1, -1))
+        elif op["op"] == "delete":
+            pos = meta["id_index"].get(op["id"])
+            if pos is not None:
+                apply_deletes(index, meta, [pos])
     return index, meta
@@ -0,0 +1,217 @@
+# utils/index_updates.py
+"""
+Actualizaciones incrementales del índice. El snapshot base (faiss_index.bin + metadata)
+no se reescribe: cada upsert/delete se añade a un log JSONL y los vectores nuevos a un
+fichero float32 crudo. Al cargar, el log se re-aplica sobre el snapshot; /rebuild_index
+escribe un snapshot nuevo y vacía el log (compactación).
+
+Las posiciones de metadata son también las etiquetas FAISS (IndexIDMap2): las filas
+nuevas se añaden al final y las borradas quedan marcadas, nunca se reutilizan.
+"""
+import hashlib
+import json
+import os
+import re
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+from utils.meta_index import FILTER_FIELDS, field_terms
+
+
+def content_hash(title, abstract):
+    """Hash del texto que se embebe (title + abstract normalizados)"""
+    text = re.sub(r"\s+", " ", f"{title or ''} {abstract or ''}").strip().lower()
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def item_hash(item):
+    m = item.get("meta", {})
+    # filas indexadas antes de guardar el hash: se calcula con lo que hay en meta
+    return m.get("content_hash") or content_hash(m.get("title", ""), m.get("abstract", ""))
+
+
+def same_record(a, b):
+    """Dos items guardados son iguales (se comparan serializados: la metadata columnar devuelve JSON)"""
+    def canonical(item):
+        return json.dumps(item, sort_keys=True, ensure_ascii=False, default=str)
+    return canonical(a) == canonical(b)
+
+
+def delta_paths(meta_path):
+    base = os.path.splitext(meta_path)[0]
+    return base + ".delta.jsonl", base + ".delta.f32"
+
+
+class DeltaLog:
+    def __init__(self, meta_path):
+        self.log_path, self.vec_path = delta_paths(meta_path)
+
+    def append(self, ops, vectors=None):
+        """
+        ops: lista de {"op": "upsert", "item": {...}} / {"op": "delete", "id": ...}.
+        Los upserts van en el mismo orden que las filas de vectors. Los vectores se
+        escriben antes que el log para que ninguna entrada apunte a datos inexistentes.
+        """
+        if vectors is not None and len(vectors):
+            vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+            row = os.path.getsize(self.vec_path) // (4 * vectors.shape[1]) if os.path.exists(self.vec_path) else 0
+            with open(self.vec_path, "ab") as f:
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            for op in ops:
+                if op["op"] == "upsert":
+                    op["vec"] = row
+                    row += 1
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            for op in ops:
+                f.write(json.dumps(op, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def offset(self):
+        """Tamaño actual del log: replay(offset=...) itera solo lo que se añada después"""
+        return os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+
+    def replay(self, dim, offset=0):
+        """Itera (op, vector) en orden; vector es None para los deletes"""
+        if not os.path.exists(self.log_path):
+            return
+        vectors = np.zeros((0, dim), dtype=np.float32)
+        if os.path.exists(self.vec_path) and os.path.getsize(self.vec_path):
+            vectors = np.memmap(self.vec_path, dtype=np.float32, mode="r").reshape(-1, dim)
+        with open(self.log_path, "r", encoding="utf-8") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.strip():
+                    continue
+                op = json.loads(line)
+                yield op, (np.array(vectors[op["vec"]]) if "vec" in op else None)
+
+    def append_from(self, source, dim, offset=0):
+        """Copia al final de este log las operaciones de source desde offset, con sus vectores"""
+        ops, vectors = [], []
+        for op, vector in source.replay(dim, offset=offset):
+            ops.append({k: v for k, v in op.items() if k != "vec"})
+            if vector is not None:
+                vectors.append(vector)
+        if ops:
+            self.append(ops, np.vstack(vectors) if vectors else None)
+        return len(ops)
+
+    def clear(self):
+        for p in (self.log_path, self.vec_path):
+            if os.path.exists(p):
+                os.remove(p)
+
+
+class _Items(Sequence):
+    def __init__(self, base, extra):
+        self.base = base
+        self.extra = extra
+
+    def __len__(self):
+        return len(self.base) + len(self.extra)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        n = len(self.base)
+        return self.base[i] if i < n else self.extra[i - n]
+
+
+class _FieldPostings:
+    def __init__(self, base, extra):
+        self.base = base
+        self.extra = extra
+
+    def items(self):
+        yield from self.base.items()
+        yield from self.extra.items()
+
+    def keys(self):
+        return (term for term, _ in self.items())
+
+
+class _Postings(Mapping):
+    def __init__(self, base, extra):
+        self.base = base
+        self.extra = extra
+
+    def __getitem__(self, field):
+        # KeyError para los campos sin postings: resolve_filters los deja a match_filter
+        if field not in self.base and field not in self.extra:
+            raise KeyError(field)
+        return _FieldPostings(self.base.get(field, {}), self.extra.setdefault(field, {}))
+
+    def __iter__(self):
+        return iter(set(self.base) | set(self.extra))
+
+    def __len__(self):
+        return len(set(self.base) | set(self.extra))
+
+
+class _IdIndex:
+    def __init__(self, base, extra):
+        self.base = base
+        self.extra = extra
+
+    def get(self, paper_id, default=None):
+        if paper_id in self.extra:
+            pos = self.extra[paper_id]
+            return default if pos is None else pos
+        return self.base.get(paper_id, default)
+
+    def __contains__(self, paper_id):
+        return self.get(paper_id) is not None
+
+
+class MetaOverlay:
+    """Filas añadidas/borradas encima de la metadata del snapshot (que es de solo lectura)"""
+
+    def __init__(self, meta):
+        self.items = []
+        self.postings = {f: {} for f in FILTER_FIELDS}
+        self.ids = {}
+        self.deleted = set()
+        self.tombstones = set()  # borradas que siguen físicamente en el índice (HNSW no soporta remove_ids)
+        self._deleted_sorted = None
+        # campos con postings en el snapshot (los anteriores a un campo nuevo no lo tienen)
+        self.base_fields = set(meta.get("postings", {}))
+        self.meta = {
+            "items": _Items(meta.get("items", []), self.items),
+            "postings": _Postings(meta.get("postings", {}), self.postings),
+            "id_index": _IdIndex(meta.get("id_index", {}), self.ids),
+            "overlay": self,
+        }
+
+    def add(self, item):
+        pos = len(self.meta["items"])
+        self.items.append(item)
+        self.ids[item.get("id")] = pos
+        m = item.get("meta", {})
+        for f in FILTER_FIELDS:
+            for term in field_terms(f, m.get(f)):
+                self.postings[f].setdefault(term, []).append(pos)
+        return pos
+
+    def delete(self, pos):
+        paper_id = self.meta["items"][pos].get("id")
+        if self.meta["id_index"].get(paper_id) == pos:
+            self.ids[paper_id] = None
+        self.deleted.add(pos)
+        self._deleted_sorted = None
+
+    def deleted_sorted(self):
+        if self._deleted_sorted is None:
+            self._deleted_sorted = np.fromiter(sorted(self.deleted), dtype=np.int64, count=len(self.deleted))
+        return self._deleted_sorted
+
+
+def overlay_meta(meta):
+    if not meta or "overlay" in meta:
+        return meta
+    return MetaOverlay(meta).meta
@@ -0,0 +1,265 @@
+# utils/ingest.py
+"""
+Ingesta del CSV de papers por bloques: se lee el CSV en chunks, se normalizan las
+columnas de forma vectorizada, se embebe cada chunk, se añade al índice y la metadata
+se escribe fila a fila. La memoria pico depende del tamaño del chunk, no del corpus.
+"""
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.faiss_index import (
+    INDEX_PATH, META_PATH, new_faiss_index, min_train_size, open_meta_writer, finish_snapshot, is_quantized,
+    stored_vectors,
+)
+from utils.index_updates import content_hash
+from utils.lexical_index import LexicalIndexBuilder, lexical_text
+from utils.osdr_utils import default_client, study_record
+from utils.refine import VectorWriter, vectors_path
+
+CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "2000"))
+
+# campo -> (columnas posibles en el CSV, valor por defecto)
+FIELD_COLUMNS = {
+    "title": (("title", "Title"), ""),
+    "abstract": (("abstract", "Abstract", "summary"), ""),
+    "authors": (("authors", "Authors"), ""),
+    "program": (("program", "Program"), "Desconocido"),
+    "date": (("date", "Date"), ""),
+    "link": (("link", "Link"), ""),
+    "journal": (("journal", "Journal"), ""),
+}
+
+YEAR_PATTERN = r"\b((?:19|20)\d{2})\b"
+
+
+def safe_str(x):
+    return str(x) if x is not None else ""
+
+
+def _row_value(row, columns, default):
+    for col in columns:
+        value = row.get(col)
+        if value is not None:
+            return safe_str(value)
+    return default
+
+
+def build_item(item_id, row, origin="csv"):
+    """
+    Item a indexar a partir de una fila suelta (dict o Series).
+    Devuelve {"id", "text", "meta"}; text es lo que se embebe.
+    """
+    fields = {f: _row_value(row, cols, default) for f, (cols, default) in FIELD_COLUMNS.items()}
+    year = re.search(YEAR_PATTERN, fields["date"])
+    raw = row.to_dict() if hasattr(row, "to_dict") else dict(row)
+    return _make_item(item_id, fields, year.group(1) if year else "", raw, origin)
+
+
+def _make_item(item_id, fields, year, raw, origin):
+    title, abstract = fields["title"], fields["abstract"]
+    # Texto para embeddings (combinación de título y abstract)
+    text = f"{title}\n\n{abstract}".strip()
+    meta_item = {
+        "origin": origin,
+        "id": item_id,
+        "title": title,
+        "authors": fields["authors"],
+        "program": fields["program"],
+        "date": fields["date"],
+        "year": year,
+        "link": fields["link"],
+        "journal": fields["journal"],
+        "abstract": abstract[:500] if abstract else "",  # preview del abstract
+        "content_hash": content_hash(title, abstract),
+        "raw": raw,
+    }
+    return {"id": item_id, "text": text, "meta": meta_item}
+
+
+def stored_item(it):
+    """Forma en que se guarda un item en la metadata"""
+    return {
+        "id": it["id"],
+        "meta": it["meta"],
+        "text_preview": it["text"][:400] if it["text"] else it["meta"]["title"],
+    }
+
+
+def chunk_items(df, origin="csv"):
+    """Items de un chunk del CSV; la normalización de columnas y el año van vectorizados"""
+    columns = {}
+    for field, (candidates, default) in FIELD_COLUMNS.items():
+        col = next((c for c in candidates if c in df.columns), None)
+        columns[field] = df[col].fillna("").astype(str) if col else pd.Series(default, index=df.index)
+    years = columns["date"].str.extract(YEAR_PATTERN, expand=False).fillna("")
+    raws = df.to_dict("records")
+    items = []
+    for j, i in enumerate(df.index):
+        fields = {f: columns[f].iat[j] for f in FIELD_COLUMNS}
+        items.append(_make_item(f"{origin}-{i}", fields, years.iat[j], raws[j], origin))
+    return items
+
+
+def osdr_items(query, size=20, client=None):
+    """
+    Items (origin "osdr") de los estudios de OSDR que devuelve la búsqueda. La metadata
+    y los ficheros de todos los estudios se piden en paralelo; con la cache HTTP del
+    cliente, los estudios que no han cambiado no se vuelven a descargar.
+    """
+    client = client or default_client()
+    hits = client.search_studies(query, size=size)
+    studies = client.fetch_studies([h["osd_numeric_id"] for h in hits])
+    items = []
+    for h in hits:
+        study = studies[h["osd_numeric_id"]]
+        row = study_record(h, study["meta"], study["files"], base=client.base)
+        items.append(build_item(f"osdr-{h['osd_label']}", row, origin="osdr"))
+    return items
+
+
+def count_csv_rows(path):
+    """Estimación rápida de filas (líneas - cabecera), sin parsear el CSV"""
+    with open(path, "rb") as f:
+        return max(0, sum(1 for _ in f) - 1)
+
+
+def iter_csv_chunks(path, limit=0, chunksize=CHUNK_SIZE):
+    read = 0
+    for df in pd.read_csv(path, chunksize=chunksize):
+        if limit > 0:
+            df = df.head(limit - read)
+        if df.empty:
+            break
+        read += len(df)
+        yield df
+        if limit > 0 and read >= limit:
+            break
+
+
+def carry_over(index, meta, deleted_ids=(), reuse_vectors=True):
+    """
+    Lo que un rebuild desde el CSV tiene que conservar del snapshot servido: los items que
+    no salen del CSV (origin api / osdr, de /index/items y /index/osdr) y los ids dados de
+    baja, para que no reaparezcan. deleted_ids son los que ya venían de rebuilds anteriores.
+    Devuelve (items guardados, sus vectores o None si hay que re-embeberlos, ids borrados).
+    """
+    overlay = meta["overlay"]
+    items = meta["items"]
+    if "origin" in overlay.base_fields:
+        positions = set()
+        for term, found in meta["postings"]["origin"].items():
+            if term != "csv":
+                positions.update(int(p) for p in found)
+    else:
+        # snapshot sin postings de origin: se recorre la metadata
+        positions = {pos for pos in range(len(items)) if items[pos].get("meta", {}).get("origin", "csv") != "csv"}
+    positions = np.array(sorted(positions - overlay.deleted), dtype=np.int64)
+    carried = [items[int(pos)] for pos in positions]
+    vectors = stored_vectors(index, positions, exact=meta.get("exact_vectors")) if reuse_vectors else None
+
+    deleted = set(deleted_ids) | {items[pos].get("id") for pos in overlay.deleted}
+    # un id borrado y vuelto a añadir sigue vivo
+    deleted = {paper_id for paper_id in deleted if meta["id_index"].get(paper_id) is None}
+    return carried, vectors, deleted
+
+
+def carried_text(stored):
+    """Texto a embeber de un item guardado (el abstract está recortado a 500 caracteres)"""
+    m = stored.get("meta", {})
+    return f"{m.get('title', '')}\n\n{m.get('abstract', '')}".strip() or stored.get("text_preview", "")
+
+
+def stream_rebuild(csv_path, embed_fn, index_type=None, limit=0, chunksize=CHUNK_SIZE,
+                   index_path=INDEX_PATH, meta_path=META_PATH, progress=None, metric=None, check=None,
+                   skip_ids=(), extra_items=(), extra_vectors=None):
+    """
+    Reconstruye índice + metadata desde el CSV en un solo paso por bloques.
+    embed_fn(texts) -> np.ndarray. progress(dict) se llama tras cada fase de cada chunk con
+    stage (parsing | embedding | indexing | saving), rows (filas leídas), embedded,
+    indexed (vectores ya en el índice), estimated_total y elapsed_s.
+    check() se llama entre fases y puede lanzar una excepción para cancelar.
+    Los índices que necesitan entrenamiento acumulan vectores solo hasta min_train_size.
+    Si el índice está cuantizado, los float32 se escriben también a vectors_path(index_path)
+    para el re-ranking exacto.
+    Las filas del CSV cuyo id está en skip_ids se saltan; extra_items (items ya guardados, de
+    carry_over) se añaden al final con extra_vectors, o re-embebidos si es None.
+    Devuelve el número de items indexados.
+    """
+    n_estimate = count_csv_rows(csv_path)
+    if limit > 0:
+        n_estimate = min(n_estimate, limit)
+    n_estimate += len(extra_items)
+    writer = open_meta_writer(meta_path)
+    lexical = LexicalIndexBuilder()
+    index = None
+    raw_vectors = None
+    pending = []  # (vectores, etiquetas) esperando al entrenamiento
+    count = 0
+    start = time.time()
+
+    def report(stage, rows):
+        if check:
+            check()
+        if progress:
+            progress({"stage": stage, "rows": rows, "embedded": count,
+                      "indexed": int(index.ntotal) if index is not None else 0,
+                      "estimated_total": n_estimate, "elapsed_s": round(time.time() - start, 2)})
+
+    def add(stored, vectors):
+        nonlocal index, raw_vectors, count
+        if index is None:
+            index = new_faiss_index(vectors.shape[1], index_type=index_type, n=n_estimate, metric=metric)
+            if is_quantized(index):
+                raw_vectors = VectorWriter(vectors_path(index_path))
+        if raw_vectors is not None:
+            raw_vectors.append(vectors)
+        for it in stored:
+            writer.append(it)
+            lexical.add(lexical_text(it))
+
+        labels = np.arange(count, count + len(stored), dtype=np.int64)
+        count += len(stored)
+        report("indexing", count)
+        if index.is_trained:
+            index.add_with_ids(vectors, labels)
+        else:
+            pending.append((vectors, labels))
+            if sum(len(v) for v, _ in pending) >= min(min_train_size(index), n_estimate):
+                _train_and_flush(index, pending)
+
+    for df in iter_csv_chunks(csv_path, limit=limit, chunksize=chunksize):
+        items = [it for it in chunk_items(df) if it["id"] not in skip_ids]
+        if items:
+            report("embedding", count + len(items))
+            vectors = embed_fn([it["text"] or it["meta"]["title"] for it in items])
+            add([stored_item(it) for it in items], np.ascontiguousarray(vectors, dtype=np.float32))
+        report("parsing", count)
+
+    for start_row in range(0, len(extra_items), chunksize):
+        stored = list(extra_items[start_row:start_row + chunksize])
+        if extra_vectors is not None and (index is None or extra_vectors.shape[1] == index.d):
+            vectors = extra_vectors[start_row:start_row + chunksize]
+        else:
+            report("embedding", count + len(stored))
+            vectors = embed_fn([carried_text(it) for it in stored])
+        add(stored, np.ascontiguousarray(vectors, dtype=np.float32))
+
+    if index is None:
+        return 0
+    if pending:
+        _train_and_flush(index, pending)
+    report("saving", count)
+    finish_snapshot(index, writer, index_path=index_path, meta_path=meta_path, lexical=lexical, vectors=raw_vectors)
+    return count
+
+
+def _train_and_flush(index, pending):
+    if not index.is_trained:
+        index.train(np.vstack([v for v, _ in pending]))
+    for vectors, labels in pending:
+        index.add_with_ids(vectors, labels)
+    pending.clear()
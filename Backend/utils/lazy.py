@@ -0,0 +1,57 @@
+# utils/lazy.py
+"""
+Componentes que se cargan la primera vez que se usan (modelos, tokenizer), para que
+importar app.py no espere a torch/transformers. La carga es thread-safe: si varias
+peticiones llegan a la vez solo una carga y el resto espera.
+"""
+import threading
+import time
+
+
+class Lazy:
+    def __init__(self, name, loader):
+        """loader() -> objeto cargado"""
+        self.name = name
+        self.loader = loader
+        self.lock = threading.Lock()
+        self.value = None
+        self.state = "idle"  # idle | loading | ready | error
+        self.error = None
+        self.load_s = None
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def get(self):
+        if self.state == "ready":
+            return self.value
+        with self.lock:
+            if self.state == "ready":
+                return self.value
+            self.state = "loading"
+            start = time.perf_counter()
+            try:
+                self.value = self.loader()
+            except Exception as e:
+                # se reintenta en la siguiente llamada
+                self.state, self.error = "error", str(e)
+                raise
+            self.load_s = round(time.perf_counter() - start, 3)
+            self.state, self.error = "ready", None
+            print(f"{self.name} cargado en {self.load_s}s")
+            return self.value
+
+    def warm_up(self):
+        """Carga en un hilo aparte; los errores quedan en status()"""
+        def run():
+            try:
+                self.get()
+            except Exception as e:
+                print(f"Error cargando {self.name}: {e}")
+        thread = threading.Thread(target=run, name=f"warmup-{self.name}", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self):
+        return {"state": self.state, "load_s": self.load_s, "error": self.error}
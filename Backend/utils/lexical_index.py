@@ -0,0 +1,214 @@
+# utils/lexical_index.py
+"""
+Índice léxico BM25 sobre título + abstract, para términos exactos que los embeddings
+recuperan mal (genes como CDKN1a/p21, misiones como Bion-M 1). Postings en formato CSR
+(término -> posiciones y frecuencias en arrays numpy); la posición de cada documento es
+la misma que su etiqueta FAISS. Se guarda junto a la metadata en <meta>.bm25.npz.
+"""
+import math
+import os
+import re
+import unicodedata
+from array import array
+
+import numpy as np
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+# palabras vacías (inglés del corpus + español de las consultas); los números y letras
+# sueltas se mantienen: forman parte de nombres como "Bion-M 1"
+STOPWORDS = frozenset("""
+a an and are as at be by for from in into is it of on or that the their this to was were with
+al con de del el en la las los para por que se un una y
+""".split())
+
+
+def tokenize(text):
+    """Minúsculas, sin acentos, separando por todo lo que no sea alfanumérico"""
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode("ascii").lower()
+    return [t for t in _TOKEN.findall(text) if t not in STOPWORDS]
+
+
+def lexical_text(item):
+    """Texto que se indexa de un item guardado: título + abstract (preview de meta)"""
+    m = item.get("meta", {})
+    return f"{m.get('title', '')}\n{m.get('abstract', '')}"
+
+
+def lexical_path(meta_path):
+    """data/faiss_meta.json -> data/faiss_meta.bm25.npz"""
+    return os.path.splitext(meta_path)[0] + ".bm25.npz"
+
+
+def _term_freqs(text):
+    freqs = {}
+    for t in tokenize(text):
+        freqs[t] = freqs.get(t, 0) + 1
+    return freqs
+
+
+class LexicalIndexBuilder:
+    """Acumula documentos en orden de posición (0..n-1) y escribe el índice al final"""
+
+    def __init__(self):
+        self.postings = {}
+        self.doc_len = array("f")
+
+    def add(self, text):
+        pos = len(self.doc_len)
+        freqs = _term_freqs(text)
+        for term, tf in freqs.items():
+            entry = self.postings.get(term)
+            if entry is None:
+                entry = self.postings[term] = (array("q"), array("f"))
+            entry[0].append(pos)
+            entry[1].append(tf)
+        self.doc_len.append(sum(freqs.values()))
+        return pos
+
+    def build(self):
+        terms = list(self.postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(self.postings[t][0]) for t in terms])
+        positions = np.concatenate([np.frombuffer(self.postings[t][0], dtype=np.int64) for t in terms]) if terms else np.zeros(0, dtype=np.int64)
+        tfs = np.concatenate([np.frombuffer(self.postings[t][1], dtype=np.float32) for t in terms]) if terms else np.zeros(0, dtype=np.float32)
+        return LexicalIndex(terms, offsets, positions, tfs, np.frombuffer(self.doc_len, dtype=np.float32).copy())
+
+    def save(self, path):
+        index = self.build()
+        index.save(path)
+        return index
+
+
+class LexicalIndex:
+    """
+    Snapshot CSR de solo lectura + documentos añadidos después (upserts) en un dict aparte.
+    Los borrados no se quitan de las postings: se excluyen al buscar.
+    """
+
+    def __init__(self, terms, offsets, positions, tfs, doc_len, k1=BM25_K1, b=BM25_B):
+        self.vocab = {t: i for i, t in enumerate(terms)}
+        self.offsets = offsets
+        self.positions = positions
+        self.tfs = tfs
+        self.k1 = k1
+        self.b = b
+        self.extra = {}  # término -> [(posición, tf)] de los documentos añadidos
+        self.extra_len = {}  # posición -> longitud
+        self._set_doc_len(doc_len)
+
+    def _set_doc_len(self, doc_len):
+        self.doc_len = np.asarray(doc_len, dtype=np.float32)
+        self.avgdl = float(self.doc_len.mean()) if len(self.doc_len) and self.doc_len.mean() > 0 else 1.0
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    @classmethod
+    def from_items(cls, items):
+        builder = LexicalIndexBuilder()
+        for it in items:
+            builder.add(lexical_text(it))
+        return builder.build()
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            raw = data["terms"].tobytes().decode("utf-8")
+            terms = raw.split("\n") if raw else []
+            return cls(terms, data["offsets"], data["positions"], data["tfs"], data["doc_len"])
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # los tokens son [a-z0-9]+: el salto de línea sirve de separador
+        terms = "\n".join(sorted(self.vocab, key=self.vocab.get)).encode("utf-8")
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, terms=np.frombuffer(terms, dtype=np.uint8), offsets=self.offsets,
+                 positions=self.positions, tfs=self.tfs, doc_len=self.doc_len)
+        os.replace(tmp_path, path)
+
+    def add(self, pos, item):
+        """Indexa un item añadido con apply_upserts (pos = su etiqueta FAISS)"""
+        freqs = _term_freqs(lexical_text(item))
+        for term, tf in freqs.items():
+            self.extra.setdefault(term, []).append((pos, tf))
+        if pos >= len(self.doc_len):
+            grown = np.zeros(pos + 1, dtype=np.float32)
+            grown[:len(self.doc_len)] = self.doc_len
+            self.doc_len = grown
+        self.doc_len[pos] = sum(freqs.values())
+        self._set_doc_len(self.doc_len)
+
+    def _postings(self, term):
+        i = self.vocab.get(term)
+        if i is None:
+            pos, tf = self.positions[:0], self.tfs[:0]
+        else:
+            pos, tf = self.positions[self.offsets[i]:self.offsets[i + 1]], self.tfs[self.offsets[i]:self.offsets[i + 1]]
+        extra = self.extra.get(term)
+        if extra:
+            pos = np.concatenate([pos, np.array([p for p, _ in extra], dtype=np.int64)])
+            tf = np.concatenate([tf, np.array([t for _, t in extra], dtype=np.float32)])
+        return pos, tf
+
+    def search(self, query, k, ids=None, exclude=None):
+        """
+        Top-k por BM25: (posiciones, scores) ordenados de mayor a menor.
+        ids: si se da, solo esas posiciones (pre-filtrado). exclude: posiciones borradas.
+        Solo se devuelven documentos con algún término de la consulta.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        n = len(self.doc_len)
+        if not terms or not n or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        scores = np.zeros(n, dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len / self.avgdl)
+        for term in terms:
+            pos, tf = self._postings(term)
+            if not len(pos):
+                continue
+            idf = math.log(1 + (n - len(pos) + 0.5) / (len(pos) + 0.5))
+            # una posición aparece una sola vez por término: basta con una suma indexada
+            scores[pos] += idf * tf * (self.k1 + 1) / (tf + norm[pos])
+        if ids is not None:
+            allowed = np.zeros(n, dtype=bool)
+            allowed[ids[ids < n]] = True
+            scores[~allowed] = 0
+        if exclude:
+            excluded = np.fromiter(exclude, dtype=np.int64)
+            scores[excluded[excluded < n]] = 0
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return hits, scores[hits]
+
+
+def load_lexical(meta_path, items):
+    """
+    Índice guardado junto a la metadata, o construido en memoria a partir de los items
+    si no existe o no corresponde al snapshot (p. ej. índices anteriores a BM25).
+    """
+    path = lexical_path(meta_path)
+    if os.path.exists(path):
+        index = LexicalIndex.load(path)
+        if len(index) == len(items):
+            return index
+    return LexicalIndex.from_items(items)
+
+
+def rrf_fuse(rankings, limit=None, k=RRF_K):
+    """
+    Reciprocal rank fusion: score(d) = sum 1 / (k + rango de d en cada ranking).
+    rankings: listas de posiciones ordenadas. Devuelve [(posición, score)] de mayor a menor.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, pos in enumerate(ranking):
+            pos = int(pos)
+            scores[pos] = scores.get(pos, 0.0) + 1.0 / (k + rank + 1)
+    fused = sorted(scores.items(), key=lambda kv: -kv[1])
+    return fused[:limit] if limit is not None else fused
@@ -0,0 +1,85 @@
+# utils/meta_index.py
+import re
+import numpy as np
+
+# Campos con índice invertido (valor normalizado -> posiciones FAISS); origin (csv | api | osdr)
+# sirve además para encontrar, al reconstruir, los papers que no salen del CSV
+FILTER_FIELDS = ("program", "year", "journal", "authors", "origin")
+
+_AUTHOR_SPLIT = re.compile(r"[;,]")
+
+
+def _norm(value):
+    return str(value).strip().lower() if value is not None else ""
+
+
+def field_terms(field, value):
+    """Términos que se indexan para un valor de metadata"""
+    value = _norm(value)
+    if not value:
+        return []
+    if field == "authors":
+        # cada autor por separado + el valor completo (para substrings que crucen autores)
+        parts = [p.strip() for p in _AUTHOR_SPLIT.split(value) if p.strip()]
+        return list(dict.fromkeys(parts + [value]))
+    return [value]
+
+
+def build_postings(items, fields=FILTER_FIELDS):
+    """
+    Construye {campo: {término: [posiciones]}} a partir de meta["items"].
+    Las posiciones coinciden con los ids del índice FAISS.
+    """
+    postings = {f: {} for f in fields}
+    for pos, it in enumerate(items):
+        m = it.get("meta", {})
+        for f in fields:
+            for term in field_terms(f, m.get(f)):
+                postings[f].setdefault(term, []).append(pos)
+    return postings
+
+
+def build_id_index(items):
+    """id -> posición FAISS (si hay ids repetidos gana el primero, como la búsqueda lineal)"""
+    id_index = {}
+    for pos, it in enumerate(items):
+        id_index.setdefault(it.get("id"), pos)
+    return id_index
+
+
+def _lookup(field_postings, value):
+    """
+    Mismo criterio que match_filter (substring case-insensitive), pero recorriendo
+    el vocabulario del campo en vez de todos los documentos.
+    """
+    values = value if isinstance(value, (list, tuple)) else [value]
+    needles = [_norm(v) for v in values if _norm(v)]
+    result = set()
+    for term, positions in field_postings.items():
+        if any(n in term for n in needles):
+            result.update(positions)
+    return result
+
+
+def resolve_filters(postings, filters):
+    """
+    Devuelve (posiciones, filtros_restantes):
+    - posiciones: np.array ordenado con los documentos que cumplen los filtros indexados,
+      o None si ningún filtro indexado aplica.
+    - filtros_restantes: filtros sobre campos sin índice (se aplican con match_filter).
+    """
+    candidates = None
+    remaining = {}
+    for k, v in (filters or {}).items():
+        if v is None or (isinstance(v, str) and v.strip() == ""):
+            continue
+        if k not in postings:
+            remaining[k] = v
+            continue
+        matched = _lookup(postings[k], v)
+        candidates = matched if candidates is None else candidates & matched
+        if not candidates:
+            break
+    if candidates is None:
+        return None, remaining
+    return np.fromiter(sorted(candidates), dtype=np.int64, count=len(candidates)), remaining
@@ -0,0 +1,309 @@
+# utils/meta_store.py
+"""
+Metadata columnar en disco: un directorio con un manifest.json y, por cada columna,
+un array de offsets (.off.npy) y un heap de bytes UTF-8 (.heap). Todo se abre con
+mmap, así que cargar el índice no depende del tamaño del corpus: cada fila se
+decodifica solo cuando se pide por su posición FAISS.
+"""
+import hashlib
+import json
+import os
+import shutil
+from array import array
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+from utils.meta_index import FILTER_FIELDS, field_terms
+
+FORMAT = "columnar-v1"
+MANIFEST = "manifest.json"
+
+# Los valores que no son str se guardan como JSON precedidos de este byte;
+# el byte solo (sin JSON) marca una clave ausente en esa fila.
+_JSON_TAG = "\x00"
+_ABSENT = _JSON_TAG.encode("utf-8")
+
+
+def _encode(value):
+    if isinstance(value, str):
+        return value.encode("utf-8")
+    return (_JSON_TAG + json.dumps(value, ensure_ascii=False)).encode("utf-8")
+
+
+def _decode(raw):
+    s = raw.decode("utf-8")
+    if s.startswith(_JSON_TAG):
+        return json.loads(s[1:])
+    return s
+
+
+def _id_hash(raw):
+    # hash estable entre procesos (hash() de Python depende de PYTHONHASHSEED)
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "little")
+
+
+def _build_hash_table(hashes):
+    """Tabla hash con direccionamiento abierto (sondeo lineal): slot -> posición, -1 = vacío"""
+    size = 1 << max(4, (2 * len(hashes) - 1).bit_length())
+    mask = size - 1
+    slots = np.full(size, -1, dtype=np.int64)
+    for pos, h in enumerate(hashes):
+        i = h & mask
+        while slots[i] != -1:
+            i = (i + 1) & mask
+        slots[i] = pos
+    return slots
+
+
+def _open_heap(path):
+    if os.path.getsize(path) == 0:
+        return b""
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+
+class _ColumnWriter:
+    def __init__(self, path, name, backfill=0):
+        self.path = path
+        self.name = name
+        self.heap = open(os.path.join(path, f"{name}.heap"), "wb")
+        self.offsets = array("q", [0])
+        for _ in range(backfill):
+            self.write(_ABSENT)
+
+    def write(self, data):
+        self.heap.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+
+    def close(self):
+        self.heap.close()
+        np.save(os.path.join(self.path, f"{self.name}.off.npy"), np.frombuffer(self.offsets, dtype=np.int64))
+
+
+class MetaStoreWriter:
+    """
+    Escribe items ({"id", "meta", "text_preview"}) fila a fila. Las columnas de meta
+    se descubren sobre la marcha y las postings de filtros se acumulan al escribir.
+    """
+
+    def __init__(self, path, postings_fields=FILTER_FIELDS):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+        self.count = 0
+        self.columns = {}
+        self.meta_keys = []
+        self.postings = {f: {} for f in postings_fields}
+        self.id_hashes = array("Q")
+        for name in ("id", "text_preview"):
+            self.columns[name] = _ColumnWriter(self.tmp_path, name)
+
+    def append(self, item):
+        m = item.get("meta", {}) or {}
+        for k in m:
+            if k not in self.meta_keys:
+                self.meta_keys.append(k)
+                self.columns[f"meta.{k}"] = _ColumnWriter(self.tmp_path, f"meta.{k}", backfill=self.count)
+        raw_id = _encode(item.get("id", ""))
+        self.columns["id"].write(raw_id)
+        self.id_hashes.append(_id_hash(raw_id))
+        self.columns["text_preview"].write(_encode(item.get("text_preview", "")))
+        for k in self.meta_keys:
+            self.columns[f"meta.{k}"].write(_encode(m[k]) if k in m else _ABSENT)
+        for f, terms in self.postings.items():
+            for term in field_terms(f, m.get(f)):
+                terms.setdefault(term, array("q")).append(self.count)
+        self.count += 1
+
+    def _write_postings(self):
+        for f, terms in self.postings.items():
+            col = _ColumnWriter(self.tmp_path, f"postings.{f}.terms")
+            offsets = [0]
+            for term, positions in terms.items():
+                col.write(_encode(term))
+                offsets.append(offsets[-1] + len(positions))
+            col.close()
+            flat = np.concatenate([np.frombuffer(p, dtype=np.int64) for p in terms.values()]) if terms else np.zeros(0, dtype=np.int64)
+            np.save(os.path.join(self.tmp_path, f"postings.{f}.pos.npy"), flat)
+            np.save(os.path.join(self.tmp_path, f"postings.{f}.idx.npy"), np.array(offsets, dtype=np.int64))
+
+    def close(self):
+        for col in self.columns.values():
+            col.close()
+        self._write_postings()
+        np.save(os.path.join(self.tmp_path, "id.hash.npy"), _build_hash_table(self.id_hashes))
+        manifest = {
+            "format": FORMAT,
+            "count": self.count,
+            "meta_keys": self.meta_keys,
+            "postings": list(self.postings),
+        }
+        with open(os.path.join(self.tmp_path, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        # reemplazo del directorio completo en un paso
+        old_path = self.path + ".old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(self.path):
+            os.rename(self.path, old_path)
+        os.rename(self.tmp_path, self.path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+
+class _Column:
+    def __init__(self, path, name):
+        self.offsets = np.load(os.path.join(path, f"{name}.off.npy"), mmap_mode="r")
+        self.heap = _open_heap(os.path.join(path, f"{name}.heap"))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def raw(self, i):
+        return bytes(self.heap[self.offsets[i]:self.offsets[i + 1]])
+
+    def __getitem__(self, i):
+        return _decode(self.raw(i))
+
+
+class _Items(Sequence):
+    """Vista perezosa de meta["items"]: cada acceso arma el dict de una sola fila"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return self.store.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.store.item(i)
+
+
+class _FieldPostings:
+    """Postings de un campo: término -> posiciones (slice del array mmap)"""
+
+    def __init__(self, path, field):
+        self.path = path
+        self.field = field
+        self._terms = None
+        self.positions = np.load(os.path.join(path, f"postings.{field}.pos.npy"), mmap_mode="r")
+        self.index = np.load(os.path.join(path, f"postings.{field}.idx.npy"), mmap_mode="r")
+
+    @property
+    def terms(self):
+        # el vocabulario se decodifica una vez (es mucho menor que el número de filas)
+        if self._terms is None:
+            col = _Column(self.path, f"postings.{self.field}.terms")
+            self._terms = [col[i] for i in range(len(col))]
+        return self._terms
+
+    def __len__(self):
+        return len(self.index) - 1
+
+    def items(self):
+        for i, term in enumerate(self.terms):
+            yield term, self.positions[self.index[i]:self.index[i + 1]]
+
+    def keys(self):
+        return iter(self.terms)
+
+
+class _IdIndex:
+    """id -> posición sobre la tabla hash mmap; misma interfaz que un dict para .get()"""
+
+    def __init__(self, path, ids):
+        self.ids = ids
+        self.slots = np.load(os.path.join(path, "id.hash.npy"), mmap_mode="r")
+        self.mask = len(self.slots) - 1
+
+    def get(self, paper_id, default=None):
+        raw = _encode(paper_id)
+        i = _id_hash(raw) & self.mask
+        while self.slots[i] != -1:
+            pos = int(self.slots[i])
+            if self.ids.raw(pos) == raw:
+                return pos
+            i = (i + 1) & self.mask
+        return default
+
+    def __contains__(self, paper_id):
+        return self.get(paper_id) is not None
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class _Postings(Mapping):
+    def __init__(self, path, fields):
+        self.path = path
+        self.fields = fields
+        self._cache = {}
+
+    def __getitem__(self, field):
+        if field not in self.fields:
+            raise KeyError(field)
+        if field not in self._cache:
+            self._cache[field] = _FieldPostings(self.path, field)
+        return self._cache[field]
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+
+class MetaStore:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != FORMAT:
+            raise ValueError(f"Formato de metadata desconocido: {manifest.get('format')}")
+        self.count = manifest["count"]
+        self.meta_keys = manifest["meta_keys"]
+        self.columns = {"id": _Column(path, "id"), "text_preview": _Column(path, "text_preview")}
+        for k in self.meta_keys:
+            self.columns[f"meta.{k}"] = _Column(path, f"meta.{k}")
+        self.postings = _Postings(path, manifest.get("postings", []))
+        self.id_index = _IdIndex(path, self.columns["id"])
+
+    def item(self, i):
+        meta = {}
+        for k in self.meta_keys:
+            raw = self.columns[f"meta.{k}"].raw(i)
+            if raw != _ABSENT:
+                meta[k] = _decode(raw)
+        return {"id": self.columns["id"][i], "meta": meta, "text_preview": self.columns["text_preview"][i]}
+
+    def as_meta(self):
+        """Dict compatible con el formato JSON: {"items": [...], "postings": {...}, "id_index": {...}}"""
+        return {"items": _Items(self), "postings": self.postings, "id_index": self.id_index}
+
+
+def is_store(path):
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def write_store(path, items):
+    writer = MetaStoreWriter(path)
+    for it in items:
+        writer.append(it)
+    writer.close()
+    return writer.count
+
+
+if __name__ == "__main__":
+    # Conversión de un faiss_meta.json existente: python -m utils.meta_store data/faiss_meta.json
+    import sys
+
+    src = sys.argv[1] if len(sys.argv) > 1 else "data/faiss_meta.json"
+    dst = os.path.splitext(src)[0] + ".cols"
+    with open(src, "r", encoding="utf-8") as f:
+        n = write_store(dst, json.load(f).get("items", []))
+    print(f"{n} items escritos en {dst}")
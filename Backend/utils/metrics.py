@@ -0,0 +1,216 @@
+# utils/metrics.py
+"""
+Instrumentación del camino de las consultas, sin dependencias:
+- span(stage): mide un tramo (embedding, búsqueda, filtros, generación...). Va al
+  histograma rag_stage_seconds{stage} y, si la petición pidió debug_timings, a sus tiempos.
+- Histogramas y contadores en formato de texto de Prometheus para /metrics; los valores
+  que ya lleva cada componente (caches, índice, cargas de modelos) se leen al exportar.
+- Perfilado opcional por petición con pyinstrument (si está instalado y PROFILING_ENABLED).
+
+El estado de la petición va en contextvars, así que llega a las funciones que llama el
+handler (también a los modelos) sin pasarlo como parámetro. Lo que corre en otros hilos
+(micro-batchers) se mide desde el hilo que espera el resultado.
+"""
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") not in ("0", "false", "False")
+PROFILE_INTERVAL_S = float(os.getenv("PROFILE_INTERVAL_S", "0.001"))
+
+# segundos: de 1 ms (búsqueda FAISS, BM25) a 30 s (generación larga en CPU)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.series = {}  # valores de las etiquetas -> [contadores por bucket, suma, total]
+
+    def observe(self, value, *labels):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = {k: (list(c), s, n) for k, (c, s, n) in self.series.items()}
+        for labels, (counts, total, n) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', _number(bound))])} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', '+Inf')])} {n}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {n}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            values = dict(self.values)
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+def sample_lines(name, help, samples, labelnames=(), kind="gauge"):
+    """
+    Métrica cuyos valores lleva otro componente (p. ej. los contadores de una cache).
+    samples: {valores de las etiquetas: valor} (o un número, sin etiquetas); None se omite.
+    """
+    if not isinstance(samples, dict):
+        samples = {(): samples}
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples.items():
+        if value is not None:
+            labels = labels if isinstance(labels, tuple) else (labels,)
+            lines.append(f"{name}{_labels(labelnames, labels)} {_number(value)}")
+    return lines
+
+
+stage_seconds = Histogram("rag_stage_seconds", "Duración de cada tramo del camino de las consultas", ["stage"])
+request_seconds = Histogram("rag_request_seconds", "Duración de las peticiones HTTP",
+                            ["method", "route", "status"])
+requests_total = Counter("rag_requests_total", "Peticiones HTTP", ["method", "route", "status"])
+
+
+class Timings:
+    """Tiempos de los tramos de una petición (ms); un tramo repetido suma y cuenta llamadas"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self.lock:
+            entry = self.stages.setdefault(stage, {"ms": 0.0, "calls": 0})
+            entry["ms"] += seconds * 1000
+            entry["calls"] += 1
+
+    def as_dict(self):
+        with self.lock:
+            stages = {stage: {"ms": round(e["ms"], 3), "calls": e["calls"]} for stage, e in self.stages.items()}
+        return {"total_ms": round((time.perf_counter() - self.start) * 1000, 3), "stages": stages}
+
+
+_timings = contextvars.ContextVar("rag_timings", default=None)
+_profile = contextvars.ContextVar("rag_profile", default=None)
+
+
+@contextmanager
+def span(stage):
+    """Mide el bloque: siempre al histograma; a la petición si pidió debug_timings"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, stage)
+        timings = _timings.get()
+        if timings is not None:
+            timings.add(stage, elapsed)
+
+
+class ProfileSlot:
+    """Lo deja el middleware en la petición; el handler guarda ahí la salida del profiler"""
+
+    def __init__(self, fmt="html"):
+        self.fmt = fmt
+        self.output = None
+
+
+def request_profile(fmt):
+    """Marca la petición en curso para perfilarla; devuelve el slot (None si no está activo)"""
+    if not PROFILING_ENABLED:
+        return None
+    slot = ProfileSlot("text" if fmt == "text" else "html")
+    _profile.set(slot)
+    return slot
+
+
+_profiler_warned = False
+
+
+@contextmanager
+def _profiled(slot):
+    global _profiler_warned
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        if not _profiler_warned:
+            print("PROFILING_ENABLED sin pyinstrument instalado (pip install pyinstrument); no se perfila")
+            _profiler_warned = True
+        yield
+        return
+    # el profiler muestrea el hilo que lo arranca: el del handler, no el del middleware
+    profiler = Profiler(interval=PROFILE_INTERVAL_S)
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        slot.output = profiler.output_text(unicode=True) if slot.fmt == "text" else profiler.output_html()
+
+
+@contextmanager
+def request_timings(enabled=False):
+    """
+    Contexto de una petición del camino de consultas: yield de Timings si enabled (para
+    devolverlos en la respuesta) o None. Si el middleware pidió perfilar, se perfila aquí.
+    """
+    timings = Timings() if enabled else None
+    token = _timings.set(timings)
+    slot = _profile.get()
+    try:
+        if slot is not None and slot.output is None:
+            with _profiled(slot):
+                yield timings
+        else:
+            yield timings
+    finally:
+        _timings.reset(token)
@@ -1,14 +1,32 @@
 # utils/osdr_utils.py
-import re, requests
-from urllib.parse import quote
+"""
+Cliente de la API de OSDR: una Session compartida (pool de conexiones), peticiones en
+paralelo con concurrencia acotada, reintentos con backoff exponencial y una cache en disco
+con peticiones condicionales (If-None-Match / If-Modified-Since): lo que no ha cambiado
+vuelve como 304 y no se descarga otra vez. OSDR_BASE permite apuntarlo a un servidor local.
+"""
+import hashlib
+import json
 import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
 
 BASE = os.getenv("OSDR_BASE", "https://osdr.nasa.gov")
-SEARCH_URL = f"{BASE}/osdr/data/search"
-META_URL = f"{BASE}/osdr/data/osd/meta"
-FILES_URL = f"{BASE}/osdr/data/osd/files"
 HEADERS = {"Accept": "application/json", "User-Agent": "OSDR-Helper/1.0"}
-TIMEOUT = 30
+TIMEOUT = float(os.getenv("OSDR_TIMEOUT", "30"))
+MAX_WORKERS = int(os.getenv("OSDR_MAX_WORKERS", "8"))   # peticiones simultáneas
+RETRIES = int(os.getenv("OSDR_RETRIES", "3"))
+BACKOFF_S = float(os.getenv("OSDR_BACKOFF_S", "0.5"))   # 0.5, 1, 2... (+ jitter)
+BACKOFF_MAX_S = float(os.getenv("OSDR_BACKOFF_MAX_S", "30"))  # tope de cada espera, también de Retry-After
+CACHE_DIR = os.getenv("OSDR_CACHE_DIR", "data/osdr_cache")  # vacío = sin cache
+RETRY_STATUS = {429, 500, 502, 503, 504}
 
 def extract_osd_numeric(value):
     if value is None:
@@ -19,90 +37,259 @@ def extract_osd_numeric(value):
     m = re.search(r"OSD-(\d+)(?:\.\d+)?", s, flags=re.IGNORECASE)
     return m.group(1) if m else None
 
-def build_download_url(remote_url: str) -> str:
+def build_download_url(remote_url: str, base=BASE) -> str:
     if not remote_url:
         return ""
     if remote_url.startswith("http://") or remote_url.startswith("https://"):
         return remote_url
     if not remote_url.startswith("/"):
         remote_url = "/" + remote_url
-    return f"{BASE}{remote_url}"
+    return f"{base}{remote_url}"
 
 def safe_get(d, *keys, default=None):
     cur = d
     for k in keys:
+        if isinstance(cur, list) and isinstance(k, int):
+            cur = cur[k] if -len(cur) <= k < len(cur) else default
+            continue
         if not isinstance(cur, dict):
             return default
         cur = cur.get(k, default)
     return cur
 
-def search_studies_osdr(query, size=20):
-    url = f"{SEARCH_URL}?term={quote(query)}&from=0&size={size}"
-    resp = requests.get(url, headers=HEADERS, timeout=TIMEOUT)
-    if resp.status_code != 200:
-        return []
-    hits = resp.json().get("hits", {}).get("hits", [])
-    results = []
-    for h in hits:
-        src = h.get("_source", {}) or {}
-        candidates = [
-            src.get("OSD Study Id"),
-            src.get("OSD Study ID"),
-            src.get("Study Identifier"),
-            src.get("Study Accession"),
-        ]
-        osd_num = osd_label = None
-        for cand in candidates:
-            num = extract_osd_numeric(cand)
-            if num:
-                osd_num = num
-                osd_label = f"OSD-{num}"
+
+class HTTPCache:
+    """Respuestas JSON por URL con sus validadores (ETag / Last-Modified), un fichero por URL"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, url):
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url, resp):
+        entry = {
+            "url": url,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "fetched": time.time(),
+            "body": resp.text,
+        }
+        path = self._path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+class OSDRClient:
+    def __init__(self, base=BASE, max_workers=MAX_WORKERS, retries=RETRIES, backoff_s=BACKOFF_S,
+                 timeout=TIMEOUT, cache_dir=CACHE_DIR, backoff_max_s=BACKOFF_MAX_S, adapter=None):
+        """adapter: transport adapter de requests para la Session (en los tests, uno de mentira)"""
+        self.base = base.rstrip("/")
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.backoff_max_s = backoff_max_s
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = adapter or HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # un solo pool por cliente: la concurrencia total queda acotada aunque haya varias ingestas
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="osdr")
+        self.cache = HTTPCache(cache_dir) if cache_dir else None
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "downloaded": 0, "not_modified": 0, "retries": 0, "errors": 0, "stale": 0}
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def _backoff(self, attempt, resp=None):
+        retry_after = resp.headers.get("Retry-After") if resp is not None else None
+        if retry_after and retry_after.isdigit():
+            # un Retry-After enorme no puede dejar colgado a un worker de la ingesta
+            return min(float(retry_after), self.backoff_max_s)
+        return min(self.backoff_s * (2 ** attempt) * (1 + random.random() * 0.25), self.backoff_max_s)
+
+    def get_json(self, url):
+        """
+        GET con reintentos y cache condicional. Devuelve el JSON o None si la respuesta no
+        es válida; si el servidor no responde se devuelve la copia en cache, aunque sea vieja.
+        """
+        cached = self.cache.get(url) if self.cache is not None else None
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        for attempt in range(self.retries + 1):
+            self._count("requests")
+            try:
+                resp = self.session.get(url, headers=headers, timeout=self.timeout)
+            except requests.RequestException:
+                if attempt < self.retries:
+                    self._count("retries")
+                    time.sleep(self._backoff(attempt))
+                    continue
+                self._count("errors")
                 break
-        if not osd_num:
-            continue
-        title_pre = (src.get("Study Protocol Name") or src.get("Study Title") or "No Title").strip()
-        mission = src.get("Mission", {}) or {}
-        results.append({
-            "osd_numeric_id": osd_num,
-            "osd_label": osd_label,
-            "title_pre": title_pre,
-            "program": src.get("Flight Program") or src.get("Program") or "Unknown",
-            "mission_start": mission.get("Start Date") or "Unknown",
-            "mission_end": mission.get("End Date") or "Unknown",
-            "raw": src
-        })
-    return results
+            if resp.status_code == 304 and cached:
+                self._count("not_modified")
+                return json.loads(cached["body"])
+            if resp.status_code in RETRY_STATUS and attempt < self.retries:
+                self._count("retries")
+                time.sleep(self._backoff(attempt, resp))
+                continue
+            if resp.status_code != 200:
+                self._count("errors")
+                break
+            try:
+                data = resp.json()
+            except ValueError:
+                self._count("errors")
+                return None
+            self._count("downloaded")
+            if self.cache is not None:
+                self.cache.put(url, resp)
+            return data
 
-def get_study_meta(osd_numeric_id):
-    url = f"{META_URL}/{quote(str(osd_numeric_id))}"
-    r = requests.get(url, headers=HEADERS, timeout=TIMEOUT)
-    if r.status_code != 200:
-        return None
-    try:
-        return r.json()
-    except:
+        if cached:
+            self._count("stale")
+            return json.loads(cached["body"])
         return None
 
+    def search_studies(self, query, size=20):
+        url = f"{self.base}/osdr/data/search?term={quote(query)}&from=0&size={size}"
+        data = self.get_json(url)
+        if not isinstance(data, dict):
+            return []
+        hits = data.get("hits", {}).get("hits", [])
+        results = []
+        for h in hits:
+            src = h.get("_source", {}) or {}
+            candidates = [
+                src.get("OSD Study Id"),
+                src.get("OSD Study ID"),
+                src.get("Study Identifier"),
+                src.get("Study Accession"),
+            ]
+            osd_num = osd_label = None
+            for cand in candidates:
+                num = extract_osd_numeric(cand)
+                if num:
+                    osd_num = num
+                    osd_label = f"OSD-{num}"
+                    break
+            if not osd_num:
+                continue
+            title_pre = (src.get("Study Protocol Name") or src.get("Study Title") or "No Title").strip()
+            mission = src.get("Mission", {}) or {}
+            results.append({
+                "osd_numeric_id": osd_num,
+                "osd_label": osd_label,
+                "title_pre": title_pre,
+                "program": src.get("Flight Program") or src.get("Program") or "Unknown",
+                "mission_start": mission.get("Start Date") or "Unknown",
+                "mission_end": mission.get("End Date") or "Unknown",
+                "raw": src
+            })
+        return results
+
+    def study_meta(self, osd_numeric_id):
+        return self.get_json(f"{self.base}/osdr/data/osd/meta/{quote(str(osd_numeric_id))}")
+
+    def study_files(self, osd_numeric_id):
+        data = self.get_json(f"{self.base}/osdr/data/osd/files/{quote(str(osd_numeric_id))}")
+        key = f"OSD-{osd_numeric_id}"
+        files_list = safe_get(data, "studies", key, "study_files", default=[])
+        if not isinstance(files_list, list):
+            return []
+        processed = []
+        for f in files_list[:10]:
+            remote = f.get("remote_url") or f.get("remote") or ""
+            processed.append({
+                "name": f.get("name") or f.get("file_name") or "",
+                "category": f.get("category") or "",
+                "size": f.get("size") or f.get("file_size") or "",
+                "download_url": build_download_url(remote, self.base)
+            })
+        return processed
+
+    def fetch_studies(self, osd_numeric_ids, files=True):
+        """
+        Metadata (y lista de ficheros) de varios estudios en paralelo, con la concurrencia
+        del pool del cliente. Devuelve {id: {"meta": ..., "files": [...]}} en el orden pedido.
+        """
+        metas = {i: self.executor.submit(self.study_meta, i) for i in osd_numeric_ids}
+        file_lists = {i: self.executor.submit(self.study_files, i) for i in osd_numeric_ids} if files else {}
+        return {
+            i: {"meta": metas[i].result(), "files": file_lists[i].result() if files else []}
+            for i in osd_numeric_ids
+        }
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def default_client():
+    """Cliente compartido del proceso (Session y pool reutilizados entre llamadas)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OSDRClient()
+        return _client
+
+def search_studies_osdr(query, size=20):
+    return default_client().search_studies(query, size=size)
+
+def get_study_meta(osd_numeric_id):
+    return default_client().study_meta(osd_numeric_id)
+
 def get_study_files(osd_numeric_id):
-    url = f"{FILES_URL}/{quote(str(osd_numeric_id))}"
-    r = requests.get(url, headers=HEADERS, timeout=TIMEOUT)
-    if r.status_code != 200:
-        return []
-    try:
-        data = r.json()
-    except:
-        return []
-    key = f"OSD-{osd_numeric_id}"
-    files_list = safe_get(data, "studies", key, "study_files", default=[])
-    if not isinstance(files_list, list):
-        return []
-    processed = []
-    for f in files_list[:10]:
-        remote = f.get("remote_url") or f.get("remote") or ""
-        processed.append({
-            "name": f.get("name") or f.get("file_name") or "",
-            "category": f.get("category") or "",
-            "size": f.get("size") or f.get("file_size") or "",
-            "download_url": build_download_url(remote)
-        })
-    return processed
+    return default_client().study_files(osd_numeric_id)
+
+def study_record(hit, meta, files=None, base=BASE):
+    """
+    Fila para build_item a partir de un resultado de búsqueda y su metadata
+    (meta puede ser None si no se pudo descargar: se usa lo que trae la búsqueda).
+    """
+    label = hit["osd_label"]
+    study = safe_get(meta, "study", label, "studies", 0, default={}) or {}
+    src = hit.get("raw", {})
+    people = study.get("people") or []
+    authors = "; ".join(
+        " ".join(p for p in (person.get("firstName"), person.get("lastName")) if p)
+        for person in people if isinstance(person, dict)
+    ) or src.get("Study Publication Author List") or ""
+    date = study.get("publicReleaseDate") or src.get("Study Public Release Date") \
+        or (hit["mission_start"] if hit["mission_start"] != "Unknown" else "")
+    if isinstance(date, (int, float)):
+        # la API de metadata da la fecha de publicación como epoch (segundos)
+        date = time.strftime("%Y-%m-%d", time.gmtime(date))
+    return {
+        "title": study.get("title") or src.get("Study Title") or hit["title_pre"],
+        "abstract": study.get("description") or src.get("Study Description") or "",
+        "authors": authors,
+        "program": hit["program"],
+        "date": date,
+        "link": f"{base}/bio/repo/data/studies/{label}",
+        "journal": "NASA OSDR",
+        "osd_label": label,
+        "files": files or [],
+    }
@@ -0,0 +1,265 @@
+# utils/passages.py
+"""
+Índice de pasajes a texto completo. Para cada paper con artículo de PMC guardado en
+local (PMC_TEXT_DIR/PMC<id>.txt, id sacado del link) el texto se parte en pasajes de
+PASSAGE_WORDS palabras que se solapan PASSAGE_OVERLAP, y cada pasaje se indexa en un
+FAISS aparte con su paper. En la consulta los pasajes se agregan por paper (max/sum).
+
+Para corpus ~100x mayores que el de papers, nada se tiene entero en memoria al construir:
+los pasajes se embeben por lotes, los vectores van a un fichero float32 en disco
+(np.memmap) desde el que se entrena y se llena el índice por bloques, y el texto de los
+pasajes va a un MetaStore columnar. El pasaje -> paper se guarda ya resuelto: codes.npy
+(código de paper de cada pasaje), starts.npy (primer pasaje de cada código: los de un
+paper son contiguos) y un MetaStore "papers" con el id de cada código. Al cargar todo
+se abre con mmap (también el índice si FAISS lo admite para ese tipo), sin recorrer los
+pasajes. Con un índice cuantizado (fp16, sq8, pq, ivfpq) el fichero de
+vectores se conserva para el re-ranking exacto (utils/refine.py).
+"""
+import json
+import os
+import re
+import shutil
+import time
+from array import array
+
+import faiss
+import numpy as np
+
+from utils.faiss_index import new_faiss_index, min_train_size, is_quantized, read_index, search, similarity
+from utils.meta_store import MetaStore, MetaStoreWriter
+from utils.refine import ExactVectors
+
+PMC_TEXT_DIR = os.getenv("PMC_TEXT_DIR", "data/pmc_text")
+PASSAGE_WORDS = int(os.getenv("PASSAGE_WORDS", "200"))
+PASSAGE_OVERLAP = int(os.getenv("PASSAGE_OVERLAP", "50"))
+PASSAGE_EMBED_BATCH = int(os.getenv("PASSAGE_EMBED_BATCH", "4096"))  # pasajes por llamada a embed_fn
+PASSAGE_ADD_BATCH = 65536  # vectores por add al índice
+PASSAGE_OVERFETCH = int(os.getenv("PASSAGE_OVERFETCH", "8"))  # pasajes pedidos por paper del top-k
+PASSAGE_POOLING = os.getenv("PASSAGE_POOLING", "max")  # max | sum
+POOLINGS = ("max", "sum")
+
+MANIFEST = "manifest.json"
+FORMAT = "passages-v2"
+_PMC_ID = re.compile(r"PMC\d+", re.IGNORECASE)
+_TAG = re.compile(r"<[^>]+>")
+
+
+def passage_dir(meta_path):
+    """data/faiss_meta.json -> data/faiss_meta.passages"""
+    return os.path.splitext(meta_path)[0] + ".passages"
+
+
+def pmc_id(link):
+    m = _PMC_ID.search(str(link or ""))
+    return m.group(0).upper() if m else None
+
+
+def load_article(pmc, text_dir=PMC_TEXT_DIR):
+    """Texto del artículo (PMC<id>.txt, o .nxml/.xml sin etiquetas); None si no está en local"""
+    for ext in (".txt", ".nxml", ".xml"):
+        path = os.path.join(text_dir, pmc + ext)
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                text = f.read()
+            return _TAG.sub(" ", text) if ext != ".txt" else text
+    return None
+
+
+def split_passages(text, words=PASSAGE_WORDS, overlap=PASSAGE_OVERLAP):
+    """Ventanas de `words` palabras que avanzan words - overlap; la última puede ser más corta"""
+    tokens = text.split()
+    if not tokens:
+        return []
+    step = max(1, words - overlap)
+    passages = []
+    for start in range(0, len(tokens), step):
+        passages.append(" ".join(tokens[start:start + words]))
+        if start + words >= len(tokens):
+            break
+    return passages
+
+
+def build_passages(items, embed_fn, out_dir, text_dir=PMC_TEXT_DIR, index_type=None, metric=None,
+                   progress=None, check=None):
+    """
+    Construye el índice de pasajes de los items (meta["items"]) con artículo en text_dir.
+    embed_fn(texts) -> np.ndarray. Se escribe en out_dir.tmp y se sustituye out_dir al final.
+    check(): se llama entre lotes y puede lanzar una excepción para cancelar.
+    Devuelve {"papers": papers con texto, "passages": pasajes indexados}.
+    """
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    vec_path = os.path.join(tmp_dir, "vectors.f32")
+    writer = MetaStoreWriter(os.path.join(tmp_dir, "store"), postings_fields=())
+    paper_writer = MetaStoreWriter(os.path.join(tmp_dir, "papers"), postings_fields=())
+    codes, starts, seen = array("q"), array("q"), set()
+    count, papers, dim = 0, 0, None
+    batch_texts = []
+    start = time.time()
+
+    with open(vec_path, "wb") as vec_file:
+        def flush():
+            nonlocal dim
+            if not batch_texts:
+                return
+            if check:
+                check()
+            vectors = np.ascontiguousarray(embed_fn(batch_texts), dtype=np.float32)
+            dim = vectors.shape[1]
+            vec_file.write(vectors.tobytes())
+            batch_texts.clear()
+            if progress:
+                progress({"papers": papers, "passages": count, "elapsed_s": round(time.time() - start, 2)})
+
+        for it in items:
+            m = it.get("meta", {})
+            pmc = pmc_id(m.get("link"))
+            text = load_article(pmc, text_dir) if pmc and it["id"] not in seen else None
+            if not text:
+                continue
+            passages = split_passages(text)
+            if not passages:
+                continue
+            seen.add(it["id"])
+            paper_writer.append({"id": it["id"]})
+            starts.append(count)
+            papers += 1
+            title = m.get("title", "")
+            for k, passage in enumerate(passages):
+                writer.append({"id": f"{it['id']}#{k}", "meta": {"paper_id": it["id"], "pmc": pmc},
+                               "text_preview": passage})
+                codes.append(papers - 1)
+                # el título da contexto al pasaje suelto
+                batch_texts.append(f"{title}\n\n{passage}")
+                count += 1
+                if len(batch_texts) >= PASSAGE_EMBED_BATCH:
+                    flush()
+        flush()
+
+    if not count:
+        writer.close()
+        paper_writer.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return {"papers": 0, "passages": 0}
+    if check:
+        check()
+
+    vectors = np.memmap(vec_path, dtype=np.float32, mode="r").reshape(-1, dim)
+    index = new_faiss_index(dim, index_type=index_type, n=count, metric=metric)
+    if not index.is_trained:
+        # muestra aleatoria del memmap: solo se leen las filas de entrenamiento
+        n_train = min(count, max(min_train_size(index), 1))
+        sample = np.sort(np.random.default_rng(0).choice(count, size=n_train, replace=False))
+        index.train(np.ascontiguousarray(vectors[sample]))
+    for b in range(0, count, PASSAGE_ADD_BATCH):
+        chunk = np.ascontiguousarray(vectors[b:b + PASSAGE_ADD_BATCH])
+        index.add_with_ids(chunk, np.arange(b, b + len(chunk), dtype=np.int64))
+    del vectors
+    faiss.write_index(index, os.path.join(tmp_dir, "index.bin"))
+    if not is_quantized(index):
+        os.remove(vec_path)  # los vectores ya están en el índice, sin pérdida
+    writer.close()
+    paper_writer.close()
+    starts.append(count)
+    np.save(os.path.join(tmp_dir, "codes.npy"), np.frombuffer(codes, dtype=np.int64))
+    np.save(os.path.join(tmp_dir, "starts.npy"), np.frombuffer(starts, dtype=np.int64))
+    manifest = {"format": FORMAT, "papers": papers, "passages": count, "dim": dim,
+                "words": PASSAGE_WORDS, "overlap": PASSAGE_OVERLAP, "built": time.time()}
+    with open(os.path.join(tmp_dir, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    old_dir = out_dir + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(out_dir):
+        os.rename(out_dir, old_dir)
+    os.rename(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return {"papers": papers, "passages": count}
+
+
+class PassageIndex:
+    def __init__(self, path, id_index, items):
+        """
+        id_index: id de paper -> posición en el índice de papers (meta["id_index"]), vivo: tras
+        un upsert devuelve la posición nueva del paper y tras un delete, None.
+        items: meta["items"], para saber el id del paper de una posición.
+        """
+        with open(os.path.join(path, MANIFEST), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT:
+            raise ValueError(f"Formato del índice de pasajes desconocido: {self.manifest.get('format')}")
+        self.index, _ = read_index(os.path.join(path, "index.bin"))  # solo se lee: la vista mmap basta
+        self.exact = None
+        if is_quantized(self.index):
+            self.exact = ExactVectors.open(os.path.join(path, "vectors.f32"), self.index.d)
+        self.store = MetaStore(os.path.join(path, "store"))
+        self.id_index = id_index
+        self.items = items
+        # pasaje -> paper por id (código en paper_ids): sobrevive a reconstrucciones y upserts
+        self.codes = np.load(os.path.join(path, "codes.npy"), mmap_mode="r")
+        self.starts = np.load(os.path.join(path, "starts.npy"), mmap_mode="r")
+        papers = MetaStore(os.path.join(path, "papers"))
+        self.paper_ids = papers.columns["id"]
+        self.code_of = papers.id_index
+        # posición -> código, según se piden: una posición no cambia de paper (los upserts
+        # añaden posiciones nuevas), así que lo resuelto vale para siempre
+        self.pos_code = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _code(self, pos):
+        if pos not in self.pos_code:
+            self.pos_code[pos] = self.code_of.get(self.items[pos]["id"])
+        return self.pos_code[pos]
+
+    def passages_of(self, paper_positions):
+        """Pasajes de un conjunto de papers (para pre-filtrar con IDSelector)"""
+        codes = [c for c in (self._code(int(p)) for p in paper_positions) if c is not None]
+        ranges = [np.arange(self.starts[c], self.starts[c + 1], dtype=np.int64) for c in sorted(set(codes))]
+        return np.concatenate(ranges) if ranges else np.zeros(0, dtype=np.int64)
+
+    def text(self, passage):
+        return self.store.columns["text_preview"][int(passage)]
+
+    def search(self, q_emb, k, paper_positions=None, exclude=None, overfetch=PASSAGE_OVERFETCH):
+        """
+        Pasajes más parecidos agrupados por paper: {posición actual del paper: [(similitud, pasaje)]},
+        cada lista de mayor a menor. Se piden k * overfetch pasajes para cubrir ~k papers.
+        exclude: posiciones de papers borrados.
+        """
+        ids = None
+        if paper_positions is not None:
+            ids = self.passages_of(paper_positions)
+            if not len(ids):
+                return {}
+        n = len(ids) if ids is not None else self.index.ntotal
+        D, I = search(self.index, q_emb, min(n, max(1, k * overfetch)), ids=ids, refine=self.exact)
+        sims = similarity(self.index, D[0])
+        grouped = {}
+        for passage, sim in zip(I[0], sims):
+            if passage < 0:
+                continue
+            pos = self.id_index.get(str(self.paper_ids[self.codes[passage]]))
+            if pos is None or (exclude and pos in exclude):
+                continue
+            grouped.setdefault(int(pos), []).append((float(sim), int(passage)))
+        return grouped
+
+
+def pool(similarities, pooling=PASSAGE_POOLING):
+    return float(sum(similarities)) if pooling == "sum" else float(max(similarities))
+
+
+def load_passages(meta_path, meta):
+    """Índice de pasajes para la metadata de un snapshot, o None si no se ha construido"""
+    path = passage_dir(meta_path)
+    if not os.path.isfile(os.path.join(path, MANIFEST)):
+        return None
+    try:
+        return PassageIndex(path, meta["id_index"], meta["items"])
+    except (ValueError, OSError) as e:
+        # p. ej. un índice de una versión anterior, sin codes.npy: se sirve sin pasajes
+        print(f"Índice de pasajes no cargado ({e}); reconstrúyelo con /index/passages")
+        return None
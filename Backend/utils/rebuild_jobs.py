@@ -0,0 +1,155 @@
+# utils/rebuild_jobs.py
+"""
+Reconstrucciones del índice en segundo plano: /rebuild_index devuelve un job_id al
+momento y el trabajo (CSV -> embeddings -> FAISS -> snapshot) corre en un hilo aparte,
+de uno en uno. El job informa de su progreso (filas leídas, embebidas, indexadas, ETA)
+y se puede cancelar entre bloques.
+
+Para que las consultas no noten la reconstrucción, el hilo del worker se limita:
+- REBUILD_NICE: prioridad más baja para el hilo (en Linux nice es por hilo, y lo heredan
+  los hilos de OpenMP y los procesos que abre, p. ej. el pool de embeddings).
+- REBUILD_THREADS: hilos de FAISS (omp_set_num_threads solo afecta al hilo que lo llama)
+  y de los embeddings: procesos del pool con REBUILD_THREADS // procesos hilos cada uno,
+  o hilos de torch si el bloque es pequeño y se embebe en el propio proceso.
+"""
+import os
+import sys
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import faiss
+
+REBUILD_NICE = int(os.getenv("REBUILD_NICE", "10"))  # 0 = misma prioridad que las consultas
+REBUILD_THREADS = int(os.getenv("REBUILD_THREADS", "0"))  # 0 -> la mitad de los cores
+# los jobs terminados se olvidan pasado este tiempo
+REBUILD_JOB_TTL_S = float(os.getenv("REBUILD_JOB_TTL_S", "3600"))
+
+FINISHED = ("done", "error", "cancelled")
+
+
+class Cancelled(Exception):
+    pass
+
+
+class RebuildJob:
+    def __init__(self, params):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.status = "pending"
+        self.progress = {"stage": "pending"}
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = self.finished = None
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def update(self, **progress):
+        """Progreso del worker (stage, rows, embedded, indexed, estimated_total)"""
+        with self.lock:
+            self.progress.update(progress)
+
+    def check(self):
+        """Lo llama el worker entre bloques: lanza Cancelled si se pidió cancelar"""
+        if self.cancel_event.is_set():
+            raise Cancelled()
+
+    def to_dict(self):
+        with self.lock:
+            progress = dict(self.progress)
+            end = self.finished or time.time()
+            elapsed = end - self.started if self.started else 0.0
+            done, total = progress.get("embedded", 0), progress.get("estimated_total")
+            eta = None
+            if self.status == "running" and total and done:
+                # el embedding domina el tiempo: ritmo de filas embebidas hasta ahora
+                eta = round(elapsed / done * max(0, total - done), 1)
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "cancel_requested": self.cancel_event.is_set() and self.status not in FINISHED,
+                "params": self.params,
+                "progress": {**progress, "elapsed_s": round(elapsed, 2), "eta_s": eta},
+                "result": self.result,
+                "error": self.error,
+                "queued_s": round((self.started or end) - self.created, 3),
+            }
+
+
+class RebuildJobs:
+    def __init__(self, threads=REBUILD_THREADS, nice=REBUILD_NICE, ttl_s=REBUILD_JOB_TTL_S):
+        self.threads = threads or max(1, (os.cpu_count() or 1) // 2)
+        self.nice = nice
+        self.ttl_s = ttl_s
+        # un solo worker: dos reconstrucciones a la vez solo compiten por la CPU
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rebuild",
+                                           initializer=self._limit_worker)
+        self.lock = threading.Lock()
+        self.jobs = {}
+
+    def _limit_worker(self):
+        faiss.omp_set_num_threads(self.threads)
+        if self.nice > 0 and sys.platform.startswith("linux"):
+            # en otros sistemas nice afecta a todo el proceso (también a las consultas)
+            try:
+                os.nice(self.nice)
+            except OSError as e:
+                print(f"No se pudo bajar la prioridad del worker de reconstrucción: {e}")
+
+    def submit(self, fn, **params):
+        """
+        Lanza fn(job, **params) en el worker; lo que devuelva queda en result.
+        Devuelve (job, True), o (job activo, False) si ya hay una reconstrucción en marcha.
+        """
+        with self.lock:
+            self._expire()
+            running = next((job for job in self.jobs.values() if job.status not in FINISHED), None)
+            if running is not None:
+                return running, False
+            job = RebuildJob(params)
+            self.jobs[job.id] = job
+        self.executor.submit(self._run, job, fn)
+        return job, True
+
+    def _run(self, job, fn):
+        with job.lock:
+            job.started = time.time()
+            job.status = "running"
+        try:
+            job.check()
+            result, status, error = fn(job, **job.params), "done", None
+        except Cancelled:
+            result, status, error = None, "cancelled", None
+        except Exception as e:
+            traceback.print_exc()
+            result, status, error = None, "error", str(e)
+        with job.lock:
+            job.result, job.status, job.error = result, status, error
+            job.progress["stage"] = status
+            job.finished = time.time()
+
+    def cancel(self, job_id):
+        """Pide cancelar el job; el worker para en el siguiente bloque. None si no existe"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        job.cancel_event.set()
+        return job.to_dict()
+
+    def _expire(self):
+        now = time.time()
+        for job_id in [j for j, job in self.jobs.items()
+                       if job.finished is not None and now - job.finished > self.ttl_s]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        job = self.jobs.get(job_id)
+        return job.to_dict() if job is not None else None
+
+    def list(self):
+        with self.lock:
+            jobs = sorted(self.jobs.values(), key=lambda job: -job.created)
+        return [job.to_dict() for job in jobs]
@@ -0,0 +1,118 @@
+# utils/refine.py
+"""
+Re-ranking exacto para los índices que guardan los vectores comprimidos (fp16, sq8, pq,
+ivfpq). El índice ordena con distancias aproximadas; los float32 originales se quedan
+en disco (un fichero crudo junto al índice, fila = etiqueta) y se leen con mmap.
+search() pide k * FAISS_REFINE_FACTOR candidatos al índice y los reordena con el
+producto interno / L2 exacto: solo se leen esas filas, así que en memoria residente
+queda el índice comprimido más el page cache de lo consultado.
+
+Bytes por vector con MiniLM (dim 384), sin contar etiquetas (8 B + mapa inverso de
+IndexIDMap2) ni listas/grafo:
+  flat, ivf, hnsw    float32    1536 B   (hnsw: + ~2*M*4 B de grafo)
+  fp16               float16     768 B
+  sq8                int8        384 B
+  pq, ivfpq          PQ 16x8      16 B
+
+Recall@10 frente a flat, 20k vectores sintéticos agrupados de dim 384 (benchmarks/suite.py
+--sections index, FAISS_REFINE_FACTOR=4; ann_recall.py barre el factor):
+  fp16 0.999 -> 1.000 con re-ranking   sq8 0.967 -> 1.000
+  pq   0.138 -> 0.462 (1.000 con factor 16)   ivfpq 0.365 -> 0.768
+fp16 y sq8 son casi exactos y pesan 2x y 4x menos; pq necesita un factor alto y conviene
+medirlo con los embeddings reales (ann_recall.py sin --synthetic) antes de usarlo.
+"""
+import os
+
+import numpy as np
+
+REFINE_FACTOR = int(os.getenv("FAISS_REFINE_FACTOR", "4"))  # 0/1 = sin re-ranking exacto
+VECTORS_SUFFIX = ".vectors.f32"
+
+
+def vectors_path(index_path):
+    """Fichero de vectores float32 de un índice (data/faiss_index.bin -> data/faiss_index.vectors.f32)"""
+    return os.path.splitext(index_path)[0] + VECTORS_SUFFIX
+
+
+class VectorWriter:
+    """Escribe los vectores por bloques, en orden de etiqueta, a un temporal; close() lo publica"""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(self.tmp_path, "wb")
+
+    def append(self, vectors):
+        self.file.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+
+    def close(self):
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+
+class ExactVectors:
+    """
+    Vectores float32 por etiqueta: los del snapshot (mmap, solo lectura) y, en memoria,
+    los que se añaden después (upserts y replay del log de cambios). Las etiquetas
+    nuevas van siempre al final, así que una fila del snapshot nunca cambia.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self.extra = {}
+
+    @classmethod
+    def open(cls, path, dim):
+        """None si no hay fichero o no cuadra con la dimensión del índice"""
+        if not os.path.exists(path):
+            return None
+        size = os.path.getsize(path)
+        if size == 0 or size % (4 * dim):
+            print(f"Ignorando {path}: {size} bytes no son vectores float32 de dimensión {dim}")
+            return None
+        return cls(np.memmap(path, dtype=np.float32, mode="r").reshape(-1, dim))
+
+    def __len__(self):
+        return len(self.base) + len(self.extra)
+
+    def add(self, labels, vectors):
+        for label, vector in zip(labels, np.asarray(vectors, dtype=np.float32)):
+            self.extra[int(label)] = vector.copy()
+
+    def get(self, labels):
+        """(vectores, known): las filas de etiquetas desconocidas quedan a cero con known=False"""
+        labels = np.asarray(labels, dtype=np.int64)
+        out = np.zeros((len(labels), self.base.shape[1]), dtype=np.float32)
+        known = labels < len(self.base)
+        if known.any():
+            out[known] = self.base[labels[known]]
+        for j in np.flatnonzero(~known):
+            vector = self.extra.get(int(labels[j]))
+            if vector is not None:
+                out[j] = vector
+                known[j] = True
+        return out, known
+
+    def rescore(self, queries, D, I, k, metric):
+        """
+        Reordena los candidatos de index.search (D, I) con la distancia exacta y devuelve
+        los k mejores con la forma de index.search (huecos: etiqueta -1). Un candidato sin
+        vector guardado conserva su distancia aproximada.
+        """
+        ip = metric == "ip"
+        out_D = np.full((len(queries), k), np.finfo(np.float32).min if ip else np.finfo(np.float32).max,
+                        dtype=np.float32)
+        out_I = np.full((len(queries), k), -1, dtype=np.int64)
+        for r, q in enumerate(np.asarray(queries, dtype=np.float32)):
+            valid = I[r] >= 0
+            labels = I[r][valid]
+            if not len(labels):
+                continue
+            vectors, known = self.get(labels)
+            exact = vectors @ q if ip else ((vectors - q) ** 2).sum(axis=1)
+            scores = np.where(known, exact, D[r][valid]).astype(np.float32)
+            order = np.argsort(-scores if ip else scores, kind="stable")[:k]
+            out_D[r, :len(order)] = scores[order]
+            out_I[r, :len(order)] = labels[order]
+        return out_D, out_I
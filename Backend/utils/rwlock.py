@@ -0,0 +1,49 @@
+# utils/rwlock.py
+"""
+Lock de lectores/escritor: las búsquedas (lectores) entran a la vez y solo se excluyen
+con las escrituras en el índice, que son cortas (el embedding se hace fuera). Da
+preferencia al escritor: cuando hay uno esperando no entran lectores nuevos, así que un
+flujo continuo de consultas no lo deja sin turno. No es reentrante: un lector no debe
+volver a pedir el lock dentro de su bloque.
+"""
+import threading
+from contextlib import contextmanager
+
+
+class RWLock:
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
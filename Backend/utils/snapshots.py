@@ -0,0 +1,204 @@
+# utils/snapshots.py
+"""
+Snapshots versionados del índice. Cada versión es un directorio data/snapshots/vNNNNNN
+con faiss_index.bin, la metadata (y todo lo que deriva de ella: BM25, log de cambios
+incrementales) y un manifest.json. Una versión se escribe entera en un directorio
+temporal y se publica con un rename; el fichero CURRENT (reemplazado con os.replace)
+dice cuál se sirve. Nunca se sobreescribe un snapshot publicado.
+
+En memoria, LiveSnapshot guarda el snapshot servido con un contador de referencias: cada
+consulta toma (índice, metadata) de la misma versión y la suelta al terminar, así que un
+swap no afecta a las consultas en curso y la versión anterior se libera cuando termina
+la última.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+SNAPSHOT_DIR = os.getenv("INDEX_SNAPSHOT_DIR", "data/snapshots")
+SNAPSHOT_KEEP = int(os.getenv("INDEX_SNAPSHOT_KEEP", "3"))  # versiones que se conservan para rollback
+
+CURRENT = "CURRENT"
+MANIFEST = "manifest.json"
+INDEX_FILE = "faiss_index.bin"
+META_FILE = "faiss_meta.json"
+DELETED_FILE = "deleted_ids.json"  # ids borrados que un rebuild desde el CSV no debe recuperar
+_VERSION = re.compile(r"^v(\d+)$")
+
+
+class PendingSnapshot:
+    def __init__(self, version, path, info):
+        self.version = version
+        self.index_path = os.path.join(path, INDEX_FILE)
+        self.meta_path = os.path.join(path, META_FILE)
+        self.deleted_path = os.path.join(path, DELETED_FILE)
+        self.info = dict(info)  # se añade al manifest
+
+    def write_deleted_ids(self, ids):
+        with open(self.deleted_path, "w", encoding="utf-8") as f:
+            json.dump(sorted(ids), f, ensure_ascii=False)
+
+
+class SnapshotStore:
+    def __init__(self, root=SNAPSHOT_DIR):
+        self.root = root
+
+    def paths(self, version):
+        """(index_path, meta_path) de una versión"""
+        d = os.path.join(self.root, version)
+        return os.path.join(d, INDEX_FILE), os.path.join(d, META_FILE)
+
+    def _numbers(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(int(m.group(1)) for m in map(_VERSION.match, os.listdir(self.root)) if m)
+
+    def manifest(self, version):
+        try:
+            with open(os.path.join(self.root, version, MANIFEST), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def deleted_ids(self, version):
+        """Ids borrados que arrastra una versión (vacío si no tiene fichero)"""
+        try:
+            with open(os.path.join(self.root, version, DELETED_FILE), "r", encoding="utf-8") as f:
+                return set(json.load(f))
+        except (OSError, ValueError):
+            return set()
+
+    def versions(self):
+        """Manifests de las versiones publicadas, de la más nueva a la más antigua"""
+        current = self.current()
+        result = []
+        for n in reversed(self._numbers()):
+            manifest = self.manifest(f"v{n:06d}")
+            if manifest is not None:
+                result.append({**manifest, "current": manifest["version"] == current})
+        return result
+
+    def current(self):
+        try:
+            with open(os.path.join(self.root, CURRENT), "r", encoding="utf-8") as f:
+                version = f.read().strip()
+        except OSError:
+            return None
+        return version if self.manifest(version) is not None else None
+
+    def set_current(self, version):
+        if self.manifest(version) is None:
+            raise ValueError(f"Versión desconocida: {version}")
+        tmp_path = os.path.join(self.root, CURRENT + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.root, CURRENT))
+
+    @contextmanager
+    def create(self, **info):
+        """
+        Directorio temporal para escribir una versión nueva: yield de un PendingSnapshot
+        (version, index_path, meta_path, info). Si el bloque termina sin error se escribe el
+        manifest con info y se publica con un rename, sin activarla (eso lo hace set_current).
+        Si falla, se borra.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        numbers = self._numbers()
+        version = f"v{(numbers[-1] + 1 if numbers else 1):06d}"
+        tmp_dir = os.path.join(self.root, f".tmp-{version}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        pending = PendingSnapshot(version, tmp_dir, info)
+        try:
+            yield pending
+            manifest = {"version": version, "created": time.time(), **pending.info}
+            with open(os.path.join(tmp_dir, MANIFEST), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            os.rename(tmp_dir, os.path.join(self.root, version))
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    def prune(self, keep=SNAPSHOT_KEEP, protect=()):
+        """Borra las versiones más antiguas dejando `keep` (nunca la actual ni las de protect)"""
+        current = self.current()
+        removed = []
+        for n in self._numbers()[:-keep] if keep > 0 else []:
+            version = f"v{n:06d}"
+            if version == current or version in protect:
+                continue
+            shutil.rmtree(os.path.join(self.root, version), ignore_errors=True)
+            removed.append(version)
+        return removed
+
+
+class Snapshot:
+    """Índice + metadata de una versión, con las rutas de las que salieron"""
+
+    def __init__(self, version, index, meta, index_path, meta_path):
+        self.version = version
+        self.index = index
+        self.meta = meta
+        self.index_path = index_path
+        self.meta_path = meta_path
+        self.refs = 0
+        self.retired = False
+        self.loaded = time.time()
+
+    def release(self):
+        # lo que queda mapeado (mmap) se libera al soltar las referencias
+        self.index, self.meta = None, {}
+
+
+class LiveSnapshot:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = None
+        self.retiring = []
+
+    @contextmanager
+    def acquire(self):
+        """yield del Snapshot servido (o None); no se libera mientras haya alguien dentro"""
+        with self.lock:
+            snap = self.current
+            if snap is not None:
+                snap.refs += 1
+        try:
+            yield snap
+        finally:
+            if snap is not None:
+                with self.lock:
+                    snap.refs -= 1
+                    done = snap.retired and snap.refs == 0
+                    if done:
+                        self.retiring.remove(snap)
+                if done:
+                    snap.release()
+
+    def swap(self, snap):
+        """Publica snap; el anterior se libera cuando terminen las consultas que lo usan"""
+        with self.lock:
+            old, self.current = self.current, snap
+            done = False
+            if old is not None:
+                old.retired = True
+                done = old.refs == 0
+                if not done:
+                    self.retiring.append(old)
+        if done:
+            old.release()
+        return old
+
+    def stats(self):
+        with self.lock:
+            return {
+                "version": self.current.version if self.current is not None else None,
+                "in_flight": self.current.refs if self.current is not None else 0,
+                "retiring": [{"version": s.version, "in_flight": s.refs} for s in self.retiring],
+            }
@@ -0,0 +1,157 @@
+# utils/summary_cache.py
+"""
+Cache de resúmenes en dos niveles:
+- exacto: (consulta normalizada, ids ordenados de los documentos de contexto, modelo)
+- aproximado: misma colección de documentos y embedding de la consulta con
+  similitud coseno >= SUMMARY_CACHE_SIM_THRESHOLD respecto a una consulta ya resumida.
+Las entradas caducan a los SUMMARY_CACHE_TTL_S y se desalojan por LRU.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.embedding_cache import normalize_text
+
+SUMMARY_CACHE_ENABLED = os.getenv("SUMMARY_CACHE_ENABLED", "1") not in ("0", "false", "False")
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "2000"))
+SUMMARY_CACHE_TTL_S = float(os.getenv("SUMMARY_CACHE_TTL_S", "3600"))
+SUMMARY_CACHE_SIM_THRESHOLD = float(os.getenv("SUMMARY_CACHE_SIM_THRESHOLD", "0.95"))
+
+
+def _unit(vec):
+    vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
+
+
+class SummaryCache:
+    def __init__(self, model_name, max_entries=SUMMARY_CACHE_MAX_ENTRIES, ttl_s=SUMMARY_CACHE_TTL_S,
+                 sim_threshold=SUMMARY_CACHE_SIM_THRESHOLD, enabled=SUMMARY_CACHE_ENABLED):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.sim_threshold = sim_threshold
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # clave exacta -> entrada, en orden de uso
+        self.by_docs = {}             # conjunto de docs -> claves exactas (nivel aproximado)
+        self.by_doc_id = {}           # id de doc -> claves exactas (invalidación por doc)
+        self.hits_exact = 0
+        self.hits_approx = 0
+        self.misses = 0
+        self.evictions = 0
+        # cambia con cada clear(): un resumen empezado antes de reconstruir el índice no se guarda
+        self.generation = 0
+
+    def _keys(self, query, doc_ids, variant):
+        doc_ids = tuple(str(d) for d in doc_ids)
+        exact = (self.model_name, variant, normalize_text(query).lower(), doc_ids)
+        return exact, (self.model_name, variant, frozenset(doc_ids))
+
+    def _drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        group = self.by_docs.get(entry["docs"])
+        if group is not None:
+            group.discard(key)
+            if not group:
+                del self.by_docs[entry["docs"]]
+        for doc_id in entry["docs"][2]:
+            keys = self.by_doc_id.get(doc_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_doc_id[doc_id]
+
+    def _alive(self, key, now):
+        entry = self.entries.get(key)
+        if entry is not None and now - entry["created"] > self.ttl_s:
+            self._drop(key)
+            return None
+        return entry
+
+    def get(self, query, doc_ids, query_vec=None, variant=None):
+        """
+        Devuelve (resumen, "exact" | "approx") o (None, None).
+        variant distingue parámetros de generación (p. ej. max_length).
+        """
+        if not self.enabled:
+            return None, None
+        exact, docs = self._keys(query, doc_ids, variant)
+        now = time.time()
+        with self.lock:
+            entry = self._alive(exact, now)
+            if entry is not None:
+                self.entries.move_to_end(exact)
+                self.hits_exact += 1
+                return entry["summary"], "exact"
+            if query_vec is not None:
+                q = _unit(query_vec)
+                best, best_sim = None, self.sim_threshold
+                for key in list(self.by_docs.get(docs, ())):
+                    cand = self._alive(key, now)
+                    if cand is None or cand["vec"] is None:
+                        continue
+                    sim = float(np.dot(q, cand["vec"]))
+                    if sim >= best_sim:
+                        best, best_sim = key, sim
+                if best is not None:
+                    self.entries.move_to_end(best)
+                    self.hits_approx += 1
+                    return self.entries[best]["summary"], "approx"
+            self.misses += 1
+        return None, None
+
+    def put(self, query, doc_ids, summary, query_vec=None, variant=None, generation=None):
+        if not self.enabled or not summary:
+            return
+        exact, docs = self._keys(query, doc_ids, variant)
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._drop(exact)
+            self.entries[exact] = {
+                "summary": summary,
+                "vec": _unit(query_vec) if query_vec is not None else None,
+                "docs": docs,
+                "created": time.time(),
+            }
+            self.by_docs.setdefault(docs, set()).add(exact)
+            for doc_id in docs[2]:
+                self.by_doc_id.setdefault(doc_id, set()).add(exact)
+            while len(self.entries) > self.max_entries:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate_docs(self, doc_ids):
+        """Olvida los resúmenes que usaron alguno de estos documentos (upsert/borrado)"""
+        with self.lock:
+            for doc_id in doc_ids:
+                for key in list(self.by_doc_id.get(str(doc_id), ())):
+                    self._drop(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.by_docs.clear()
+            self.by_doc_id.clear()
+            self.generation += 1
+
+    def stats(self):
+        with self.lock:
+            total = self.hits_exact + self.hits_approx + self.misses
+            return {
+                "model": self.model_name,
+                "enabled": self.enabled,
+                "entries": len(self.entries),
+                "capacity": self.max_entries,
+                "hits_exact": self.hits_exact,
+                "hits_approx": self.hits_approx,
+                "misses": self.misses,
+                "hit_rate": round((self.hits_exact + self.hits_approx) / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,115 @@
+# utils/summary_jobs.py
+"""
+Jobs de resumen en segundo plano: /search devuelve los papers al momento y el resumen
+se genera aparte. El cliente lo consulta por job_id o lo recibe a trozos (SSE).
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "1"))
+# los jobs terminados se olvidan pasado este tiempo
+SUMMARY_JOB_TTL_S = float(os.getenv("SUMMARY_JOB_TTL_S", "600"))
+
+FINISHED = ("done", "error")
+
+
+class SummaryJobs:
+    def __init__(self, stream_fn, workers=SUMMARY_WORKERS, ttl_s=SUMMARY_JOB_TTL_S):
+        """stream_fn(prompt, **kwargs) -> iterador de trozos de texto"""
+        self.stream_fn = stream_fn
+        self.ttl_s = ttl_s
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="summary")
+        self.cond = threading.Condition()
+        self.jobs = {}
+
+    def _new_job(self, status="pending", chunks=None):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        finished = now if status in FINISHED else None
+        with self.cond:
+            self._expire()
+            self.jobs[job_id] = {"status": status, "chunks": chunks or [], "error": None,
+                                 "created": now, "started": finished, "finished": finished}
+        return job_id
+
+    def submit(self, prompt, on_done=None, **kwargs):
+        """Lanza el resumen; on_done(resumen) se llama si termina bien"""
+        job_id = self._new_job()
+        self.executor.submit(self._run, job_id, prompt, on_done, kwargs)
+        return job_id
+
+    def done(self, summary):
+        """Job ya terminado con un resumen conocido (p. ej. de la cache)"""
+        return self._new_job(status="done", chunks=[summary])
+
+    def _run(self, job_id, prompt, on_done, kwargs):
+        job = self.jobs[job_id]
+        with self.cond:
+            job["status"] = "running"
+            job["started"] = time.time()
+        try:
+            for piece in self.stream_fn(prompt, **kwargs):
+                with self.cond:
+                    job["chunks"].append(piece)
+                    self.cond.notify_all()
+            status, error = "done", None
+        except Exception as e:
+            status, error = "error", str(e)
+        if on_done is not None and status == "done":
+            try:
+                on_done("".join(job["chunks"]).strip())
+            except Exception as e:
+                print(f"Error en on_done del job {job_id}: {e}")
+        with self.cond:
+            job["status"] = status
+            job["error"] = error
+            job["finished"] = time.time()
+            self.cond.notify_all()
+
+    def _expire(self):
+        now = time.time()
+        for job_id in [j for j, job in self.jobs.items()
+                       if job["finished"] is not None and now - job["finished"] > self.ttl_s]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        """Estado del job y el resumen generado hasta ahora, o None si no existe"""
+        with self.cond:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            end = job["finished"] or time.time()
+            return {
+                "job_id": job_id,
+                "status": job["status"],
+                "summary": "".join(job["chunks"]).strip(),
+                "error": job["error"],
+                "queued_s": round((job["started"] or end) - job["created"], 3),
+                "elapsed_s": round(end - (job["started"] or end), 3),
+            }
+
+    def follow(self, job_id, timeout=None):
+        """
+        Itera los trozos del job desde el principio, bloqueando hasta que salgan los
+        siguientes; termina cuando el job acaba (o tras timeout s sin novedades).
+        """
+        sent = 0
+        while True:
+            with self.cond:
+                job = self.jobs.get(job_id)
+                if job is None:
+                    return
+                if sent == len(job["chunks"]) and job["status"] not in FINISHED:
+                    if not self.cond.wait(timeout=timeout):
+                        return
+                    continue
+                pending = job["chunks"][sent:]
+                finished = job["status"] in FINISHED
+            for piece in pending:
+                yield piece
+            sent += len(pending)
+            if finished and not pending:
+                return
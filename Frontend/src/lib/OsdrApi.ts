@@ -38,6 +38,7 @@ export type PaperItem = {
 export type PapersResponse = {
   papers: PaperItem[];
   total?: number;
+  next_cursor?: number | null;   // cursor de la página siguiente; null en la última
 };
 
 export type PaperResponse = PaperItem;
@@ -49,9 +50,26 @@ export type QueryResponse = {
 };
 
 export type RebuildResponse = {
-  status: string;            // "ok"
-  indexed: number;
-  message?: string;
+  job_id: string;            // la reconstrucción corre en segundo plano
+  status: string;            // "pending"
+  status_url: string;        // GET /rebuild_index/{job_id}
+};
+
+export type RebuildJob = {
+  job_id: string;
+  status: "pending" | "running" | "done" | "error" | "cancelled";
+  cancel_requested: boolean;
+  progress: {
+    stage: string;           // parsing | embedding | indexing | saving | loading | ...
+    rows?: number;
+    embedded?: number;
+    indexed?: number;
+    estimated_total?: number;
+    elapsed_s: number;
+    eta_s: number | null;
+  };
+  result: { indexed: number; version: string; pruned: string[] } | null;
+  error: string | null;
 };
 
 export type StatsResponse = {
@@ -142,10 +160,38 @@ export function createOsdrApi(options: ClientOptions = {}) {
       );
     },
 
-    // GET /papers?limit=&program=&year=
-    async listPapers(params?: { limit?: number; program?: string; year?: string }): Promise<PapersResponse> {
+    // GET /rebuild_index/{job_id}
+    async getRebuildJob(jobId: string): Promise<RebuildJob> {
+      const url = buildUrl(baseUrl, `/rebuild_index/${encodeURIComponent(jobId)}`);
+      return doFetchJSON<RebuildJob>(
+        url,
+        { method: "GET", headers: defaultHeaders },
+        timeoutMs
+      );
+    },
+
+    // DELETE /rebuild_index/{job_id}
+    async cancelRebuildJob(jobId: string): Promise<RebuildJob> {
+      const url = buildUrl(baseUrl, `/rebuild_index/${encodeURIComponent(jobId)}`);
+      return doFetchJSON<RebuildJob>(
+        url,
+        { method: "DELETE", headers: defaultHeaders },
+        timeoutMs
+      );
+    },
+
+    // GET /papers?limit=&offset=&cursor=&program=&year=
+    async listPapers(params?: {
+      limit?: number;
+      offset?: number;
+      cursor?: number;        // next_cursor de la página anterior (estable aunque cambie el total)
+      program?: string;
+      year?: string;
+    }): Promise<PapersResponse> {
       const q = new URLSearchParams();
       if (params?.limit != null) q.set("limit", String(params.limit));
+      if (params?.cursor != null) q.set("cursor", String(params.cursor));
+      else if (params?.offset != null) q.set("offset", String(params.offset));
       if (params?.program) q.set("program", params.program);
       if (params?.year) q.set("year", params.year);
       const qs = q.toString() ? `?${q.toString()}` : "";
@@ -157,6 +203,17 @@ export function createOsdrApi(options: ClientOptions = {}) {
       );
     },
 
+    // GET /papers página a página, siguiendo next_cursor hasta la última
+    async *iteratePapers(params?: { limit?: number; program?: string; year?: string }): AsyncGenerator<PapersResponse> {
+      let cursor: number | undefined;
+      while (true) {
+        const page = await this.listPapers({ ...params, cursor });
+        yield page;
+        if (page.next_cursor == null) return;
+        cursor = page.next_cursor;
+      }
+    },
+
     // GET /paper/{paper_id}
     async getPaper(paperId: string): Promise<PaperResponse> {
       if (!paperId) throw new OsdrApiError("paperId is required");